@@ -0,0 +1,157 @@
+"""A local stand-in for AnkiConnect, to benchmark kanki without a running Anki.
+
+It implements the actions kanki uses (addNote, storeMediaFile, multi, findNotes and
+notesInfo) in memory, with a configurable latency per request and a rate of injected
+errors. The stored media are only counted, not kept.
+
+Usage:
+    with FakeAnkiConnect(latency=0.001, error_rate=0.01) as anki:
+        client = AnkiConnectClient(api_url=anki.url)
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+
+class FakeAnkiConnect:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = 0,
+    ):
+        """
+        Args:
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on. Defaults to 0, i.e. any free port.
+            latency (float, optional): The delay in seconds added to each request.
+            error_rate (float, optional): The probability of an action failing, e.g. an
+                addNote rejected as a duplicate. Defaults to 0.
+            seed (Optional[int], optional): The seed of the injected errors. Defaults to 0.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.notes: Dict[int, Dict[str, Any]] = {}
+        self.media_count = 0
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def dispatch(
+        self, action: str, params: Dict[str, Any]
+    ) -> Tuple[Any, Optional[str]]:
+        """Run an action, returning its result and error."""
+        if action == "multi":
+            return [
+                dict(
+                    zip(
+                        ("result", "error"),
+                        self.dispatch(a["action"], a.get("params", {})),
+                    )
+                )
+                for a in params["actions"]
+            ], None
+        if action == "version":
+            return 6, None
+        if action == "storeMediaFile":
+            if self._fails():
+                return None, "failed to store the media file"
+            with self._lock:
+                self.media_count += 1
+            return params["filename"], None
+        if action == "addNote":
+            if self._fails():
+                return None, "cannot create note because it is a duplicate"
+            with self._lock:
+                note_id = self._next_id
+                self._next_id += 1
+                self.notes[note_id] = params["note"]
+            return note_id, None
+        if action == "findNotes":
+            with self._lock:
+                return list(self.notes), None
+        if action == "notesInfo":
+            with self._lock:
+                return [
+                    {
+                        "noteId": note_id,
+                        "fields": {
+                            name: {"value": value, "order": order}
+                            for order, (name, value) in enumerate(
+                                self.notes[note_id]["fields"].items()
+                            )
+                        },
+                    }
+                    for note_id in params["notes"]
+                    if note_id in self.notes
+                ], None
+        return None, "unsupported action"
+
+    def _handler(self):
+        anki = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep the connections alive, as the client pools them.
+            protocol_version = "HTTP/1.1"
+            # The headers and the body are written separately, which would otherwise
+            # be delayed by Nagle's algorithm.
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                if anki.latency:
+                    time.sleep(anki.latency)
+                with anki._lock:
+                    anki.request_count += 1
+                result, error = anki.dispatch(
+                    request["action"], request.get("params", {})
+                )
+                body = json.dumps({"result": result, "error": error}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
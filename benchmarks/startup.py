@@ -0,0 +1,67 @@
+"""Benchmark the cold-start latency of `kanki`.
+
+Each scenario runs in a fresh interpreter, so that nothing is cached between runs.
+
+Usage:
+    python benchmarks/startup.py [--runs 20] [--output startup.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    # The interpreter alone, as a baseline.
+    "python": [sys.executable, "-c", "pass"],
+    "kanki --help": [sys.executable, "-m", "src.main", "--help"],
+    "import src.main": [sys.executable, "-c", "import src.main"],
+    # What a single-word run imports before any network request.
+    "import src.card_creator": [sys.executable, "-c", "import src.card_creator"],
+}
+
+
+def measure(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "runs": runs,
+        "min_ms": round(timings[0], 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "p90_ms": round(timings[int(0.9 * (runs - 1))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark the cold-start latency of kanki.")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per scenario.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "timestamp": time.time(),
+        "scenarios": {name: measure(cmd, args.runs) for name, cmd in SCENARIOS.items()},
+    }
+
+    for name, result in results["scenarios"].items():
+        print(
+            f"{name:<26} min {result['min_ms']:>8.1f} ms   "
+            f"median {result['median_ms']:>8.1f} ms   p90 {result['p90_ms']:>8.1f} ms"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
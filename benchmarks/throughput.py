@@ -0,0 +1,253 @@
+"""Benchmark the throughput of `AnkiNotes.from_txt` + `CardCreator.send_notes`.
+
+Nothing leaves the machine: AnkiConnect is replaced by a local stand-in (see
+`fake_anki.py`), and googletrans and navertts by fakes with tunable delays. For each
+size, a file of distinct korean words is imported and the following are measured:
+
+- notes/sec over the whole import (translation, audio and AnkiConnect requests);
+- p50/p99 per-note latency, i.e. the time between a note and the previous one being
+  sent, the first one counting from the start of `send_notes`;
+- the peak of the memory allocated by Python during the import (tracemalloc).
+
+Usage:
+    python benchmarks/throughput.py [--sizes 10 1000 100000] [--output throughput.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.fake_anki import FakeAnkiConnect  # noqa: E402
+
+# Every word is two to three Hangul syllables, so that they are all distinct.
+N_SYLLABLES = 11172
+
+
+class FakeTranslator:
+    """Stands in for `googletrans.Translator`."""
+
+    delay = 0.0
+
+    def translate(self, text, src="auto", dest="en"):
+        time.sleep(self.delay)
+        return types.SimpleNamespace(text=text, src=src, dest=dest)
+
+
+class FakeNaverTTS:
+    """Stands in for `navertts.NaverTTS`, with a fixed sized audio."""
+
+    delay = 0.0
+    audio = b"\xff\xfb" * 2048
+
+    def __init__(self, text, **voice):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(self.delay)
+        fp.write(self.audio)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            self.write_to_fp(f)
+
+
+def install_fakes(translate_delay: float, tts_delay: float) -> None:
+    """Install the fakes in place of googletrans and navertts, which are only imported
+    by kanki when they are needed.
+    """
+    FakeTranslator.delay = translate_delay
+    FakeNaverTTS.delay = tts_delay
+    sys.modules["googletrans"] = types.SimpleNamespace(Translator=FakeTranslator)
+    sys.modules["navertts"] = types.SimpleNamespace(NaverTTS=FakeNaverTTS)
+
+
+def word(i: int) -> str:
+    syllables = []
+    while True:
+        i, rest = divmod(i, N_SYLLABLES)
+        syllables.append(chr(0xAC00 + rest))
+        if i == 0:
+            break
+    return "".join(syllables).ljust(2, "가")
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(size: int, url: str, args, tmp_dir: Path):
+    import src.card_creator as card_creator_module
+    from src.anki_connect import AnkiConnectClient
+    from src.audio_cache import AudioCache
+    from src.card_creator import AnkiNotes, CardCreator
+    from src.note_batch import NoteResults
+    from src.readers import read_rows
+
+    data_fname = tmp_dir / f"words_{size}.txt"
+    data_fname.write_text("".join(f"{word(i)}\n" for i in range(size)), "utf-8")
+
+    audio_cache = None
+    if args.audio == "cache":
+        audio_cache = AudioCache(tmp_dir / f"audio_cache_{size}", max_bytes=None)
+
+    # Time each note as its message is created, right after it has been sent.
+    sent_times = []
+    create_message = card_creator_module.create_message
+
+    def timed_create_message(response):
+        sent_times.append(time.perf_counter())
+        return create_message(response)
+
+    card_creator_module.create_message = timed_create_message
+    tracemalloc.start()
+    try:
+        with (
+            AnkiConnectClient(api_url=url) as client,
+            open(os.devnull, "w") as devnull,
+            contextlib.redirect_stdout(devnull),
+        ):
+            start = time.perf_counter()
+            if args.columnar:
+                (anki_notes,) = AnkiNotes.iter_batches(
+                    read_rows(data_fname),
+                    chunk_size=size,
+                    translate_batch_size=args.translate_batch_size,
+                )
+            else:
+                anki_notes = AnkiNotes.from_txt(
+                    data_fname, translate_batch_size=args.translate_batch_size
+                ).anki_notes
+            translated = time.perf_counter()
+            card_creator = CardCreator(
+                anki_notes,
+                client=client,
+                audio_cache=audio_cache,
+                in_memory_audio=args.audio == "memory",
+            )
+            responses = card_creator.send_notes(
+                audio=args.audio != "none",
+                batch_size=args.batch_size,
+                tts_workers=args.tts_workers,
+            )
+            end = time.perf_counter()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        card_creator_module.create_message = create_message
+
+    latencies = sorted(
+        (t - previous) * 1000
+        for previous, t in zip([translated] + sent_times[:-1], sent_times)
+    )
+    return {
+        "notes": size,
+        "errors": (
+            responses.n_errors
+            if isinstance(responses, NoteResults)
+            else sum(response.error is not None for response in responses)
+        ),
+        "seconds": round(end - start, 3),
+        "translate_seconds": round(translated - start, 3),
+        "notes_per_sec": round(size / (end - start), 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "peak_memory_mib": round(peak / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark the throughput of kanki.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 1000, 100000],
+        help="Numbers of notes.",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Latency of AnkiConnect in seconds."
+    )
+    parser.add_argument(
+        "--error_rate",
+        type=float,
+        default=0.0,
+        help="Rate of failing AnkiConnect actions.",
+    )
+    parser.add_argument(
+        "--translate_delay",
+        type=float,
+        default=0.0,
+        help="Delay of a translation in seconds.",
+    )
+    parser.add_argument(
+        "--tts_delay", type=float, default=0.0, help="Delay of an audio in seconds."
+    )
+    parser.add_argument(
+        "--audio",
+        choices=["memory", "cache", "none"],
+        default="memory",
+        help="Create the audios in memory, in an audio cache, or not at all.",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Create the anki-notes as a columnar NoteBatch, as kanki does.",
+    )
+    parser.add_argument("--batch_size", type=int, default=None)
+    parser.add_argument("--tts_workers", type=int, default=None)
+    parser.add_argument("--translate_batch_size", type=int, default=None)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    install_fakes(args.translate_delay, args.tts_delay)
+
+    results = {
+        "benchmark": "throughput",
+        "python": sys.version.split()[0],
+        "timestamp": time.time(),
+        "config": {
+            name: getattr(args, name)
+            for name in [
+                "latency",
+                "error_rate",
+                "translate_delay",
+                "tts_delay",
+                "audio",
+                "batch_size",
+                "tts_workers",
+                "translate_batch_size",
+                "columnar",
+            ]
+        },
+        "runs": [],
+    }
+    with (
+        tempfile.TemporaryDirectory() as tmp_dir,
+        FakeAnkiConnect(latency=args.latency, error_rate=args.error_rate) as anki,
+    ):
+        for size in args.sizes:
+            result = run(size, anki.url, args, Path(tmp_dir))
+            results["runs"].append(result)
+            print(
+                f"{size:>8} notes   {result['notes_per_sec']:>9.1f} notes/s   "
+                f"p50 {result['p50_ms']:>8.3f} ms   p99 {result['p99_ms']:>8.3f} ms   "
+                f"peak {result['peak_memory_mib']:>8.2f} MiB   errors {result['errors']}"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
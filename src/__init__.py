@@ -5,3 +5,8 @@ API_URL = "http://127.0.0.1:8765"
 DECK_NAME = "korean"
 MODEL_NAME = "Basic (裏表反転カード付き)+sentense"
 MP3_PATH = DIR_PATH / "data"
+AUDIO_CACHE_PATH = MP3_PATH / "audio_cache"
+TRANSLATION_CACHE_PATH = MP3_PATH / "translation_cache.sqlite3"
+WATCH_OFFSETS_PATH = MP3_PATH / "watch_offsets.json"
+FRONT_FIELD = "表面"
+BACK_FIELD = "裏面"
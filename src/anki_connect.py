@@ -0,0 +1,184 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import API_URL
+from src.models import AnkiConnectResponse
+from src.resilience import OVERLOADED_STATUS_CODES, BackendOverloaded, Resilience
+
+
+class AnkiConnectClient:
+    """A client for AnkiConnect, keeping its HTTP connections alive between requests.
+
+    All the requests are encoded and decoded in the same way, so that this class is
+    the single place to tune how we talk to AnkiConnect.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        timeout: Union[None, float, Tuple[float, float]] = (3.05, 60),
+        pool_maxsize: int = 10,
+        version: int = 6,
+        resilience: Optional[Resilience] = None,
+    ):
+        """
+        Args:
+            api_url (str, optional): The url of AnkiConnect. Defaults to API_URL.
+            timeout (Union[None, float, Tuple[float, float]], optional): The timeout of
+                each request in seconds, either for both or as (connect, read).
+                Defaults to (3.05, 60).
+            pool_maxsize (int, optional): The number of connections kept alive.
+                Defaults to 10.
+            version (int, optional): The version of the AnkiConnect API. Defaults to 6.
+            resilience (Optional[Resilience], optional): The rate limit and the retries of
+                the requests. Only the failed connections and the overloaded responses are
+                retried, as a request which reached Anki may have been applied. Defaults
+                to up to 3 retries, without rate limit.
+        """
+        self.api_url = api_url
+        self.timeout = timeout
+        self.version = version
+        self.resilience = (
+            resilience
+            if resilience is not None
+            else Resilience(
+                "anki", retry_on=(requests.ConnectionError, BackendOverloaded)
+            )
+        )
+
+        self._session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._session.close()
+
+    def encode(self, action: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+        """Encode an AnkiConnect action as the body of a request."""
+        payload = {"action": action, "version": self.version}
+        if params is not None:
+            payload["params"] = params
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def decode(response: requests.Response) -> AnkiConnectResponse:
+        """Decode the response of AnkiConnect."""
+        try:
+            response_json = response.json()
+        except ValueError:
+            return AnkiConnectResponse(
+                status_code=response.status_code,
+                error=f"Invalid response from AnkiConnect (HTTP {response.status_code})",
+            )
+
+        return AnkiConnectResponse(
+            status_code=response.status_code,
+            result=response_json.get("result"),
+            error=response_json.get("error"),
+        )
+
+    def invoke(self, action: str, **params) -> AnkiConnectResponse:
+        """Send a single action to AnkiConnect.
+
+        Args:
+            action (str): The name of the action, e.g. "addNote".
+            **params: The parameters of the action.
+
+        Returns:
+            AnkiConnectResponse: The decoded response.
+        """
+        data = self.encode(action, params or None)
+        try:
+            response = self.resilience.call(self._post, data)
+        except BackendOverloaded as e:
+            response = e.response
+        return self.decode(response)
+
+    def _post(self, data: bytes) -> requests.Response:
+        response = self._session.post(self.api_url, data=data, timeout=self.timeout)
+        if response.status_code in OVERLOADED_STATUS_CODES:
+            raise BackendOverloaded(response.status_code, response)
+        return response
+
+    def multi(self, actions: List[Dict[str, Any]]) -> List[AnkiConnectResponse]:
+        """Send several actions within a single `multi` request.
+
+        Args:
+            actions (List[Dict[str, Any]]): The actions, each with `action` and `params`.
+
+        Returns:
+            List[AnkiConnectResponse]: One response per action, in order. If the request
+                as a whole failed, its error is reported for every action.
+        """
+        if not actions:
+            return []
+
+        response = self.invoke(
+            "multi",
+            actions=[{**action, "version": self.version} for action in actions],
+        )
+        if response.error is not None or response.status_code != 200:
+            error = response.error or f"HTTP {response.status_code}"
+            return [
+                AnkiConnectResponse(status_code=response.status_code, error=error)
+                for _ in actions
+            ]
+
+        results = []
+        for action_result in response.result:
+            if isinstance(action_result, dict) and "error" in action_result:
+                results.append(
+                    AnkiConnectResponse(
+                        status_code=response.status_code,
+                        result=action_result.get("result"),
+                        error=action_result["error"],
+                    )
+                )
+            else:
+                results.append(
+                    AnkiConnectResponse(
+                        status_code=response.status_code, result=action_result
+                    )
+                )
+        return results
+
+    def find_notes_info(
+        self, query: str, chunk_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """Find the notes matching an Anki search query and yield their info, fetched
+        in chunks of `chunk_size` notes.
+
+        Raises:
+            AnkiConnectError: AnkiConnect reported an error.
+        """
+        note_ids = self._checked(self.invoke("findNotes", query=query))
+        for start in range(0, len(note_ids), chunk_size):
+            yield from self._checked(
+                self.invoke("notesInfo", notes=note_ids[start : start + chunk_size])
+            )
+
+    @staticmethod
+    def _checked(response: AnkiConnectResponse) -> Any:
+        if response.error is not None or response.status_code != 200:
+            raise AnkiConnectError(response)
+        return response.result
+
+
+class AnkiConnectError(Exception):
+    """Exception raised when AnkiConnect reports an error."""
+
+    def __init__(self, response: AnkiConnectResponse):
+        self.status_code = response.status_code
+        self.message = f"{response.error}. Status code: {self.status_code}"
+        super().__init__(self.message)
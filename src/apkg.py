@@ -0,0 +1,502 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Union
+
+from src import MP3_PATH
+from src.audio_cache import AudioCache
+from src.media import DEFAULT_FIELD_MAP, schedule_media, voiced_attributes
+from src.metrics import metrics
+from src.models import AnkiNoteModel
+from src.note_batch import NoteBatch
+from src.utils import InMemoryAudio, create_audio, create_audio_data
+
+# The schema of a collection in the legacy `collection.anki2` format (version 11),
+# which every version of Anki imports.
+SCHEMA = """
+CREATE TABLE col (
+    id integer PRIMARY KEY, crt integer NOT NULL, mod integer NOT NULL,
+    scm integer NOT NULL, ver integer NOT NULL, dty integer NOT NULL,
+    usn integer NOT NULL, ls integer NOT NULL, conf text NOT NULL,
+    models text NOT NULL, decks text NOT NULL, dconf text NOT NULL, tags text NOT NULL
+);
+CREATE TABLE notes (
+    id integer PRIMARY KEY, guid text NOT NULL, mid integer NOT NULL,
+    mod integer NOT NULL, usn integer NOT NULL, tags text NOT NULL,
+    flds text NOT NULL, sfld integer NOT NULL, csum integer NOT NULL,
+    flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE cards (
+    id integer PRIMARY KEY, nid integer NOT NULL, did integer NOT NULL,
+    ord integer NOT NULL, mod integer NOT NULL, usn integer NOT NULL,
+    type integer NOT NULL, queue integer NOT NULL, due integer NOT NULL,
+    ivl integer NOT NULL, factor integer NOT NULL, reps integer NOT NULL,
+    lapses integer NOT NULL, left integer NOT NULL, odue integer NOT NULL,
+    odid integer NOT NULL, flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE revlog (
+    id integer PRIMARY KEY, cid integer NOT NULL, usn integer NOT NULL,
+    ease integer NOT NULL, ivl integer NOT NULL, lastIvl integer NOT NULL,
+    factor integer NOT NULL, time integer NOT NULL, type integer NOT NULL
+);
+CREATE TABLE graves (usn integer NOT NULL, oid integer NOT NULL, type integer NOT NULL);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+# The cards of a note, by the attributes of their question and answer: the front side
+# asks for the back side, and the reverse.
+TEMPLATES = [
+    ("Card 1", "front", "back"),
+    ("Card 2", "back", "front"),
+]
+
+CSS = ".card { font-family: arial; font-size: 20px; text-align: center; }"
+
+# The default options of the decks.
+DECK_CONF = {
+    "id": 1,
+    "name": "Default",
+    "mod": 0,
+    "usn": 0,
+    "maxTaken": 60,
+    "autoplay": True,
+    "timer": 0,
+    "replayq": True,
+    "dyn": False,
+    "new": {
+        "delays": [1, 10],
+        "ints": [1, 4, 7],
+        "initialFactor": 2500,
+        "order": 1,
+        "perDay": 20,
+        "bury": True,
+        "separate": True,
+    },
+    "rev": {
+        "perDay": 100,
+        "ease4": 1.3,
+        "fuzz": 0.05,
+        "maxIvl": 36500,
+        "bury": True,
+        "hardFactor": 1.2,
+        "minSpace": 1,
+    },
+    "lapse": {
+        "delays": [10],
+        "mult": 0,
+        "minInt": 1,
+        "leechFails": 8,
+        "leechAction": 0,
+    },
+}
+
+
+def _stable_id(*parts: str) -> int:
+    """An id derived from names, so that exporting again gives the same ids. It may
+    collide with another one: see `ApkgExporter._unique_id`.
+    """
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+    return 1 << 40 | int(digest[:10], 16)
+
+
+def _guid(*parts: str) -> str:
+    """The guid of a note, from the whole digest of its names, so that two different
+    notes do not get the same guid.
+    """
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _checksum(field: str) -> int:
+    """The checksum of the sort field of a note, as computed by Anki."""
+    return int(hashlib.sha1(field.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class ApkgExporter:
+    """Write anki-notes and their TTS audios straight into an `.apkg` package, which is
+    imported into Anki in one step, without AnkiConnect nor a running Anki.
+
+    The notes are bulk inserted into an SQLite collection within a single transaction,
+    and the audios are streamed into the package as they are created. The package is
+    only written to `path` on `close`. The decks and the note types are named as in
+    the CLI, with the fields of the field map; exporting the same notes again gives
+    the same ids, so that Anki updates them rather than duplicating them.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        audio_cache: Optional[AudioCache] = None,
+        in_memory_audio: bool = False,
+        max_audio_memory_size: int = 1024 * 1024,
+        field_map: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            path (Union[Path, str]): The package to write, e.g. "korean.apkg".
+            audio_cache (Optional[AudioCache], optional): See `CardCreator`.
+            in_memory_audio (bool, optional): See `CardCreator`. Defaults to False.
+            max_audio_memory_size (int, optional): See `CardCreator`.
+            field_map (Optional[Dict[str, str]], optional): See `CardCreator`. The
+                note types have one field per mapped attribute, in order.
+        """
+        self.path = Path(path)
+        self._field_map = field_map if field_map is not None else DEFAULT_FIELD_MAP
+        self._audio_cache = audio_cache
+        self._in_memory_audio = in_memory_audio
+        self._max_audio_memory_size = max_audio_memory_size
+
+        self._tmp_dir = tempfile.TemporaryDirectory(prefix="kanki_apkg_")
+        self._collection_path = Path(self._tmp_dir.name) / "collection.anki2"
+        self._connection = sqlite3.connect(self._collection_path)
+        self._connection.executescript(SCHEMA)
+        self._zip_path = self.path.with_name(f".{self.path.name}.tmp")
+        self._zip = zipfile.ZipFile(self._zip_path, "w", zipfile.ZIP_STORED)
+
+        self._now = int(time.time())
+        self._decks: Dict[str, int] = {}
+        self._models: Dict[str, int] = {}
+        # The name of each media file in the package, by its entry in the package.
+        self._media: Dict[str, str] = {}
+        self._media_filenames = set()
+        self._note_guids: Set[str] = set()
+        self._note_ids: Set[int] = set()
+        self._card_ids: Set[int] = set()
+        self.n_notes = 0
+        self.n_duplicates = 0
+        self.n_audio_failures = 0
+
+    def add_notes(
+        self,
+        anki_notes: Union[List[AnkiNoteModel], NoteBatch],
+        audio: bool = True,
+        tts_workers: Optional[int] = None,
+    ) -> int:
+        """Add the anki-notes, with TTS audios of their front side and of their sentence,
+        if mapped, if `audio` is set. A note whose front side was already added to its
+        note type is skipped, as Anki would reject it as a duplicate.
+
+        Args:
+            tts_workers (Optional[int], optional): The number of concurrent TTS
+                requests. Defaults to None, i.e. one at a time.
+
+        Returns:
+            int: The number of notes added.
+        """
+        audios = None
+        if audio:
+            audios = schedule_media(
+                anki_notes,
+                self._create_audio,
+                attributes=voiced_attributes(self._field_map),
+                max_workers=tts_workers or 1,
+                release=self._release,
+            )
+
+        notes, cards = [], []
+        for anki_note in anki_notes:
+            media = next(audios) if audios is not None else {}
+            guid = _guid(anki_note.modelName, anki_note.front)
+            if guid in self._note_guids:
+                self.n_duplicates += 1
+                for audio_path in media.values():
+                    if not isinstance(audio_path, Exception):
+                        self._release(audio_path)
+                continue
+            self._note_guids.add(guid)
+
+            audio_strs = {}
+            for attribute, audio_path in media.items():
+                if isinstance(audio_path, Exception):
+                    self.n_audio_failures += 1
+                    print(f"{anki_note.front}: Failed to create audio: {audio_path}")
+                else:
+                    audio_strs[attribute] = f"[sound:{self._add_media(audio_path)}]"
+
+            model_id = self._model_id(anki_note.modelName)
+
+            deck_id = self._deck_id(anki_note.deckName)
+            note_id = self._unique_id(self._note_ids, _stable_id(guid, "note"))
+            fields = [
+                (getattr(anki_note, attribute) or "") + audio_strs.get(attribute, "")
+                for attribute in self._field_map
+            ]
+            notes.append(
+                (
+                    note_id,
+                    guid,
+                    model_id,
+                    self._now,
+                    -1,
+                    "",
+                    "\x1f".join(fields),
+                    anki_note.front,
+                    _checksum(anki_note.front),
+                    0,
+                    "",
+                )
+            )
+            for card_ord in range(len(TEMPLATES)):
+                # New cards, shown in the order of the notes.
+                cards.append(
+                    (
+                        self._unique_id(
+                            self._card_ids, _stable_id(guid, "card", str(card_ord))
+                        ),
+                        note_id,
+                        deck_id,
+                        card_ord,
+                        self._now,
+                        -1,
+                        0,
+                        0,
+                        self.n_notes + len(notes),
+                        0,
+                        0,
+                        0,
+                        0,
+                        0,
+                        0,
+                        0,
+                        0,
+                        "",
+                    )
+                )
+
+        with metrics.timer("export_notes"):
+            self._connection.executemany(
+                "INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", notes
+            )
+            self._connection.executemany(
+                "INSERT INTO cards VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                cards,
+            )
+        self.n_notes += len(notes)
+        metrics.incr("notes_exported", len(notes))
+        return len(notes)
+
+    def _create_audio(self, text: str) -> Union[Path, InMemoryAudio]:
+        if self._in_memory_audio:
+            return create_audio_data(text, max_memory_size=self._max_audio_memory_size)
+        return create_audio(text, path=MP3_PATH, cache=self._audio_cache)
+
+    def _add_media(self, audio_path: Union[Path, str, InMemoryAudio]) -> str:
+        """Write the audio into the package, unless it is there already, and release it.
+
+        Returns:
+            str: The name of the media file.
+        """
+        if isinstance(audio_path, InMemoryAudio):
+            filename = audio_path.filename
+        else:
+            filename = Path(audio_path).name
+        if filename not in self._media_filenames:
+            self._media_filenames.add(filename)
+            entry = str(len(self._media))
+            self._media[entry] = filename
+            if isinstance(audio_path, InMemoryAudio):
+                audio_path.buffer.seek(0)
+                with self._zip.open(entry, "w") as f:
+                    f.write(audio_path.buffer.read())
+            else:
+                self._zip.write(audio_path, entry)
+
+        self._release(audio_path)
+        return filename
+
+    def _release(self, audio_path: Union[Path, str, InMemoryAudio]) -> None:
+        """Release an audio which has been written, unless it is cached."""
+        if isinstance(audio_path, InMemoryAudio):
+            audio_path.close()
+        elif self._audio_cache is None:
+            os.remove(audio_path)
+
+    @staticmethod
+    def _unique_id(used_ids: Set[int], stable_id: int) -> int:
+        """The stable id, or the next one unused if it collides with another note or
+        card of the package.
+        """
+        while stable_id in used_ids:
+            stable_id += 1
+        used_ids.add(stable_id)
+        return stable_id
+
+    def _deck_id(self, deck_name: str) -> int:
+        return self._decks.setdefault(deck_name, _stable_id("deck", deck_name))
+
+    def _model_id(self, model_name: str) -> int:
+        return self._models.setdefault(model_name, _stable_id("model", model_name))
+
+    def _collection_row(self) -> tuple:
+        first_deck_id = next(iter(self._decks.values()), 1)
+        decks = {
+            "1": self._deck_json(1, "Default"),
+            **{
+                str(deck_id): self._deck_json(deck_id, name)
+                for name, deck_id in self._decks.items()
+            },
+        }
+        models = {
+            str(model_id): self._model_json(model_id, name, first_deck_id)
+            for name, model_id in self._models.items()
+        }
+        conf = {
+            "activeDecks": [1],
+            "curDeck": first_deck_id,
+            "newSpread": 0,
+            "collapseTime": 1200,
+            "timeLim": 0,
+            "estTimes": True,
+            "dueCounts": True,
+            "curModel": str(next(iter(self._models.values()), "")),
+            "nextPos": self.n_notes + 1,
+            "sortType": "noteFld",
+            "sortBackwards": False,
+            "addToCur": True,
+        }
+        return (
+            1,
+            self._now,
+            self._now * 1000,
+            self._now * 1000,
+            11,
+            0,
+            0,
+            0,
+            json.dumps(conf),
+            json.dumps(models, ensure_ascii=False),
+            json.dumps(decks, ensure_ascii=False),
+            json.dumps({"1": DECK_CONF}),
+            "{}",
+        )
+
+    def _deck_json(self, deck_id: int, name: str) -> Dict[str, Any]:
+        return {
+            "id": deck_id,
+            "name": name,
+            "mod": self._now,
+            "usn": -1,
+            "lrnToday": [0, 0],
+            "revToday": [0, 0],
+            "newToday": [0, 0],
+            "timeToday": [0, 0],
+            "collapsed": False,
+            "desc": "",
+            "dyn": 0,
+            "conf": 1,
+            "extendNew": 0,
+            "extendRev": 0,
+        }
+
+    def _model_json(self, model_id: int, name: str, deck_id: int) -> Dict[str, Any]:
+        fields = list(self._field_map.values())
+        templates = [
+            (template_name, self._field_map[question], self._field_map[answer])
+            for template_name, question, answer in TEMPLATES
+        ]
+        return {
+            "id": model_id,
+            "name": name,
+            "type": 0,
+            "mod": self._now,
+            "usn": -1,
+            "sortf": 0,
+            "did": deck_id,
+            "tmpls": [
+                {
+                    "name": template_name,
+                    "ord": card_ord,
+                    "qfmt": f"{{{{{question}}}}}",
+                    "afmt": f"{{{{FrontSide}}}}\n\n<hr id=answer>\n\n{{{{{answer}}}}}",
+                    "did": None,
+                    "bqfmt": "",
+                    "bafmt": "",
+                }
+                for card_ord, (template_name, question, answer) in enumerate(templates)
+            ],
+            "flds": [
+                {
+                    "name": field,
+                    "ord": field_ord,
+                    "sticky": False,
+                    "rtl": False,
+                    "font": "Arial",
+                    "size": 20,
+                    "media": [],
+                }
+                for field_ord, field in enumerate(fields)
+            ],
+            "css": CSS,
+            "latexPre": "\\documentclass[12pt]{article}\n\\begin{document}\n",
+            "latexPost": "\\end{document}",
+            "req": [
+                [card_ord, "any", [fields.index(question)]]
+                for card_ord, (_, question, _) in enumerate(templates)
+            ],
+            "tags": [],
+            "vers": [],
+        }
+
+    def close(self) -> None:
+        """Commit the collection and write the package to `path`."""
+        try:
+            self._connection.execute(
+                "INSERT INTO col VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._collection_row(),
+            )
+            self._connection.commit()
+            self._connection.close()
+            self._zip.write(
+                self._collection_path, "collection.anki2", zipfile.ZIP_DEFLATED
+            )
+            self._zip.writestr("media", json.dumps(self._media, ensure_ascii=False))
+            self._zip.close()
+            os.replace(self._zip_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._tmp_dir.cleanup()
+
+    def abort(self) -> None:
+        """Discard the package, e.g. after a failure."""
+        self._connection.close()
+        self._zip.close()
+        if self._zip_path.exists():
+            os.remove(self._zip_path)
+        self._tmp_dir.cleanup()
+
+    def __enter__(self) -> "ApkgExporter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def summary(self) -> str:
+        return (
+            f"exported {self.n_notes} notes and {len(self._media)} audios to {self.path}"
+            + (
+                f" ({self.n_duplicates} duplicates skipped)"
+                if self.n_duplicates
+                else ""
+            )
+            + (
+                f" ({self.n_audio_failures} audios failed)"
+                if self.n_audio_failures
+                else ""
+            )
+        )
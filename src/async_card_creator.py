@@ -0,0 +1,202 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple, Union
+
+from src.anki_connect import AnkiConnectClient
+from src.audio_cache import AudioCache
+from src.card_creator import CardCreator
+from src.journal import ImportJournal
+from src.models import AnkiNoteModel, AnkiNoteResponse
+from src.translation import TranslationCache, translate_words
+from src.utils import InMemoryAudio, MediaAdditionError, create_message
+
+# An anki-note along with its position in the input and its audio, once created.
+_Item = Tuple[int, AnkiNoteModel, Union[None, Path, InMemoryAudio]]
+
+
+class AsyncCardCreator:
+    """Create Anki cards through an asyncio pipeline: translation -> audio -> AnkiConnect.
+
+    Each stage runs its own number of workers, and the stages are connected by bounded
+    queues, so that a slow stage holds back the ones before it instead of piling up
+    work in memory. Cancelling the pipeline cancels every worker.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AnkiConnectClient] = None,
+        audio_cache: Optional[AudioCache] = None,
+        in_memory_audio: bool = False,
+        max_audio_memory_size: int = 1024 * 1024,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_workers: int = 4,
+        tts_workers: int = 4,
+        anki_workers: int = 1,
+        queue_size: int = 100,
+        src: str = "ko",
+        dest: str = "ja",
+        journal: Optional[ImportJournal] = None,
+    ):
+        """
+        Args:
+            client (Optional[AnkiConnectClient], optional): The AnkiConnect client.
+            audio_cache (Optional[AudioCache], optional): The audio cache. Defaults to None.
+            in_memory_audio (bool, optional): Create the audios in memory, see
+                `CardCreator`. Defaults to False.
+            max_audio_memory_size (int, optional): See `CardCreator`. Defaults to 1 MiB.
+            translation_cache (Optional[TranslationCache], optional): The translation cache.
+                Defaults to None.
+            translate_workers (int, optional): The number of concurrent translations.
+                Defaults to 4.
+            tts_workers (int, optional): The number of concurrent TTS requests. Defaults to 4.
+            anki_workers (int, optional): The number of concurrent requests to AnkiConnect.
+                Defaults to 1.
+            queue_size (int, optional): The capacity of the queues between the stages.
+                Defaults to 100.
+            src (str, optional): The language of the front side. Defaults to "ko".
+            dest (str, optional): The language of the back side. Defaults to "ja".
+            journal (Optional[ImportJournal], optional): The journal of the import, see
+                `CardCreator`. The translations recorded in it are reused.
+        """
+        self._card_creator = CardCreator(
+            [],
+            client=client,
+            audio_cache=audio_cache,
+            in_memory_audio=in_memory_audio,
+            max_audio_memory_size=max_audio_memory_size,
+            journal=journal,
+        )
+        self._journal = journal
+        self._translation_cache = translation_cache
+        self._translate_workers = translate_workers
+        self._tts_workers = tts_workers
+        self._anki_workers = anki_workers
+        self._queue_size = queue_size
+        self._src = src
+        self._dest = dest
+
+    async def asend_notes(
+        self,
+        anki_notes: Union[Iterable[AnkiNoteModel], AsyncIterable[AnkiNoteModel]],
+        audio: bool = True,
+    ) -> List[AnkiNoteResponse]:
+        """Translate, synthesize and send the anki-notes. The notes without a back side
+        are translated first. A note which fails at any stage is reported in its
+        response, the others go on.
+
+        Args:
+            anki_notes (Union[Iterable[AnkiNoteModel], AsyncIterable[AnkiNoteModel]]):
+                The anki-notes, read lazily.
+            audio (bool, optional): Attach a TTS audio of the front side. Defaults to True.
+
+        Returns:
+            List[AnkiNoteResponse]: The responses, in the same order as the anki-notes.
+        """
+        translate_queue: asyncio.Queue = asyncio.Queue(self._queue_size)
+        audio_queue: asyncio.Queue = asyncio.Queue(self._queue_size)
+        send_queue: asyncio.Queue = asyncio.Queue(self._queue_size)
+        responses: Dict[int, AnkiNoteResponse] = {}
+
+        def fail(item: _Item, error: str) -> None:
+            index, anki_note, _ = item
+            response = self._card_creator.create_response(
+                anki_note, self._card_creator.error_response(error)
+            )
+            responses[index] = response
+            print(create_message(response))
+
+        async def translate(item: _Item) -> None:
+            index, anki_note, _ = item
+            if anki_note.back is None:
+                translated_word = None
+                if self._journal is not None:
+                    translated_word = self._journal.translation(anki_note.front)
+                if translated_word is None:
+                    (translated_word,) = await asyncio.to_thread(
+                        translate_words,
+                        [anki_note.front],
+                        src=self._src,
+                        dest=self._dest,
+                        cache=self._translation_cache,
+                    )
+                    if self._journal is not None:
+                        self._journal.record(
+                            anki_note.front, "translated", back=translated_word
+                        )
+                anki_note = anki_note.model_copy(update={"back": translated_word})
+            await audio_queue.put((index, anki_note, None))
+
+        async def synthesize(item: _Item) -> None:
+            index, anki_note, _ = item
+            audio_path = None
+            if audio:
+                audio_path = await asyncio.to_thread(
+                    self._card_creator.create_audio, anki_note.front
+                )
+            await send_queue.put((index, anki_note, audio_path))
+
+        async def send(item: _Item) -> None:
+            index, anki_note, audio_path = item
+            response = await asyncio.to_thread(
+                self._card_creator.send_note, anki_note, audio_path
+            )
+            responses[index] = response
+            print(create_message(response))
+
+        async def worker(queue: asyncio.Queue, stage, stage_name: str) -> None:
+            while True:
+                item = await queue.get()
+                try:
+                    await stage(item)
+                except MediaAdditionError as e:
+                    fail(item, str(e))
+                except Exception as e:
+                    fail(item, f"Failed to {stage_name}: {e}")
+                finally:
+                    queue.task_done()
+
+        workers = [
+            asyncio.create_task(worker(translate_queue, translate, "translate"))
+            for _ in range(self._translate_workers)
+        ]
+        workers += [
+            asyncio.create_task(worker(audio_queue, synthesize, "create audio"))
+            for _ in range(self._tts_workers)
+        ]
+        workers += [
+            asyncio.create_task(worker(send_queue, send, "send note"))
+            for _ in range(self._anki_workers)
+        ]
+
+        try:
+            index = 0
+            if isinstance(anki_notes, AsyncIterable):
+                async for anki_note in anki_notes:
+                    await translate_queue.put((index, anki_note, None))
+                    index += 1
+            else:
+                for anki_note in anki_notes:
+                    await translate_queue.put((index, anki_note, None))
+                    index += 1
+
+            # Every stage is done once its queue is drained, which only happens
+            # after the previous stage has put all of its items.
+            await translate_queue.join()
+            await audio_queue.join()
+            await send_queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self._journal is not None:
+                self._journal.commit()
+
+        return [responses[i] for i in range(index)]
+
+    def send_notes(
+        self,
+        anki_notes: Iterable[AnkiNoteModel],
+        audio: bool = True,
+    ) -> List[AnkiNoteResponse]:
+        """The synchronous version of `asend_notes`."""
+        return asyncio.run(self.asend_notes(anki_notes, audio=audio))
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from src import AUDIO_CACHE_PATH
+from src.metrics import metrics
+from src.single_flight import SingleFlight
+
+# Beyond the size cap, the cache is shrunk to this fraction of it, so that the folder
+# is not scanned again on every following miss.
+EVICTION_TARGET = 0.9
+
+
+class AudioCache:
+    """A persistent on-disk cache of the created audio files.
+
+    The files are addressed by a hash of the text and the voice settings, so the
+    same word always gets the same file name, both here and in Anki's media folder.
+    When the cache grows beyond `max_bytes`, the least recently used files are removed
+    until it is back under EVICTION_TARGET of the cap. The size and the recency of the
+    files are indexed when the cache is opened and kept up to date, so that the folder
+    is only scanned again when the cap is exceeded, e.g. to account for the files
+    created by other processes.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = AUDIO_CACHE_PATH,
+        max_bytes: Optional[int] = 256 * 1024 * 1024,
+        single_flight: bool = True,
+    ):
+        """
+        Args:
+            path (Union[Path, str], optional): The cache folder. Defaults to AUDIO_CACHE_PATH.
+            max_bytes (Optional[int], optional): The size cap of the cache, or None for no cap.
+                Defaults to 256 MiB.
+            single_flight (bool, optional): Create the audio of a text only once when
+                several threads or processes sharing the cache miss it at the same time.
+                Defaults to True.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.single_flight = (
+            SingleFlight(self.path.with_name(f"{self.path.name}.locks"))
+            if single_flight
+            else None
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # The size of each cached audio, least recently used first, and their total.
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._scan()
+
+    @staticmethod
+    def key(text: str, voice: Optional[Dict[str, Any]] = None) -> str:
+        """The content hash of a text spoken with the given voice settings."""
+        content = json.dumps([text, voice or {}], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def file_path(self, text: str, voice: Optional[Dict[str, Any]] = None) -> Path:
+        """The deterministic path of the audio of a text in the cache."""
+        return self.path / f"kanki_{self.key(text, voice)[:32]}.mp3"
+
+    def get_or_create(
+        self,
+        text: str,
+        create: Callable[[Path], None],
+        voice: Optional[Dict[str, Any]] = None,
+    ) -> Path:
+        """Get the cached audio of the text, creating it on a miss.
+
+        Args:
+            text (str): The text of the audio.
+            create (Callable[[Path], None]): Writes the audio of the text to the given path.
+            voice (Optional[Dict[str, Any]], optional): The voice settings of the audio.
+
+        Returns:
+            Path: The path of the cached audio file.
+        """
+        file_path = self.file_path(text, voice)
+        if self._hit(file_path):
+            return file_path
+        if self.single_flight is None:
+            return self._create(file_path, create)
+
+        with self.single_flight.hold([file_path.name]):
+            # The audio may have been created while waiting for the lock.
+            if self._hit(file_path):
+                metrics.incr("audio_coalesced")
+                return file_path
+            return self._create(file_path, create)
+
+    def _hit(self, file_path: Path) -> bool:
+        try:
+            # Refresh the modification time, which orders the eviction.
+            os.utime(file_path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self.hits += 1
+            if file_path.name in self._index:
+                self._index.move_to_end(file_path.name)
+            else:
+                # Created by another process since the cache was indexed.
+                self._add(file_path)
+        metrics.incr("audio_cache_hits")
+        return True
+
+    def _create(self, file_path: Path, create: Callable[[Path], None]) -> Path:
+        # Write to a temporary file first, so that a partial file is never cached.
+        tmp_path = file_path.with_name(f".{file_path.stem}.{uuid.uuid4().hex}.tmp")
+        try:
+            create(tmp_path)
+            os.replace(tmp_path, file_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        with self._lock:
+            self.misses += 1
+            self._add(file_path)
+            self._evict(keep=file_path)
+        metrics.incr("audio_cache_misses")
+        return file_path
+
+    def _scan(self) -> None:
+        """Index the files of the cache folder, by their modification time."""
+        files = []
+        for file_path in self.path.glob("kanki_*.mp3"):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, file_path.name, stat.st_size))
+
+        self._index = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._total = sum(self._index.values())
+
+    def _add(self, file_path: Path) -> None:
+        """Index a file as the most recently used one."""
+        try:
+            size = file_path.stat().st_size
+        except FileNotFoundError:
+            return
+        self._total += size - self._index.pop(file_path.name, 0)
+        self._index[file_path.name] = size
+
+    def _evict(self, keep: Path) -> None:
+        if self.max_bytes is None or self._total <= self.max_bytes:
+            return
+
+        # Other processes sharing the folder may have added or removed files.
+        self._scan()
+        if self._total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICTION_TARGET
+        for name, size in list(self._index.items()):
+            if self._total <= target:
+                break
+            if name == keep.name:
+                continue
+            (self.path / name).unlink(missing_ok=True)
+            del self._index[name]
+            self._total -= size
+
+    def clear(self) -> None:
+        """Remove every cached audio file."""
+        with self._lock:
+            for file_path in self.path.glob("kanki_*.mp3"):
+                file_path.unlink(missing_ok=True)
+            self._index.clear()
+            self._total = 0
+
+    def summary(self) -> str:
+        return f"audio cache: {self.hits} hits, {self.misses} misses"
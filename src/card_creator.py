@@ -1,16 +1,73 @@
-import json
 import os
+from itertools import islice
 from pathlib import Path
-from typing import List, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 
-import requests
-from googletrans import Translator
 from pydantic import BaseModel
-from requests import Response
 
-from src import API_URL, DECK_NAME, DIR_PATH, MODEL_NAME
-from src.models import AnkiNoteModel, AnkiNoteResponse, AnkiSendMediaResponse
-from src.utils import MediaAdditionError, create_audio, create_message
+from src import DECK_NAME, DIR_PATH, MODEL_NAME
+from src.anki_connect import AnkiConnectClient
+from src.audio_cache import AudioCache
+from src.journal import ImportJournal
+from src.media import DEFAULT_FIELD_MAP, NoteMedia, schedule_media, voiced_attributes
+from src.metrics import metrics
+from src.models import (
+    AnkiConnectResponse,
+    AnkiNoteModel,
+    AnkiNoteResponse,
+    AnkiSendMediaResponse,
+)
+from src.note_batch import NoteBatch, NoteResults
+from src.translation import TranslationCache, translate_words
+from src.utils import (
+    InMemoryAudio,
+    MediaAdditionError,
+    StoredAudio,
+    create_audio,
+    create_audio_data,
+    create_message,
+    read_words,
+)
+
+
+def translate_fronts(
+    words: List[str],
+    translation_cache: Optional[TranslationCache] = None,
+    translate_batch_size: Optional[int] = None,
+    journal: Optional[ImportJournal] = None,
+) -> Dict[str, str]:
+    """Translate the korean words of the front sides, reusing the translations recorded
+    in the journal, if given, and recording the new ones.
+
+    Returns:
+        Dict[str, str]: The translation of each word.
+    """
+    journaled_words = {}
+    if journal is not None:
+        for word in words:
+            translated_word = journal.translation(word)
+            if translated_word is not None:
+                journaled_words[word] = translated_word
+
+    missing_words = [word for word in words if word not in journaled_words]
+    translations = dict(
+        zip(
+            missing_words,
+            translate_words(
+                missing_words,
+                src="ko",
+                dest="ja",
+                cache=translation_cache,
+                batch_size=translate_batch_size,
+            ),
+        )
+    )
+    if journal is not None:
+        for word, translated_word in translations.items():
+            journal.record(word, "translated", back=translated_word)
+        journal.commit()
+    translations.update(journaled_words)
+    return translations
 
 
 class AnkiNotes(BaseModel):
@@ -26,12 +83,13 @@ class AnkiNotes(BaseModel):
         translated_word: str = None,
         deck_name: str = DECK_NAME,
         model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
     ):
         # Translate the word if its not specified.
         if translated_word is None:
-            translator = Translator()
-            translation = translator.translate(input_str, src="ko", dest="ja")
-            translated_word = translation.text
+            (translated_word,) = translate_words(
+                [input_str], src="ko", dest="ja", cache=translation_cache
+            )
 
         # Create the anki model
         anki_note = AnkiNoteModel(
@@ -43,153 +101,690 @@ class AnkiNotes(BaseModel):
         anki_notes_list = [anki_note]
         return cls(anki_notes=anki_notes_list)
 
+    @classmethod
+    def from_words(
+        cls,
+        words: List[str],
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+        journal: Optional[ImportJournal] = None,
+    ):
+        """Create the anki-notes of several korean words, translating each of them.
+
+        Args:
+            words (List[str]): The korean words on the front side.
+            translation_cache (Optional[TranslationCache], optional): If given, the
+                translations are looked up in it before calling the translator.
+            translate_batch_size (Optional[int], optional): If given, the distinct words
+                are translated in batches of this size, one request per batch.
+            journal (Optional[ImportJournal], optional): If given, the translations
+                recorded in it are reused, and the new ones are recorded.
+        """
+        return cls.from_rows(
+            [{"front": word} for word in words],
+            deck_name=deck_name,
+            model_name=model_name,
+            translation_cache=translation_cache,
+            translate_batch_size=translate_batch_size,
+            journal=journal,
+        )
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: List[Dict[str, str]],
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+        journal: Optional[ImportJournal] = None,
+    ):
+        """Create the anki-notes of rows of note fields, e.g. read by `read_rows`. Only
+        the rows without a back side are translated, and the rows without a deck or a
+        model get the given ones.
+
+        Args:
+            rows (List[Dict[str, str]]): The fields of each anki-note, with at least
+                its front side.
+            translation_cache (Optional[TranslationCache], optional): If given, the
+                translations are looked up in it before calling the translator.
+            translate_batch_size (Optional[int], optional): If given, the distinct words
+                are translated in batches of this size, one request per batch.
+            journal (Optional[ImportJournal], optional): If given, the translations
+                recorded in it are reused, and the new ones are recorded.
+        """
+        # Check the languages first, so that no invalid word is translated.
+        anki_notes_list = AnkiNoteModel.validate_many(
+            [{"deckName": deck_name, "modelName": model_name, **row} for row in rows]
+        )
+
+        translations = translate_fronts(
+            [
+                anki_note.front
+                for anki_note in anki_notes_list
+                if anki_note.back is None
+            ],
+            translation_cache=translation_cache,
+            translate_batch_size=translate_batch_size,
+            journal=journal,
+        )
+        anki_notes_list = [
+            anki_note
+            if anki_note.back is not None
+            else anki_note.model_copy(update={"back": translations[anki_note.front]})
+            for anki_note in anki_notes_list
+        ]
+
+        return cls(anki_notes=anki_notes_list)
+
     @classmethod
     def from_txt(
         cls,
         data_fname: str = DIR_PATH / "data" / "example.txt",
         deck_name: str = DECK_NAME,
         model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
     ):
         """Create a list of notemodel which will be used in creating Anki-notes.
         The translated phrase will be automatically generated from the korean word
-        listed on the front side.
+        listed on the front side. Blank lines are skipped.
 
         Args:
             data_fname (str, optional): _description_. Defaults to DIR_PATH/"data"/"example.txt".
+            translation_cache (Optional[TranslationCache], optional): If given, the
+                translations are looked up in it before calling the translator.
+            translate_batch_size (Optional[int], optional): If given, the distinct words
+                are translated in batches of this size, one request per batch.
 
         Returns:
             _type_: _description_
         """
+        return cls.from_words(
+            list(read_words(data_fname)),
+            deck_name=deck_name,
+            model_name=model_name,
+            translation_cache=translation_cache,
+            translate_batch_size=translate_batch_size,
+        )
 
-        with open(data_fname, "r") as f:
-            voc_list = f.read().split("\n")
+    @classmethod
+    def iter_words(
+        cls,
+        words: Iterable[str],
+        chunk_size: int = 100,
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+        journal: Optional[ImportJournal] = None,
+    ) -> Iterator["AnkiNotes"]:
+        """Like `from_words`, but the words are read lazily and the anki-notes are created
+        chunk by chunk, so that only one chunk is held in memory at a time.
+
+        Args:
+            words (Iterable[str]): The korean words on the front side.
+            chunk_size (int, optional): The number of words per chunk. Defaults to 100.
 
-        translator = Translator()
+        Yields:
+            AnkiNotes: The anki-notes of each chunk of the words.
+        """
+        return cls.iter_rows(
+            ({"front": word} for word in words),
+            chunk_size=chunk_size,
+            deck_name=deck_name,
+            model_name=model_name,
+            translation_cache=translation_cache,
+            translate_batch_size=translate_batch_size,
+            journal=journal,
+        )
 
-        anki_notes_list = []
-        for word in voc_list:
-            translation = translator.translate(word, src="ko", dest="ja")
-            translated_word = translation.text
-            anki_note = AnkiNoteModel(
-                deckName=deck_name,
-                modelName=model_name,
-                front=word,
-                back=translated_word,
+    @classmethod
+    def iter_rows(
+        cls,
+        rows: Iterable[Dict[str, str]],
+        chunk_size: int = 100,
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+        journal: Optional[ImportJournal] = None,
+    ) -> Iterator["AnkiNotes"]:
+        """Like `from_rows`, but the rows are read lazily and the anki-notes are created
+        chunk by chunk, so that only one chunk is held in memory at a time.
+
+        Args:
+            rows (Iterable[Dict[str, str]]): The fields of each anki-note.
+            chunk_size (int, optional): The number of rows per chunk. Defaults to 100.
+
+        Yields:
+            AnkiNotes: The anki-notes of each chunk of the rows.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}.")
+
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            yield cls.from_rows(
+                chunk,
+                deck_name=deck_name,
+                model_name=model_name,
+                translation_cache=translation_cache,
+                translate_batch_size=translate_batch_size,
+                journal=journal,
             )
-            anki_notes_list.append(anki_note)
 
-        return cls(anki_notes=anki_notes_list)
+    @classmethod
+    def iter_batches(
+        cls,
+        rows: Iterable[Dict[str, str]],
+        chunk_size: int = 100,
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+        journal: Optional[ImportJournal] = None,
+    ) -> Iterator[NoteBatch]:
+        """Like `iter_rows`, but each chunk is a columnar NoteBatch instead of one
+        pydantic model per note, which is lighter for large imports.
+
+        Args:
+            rows (Iterable[Dict[str, str]]): The fields of each anki-note.
+            chunk_size (int, optional): The number of rows per chunk. Defaults to 100.
+
+        Yields:
+            NoteBatch: The anki-notes of each chunk of the rows, translated.
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}.")
+
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            # Check the languages first, so that no invalid word is translated.
+            batch = NoteBatch.from_rows(
+                chunk, deck_name=deck_name, model_name=model_name
+            )
+            batch.fill_backs(
+                translate_fronts(
+                    batch.missing_backs(),
+                    translation_cache=translation_cache,
+                    translate_batch_size=translate_batch_size,
+                    journal=journal,
+                )
+            )
+            yield batch
+
+    @classmethod
+    def iter_txt(
+        cls,
+        data_fname: str = DIR_PATH / "data" / "example.txt",
+        chunk_size: int = 100,
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        translation_cache: Optional[TranslationCache] = None,
+        translate_batch_size: Optional[int] = None,
+    ) -> Iterator["AnkiNotes"]:
+        """Like `from_txt`, but the file is read lazily and the anki-notes are created
+        chunk by chunk, so that only one chunk is held in memory at a time.
+
+        Args:
+            chunk_size (int, optional): The number of words per chunk. Defaults to 100.
+
+        Yields:
+            AnkiNotes: The anki-notes of each chunk of the file.
+        """
+        return cls.iter_words(
+            read_words(data_fname),
+            chunk_size=chunk_size,
+            deck_name=deck_name,
+            model_name=model_name,
+            translation_cache=translation_cache,
+            translate_batch_size=translate_batch_size,
+        )
 
 
 class CardCreator:
-    def __init__(self, anki_notes: List[AnkiNoteModel]):
+    def __init__(
+        self,
+        anki_notes: Union[List[AnkiNoteModel], NoteBatch],
+        client: Optional[AnkiConnectClient] = None,
+        audio_cache: Optional[AudioCache] = None,
+        in_memory_audio: bool = False,
+        max_audio_memory_size: int = 1024 * 1024,
+        journal: Optional[ImportJournal] = None,
+        field_map: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            anki_notes (Union[List[AnkiNoteModel], NoteBatch]): The anki-notes to send.
+                With a NoteBatch, the responses are returned as a NoteResults table.
+            client (Optional[AnkiConnectClient], optional): The AnkiConnect client.
+            audio_cache (Optional[AudioCache], optional): The cache of the audio files.
+                The cached audios are kept after being sent, the others are removed.
+            in_memory_audio (bool, optional): Create the audios in memory and send their
+                content to AnkiConnect, instead of the path of a file. Anki then does not
+                need to share our filesystem. The audio cache is not used in this mode.
+            max_audio_memory_size (int, optional): In memory mode, the size in bytes
+                beyond which an audio is spooled to a temporary file. Defaults to 1 MiB.
+            journal (Optional[ImportJournal], optional): If given, the stored audios and
+                the added notes are recorded in it, and flushed after each batch. The
+                audios already stored according to it are not created again.
+            field_map (Optional[Dict[str, str]], optional): The field of the note type of
+                each attribute of the anki-notes, e.g. {"sentence": "例文"}. The front
+                side and the sentence, if mapped, get an audio. Defaults to
+                DEFAULT_FIELD_MAP, i.e. the front and back sides only.
+        """
         self._anki_notes = anki_notes
+        self._client = client if client is not None else AnkiConnectClient()
+        self._audio_cache = audio_cache
+        self._in_memory_audio = in_memory_audio
+        self._max_audio_memory_size = max_audio_memory_size
+        self._journal = journal
+        self._field_map = field_map if field_map is not None else DEFAULT_FIELD_MAP
 
     @property
     def anki_notes(self):
         return self._anki_notes
 
+    @property
+    def client(self) -> AnkiConnectClient:
+        return self._client
+
     @staticmethod
-    def create_response(
-        anki_note: AnkiNoteResponse,
-        connector_response: requests.Response,
-    ):
-        response_json = connector_response.json()
-        response_json["status_code"] = connector_response.status_code
+    def _count(connector_response: AnkiConnectResponse) -> None:
+        metrics.incr(
+            "notes_added" if connector_response.error is None else "notes_failed"
+        )
 
+    @staticmethod
+    def create_response(
+        anki_note: AnkiNoteModel,
+        connector_response: AnkiConnectResponse,
+    ) -> AnkiNoteResponse:
+        CardCreator._count(connector_response)
         anki_note_dict = anki_note.model_dump()
         anki_note_dict.update(
             {
-                "status_code": response_json["status_code"],
-                "result": response_json["result"],
-                "error": response_json["error"],
+                "status_code": connector_response.status_code,
+                "result": connector_response.result,
+                "error": connector_response.error,
             }
         )
 
-        return AnkiNoteResponse(**anki_note_dict)
+        # The anki-note has been validated already.
+        return AnkiNoteResponse.model_construct(**anki_note_dict)
+
+    def _new_responses(self) -> Union[List[AnkiNoteResponse], NoteResults]:
+        if isinstance(self._anki_notes, NoteBatch):
+            return NoteResults(self._anki_notes)
+        return []
+
+    def _respond(
+        self,
+        responses: Union[List[AnkiNoteResponse], NoteResults],
+        anki_note: AnkiNoteModel,
+        connector_response: AnkiConnectResponse,
+    ) -> None:
+        """Add the response of the next anki-note to the responses, and print it."""
+        if isinstance(responses, NoteResults):
+            # No AnkiNoteResponse is created, the message is read from the table.
+            self._count(connector_response)
+            responses.append(connector_response)
+            print(create_message(responses.view(len(responses) - 1)))
+        else:
+            card_create_response = self.create_response(anki_note, connector_response)
+            responses.append(card_create_response)
+            print(create_message(card_create_response))
+
+    def _note_payload(
+        self, anki_note: AnkiNoteModel, audio_strs: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Create the AnkiConnect `note` parameter for the given anki-note, with the
+        sound tag of each audio appended to the field of its attribute.
+        """
+        audio_strs = audio_strs or {}
+        fields = {}
+        for attribute, field in self._field_map.items():
+            value = getattr(anki_note, attribute)
+            if value is not None:
+                fields[field] = value + audio_strs.get(attribute, "")
+        return {
+            "deckName": anki_note.deckName,
+            "modelName": anki_note.modelName,
+            "fields": fields,
+        }
 
     @staticmethod
-    def send_media(audio_path: Union[Path, str]) -> AnkiSendMediaResponse:
+    def _media_params(audio_path: Union[Path, str, InMemoryAudio]) -> Dict[str, str]:
+        """Create the AnkiConnect `storeMediaFile` parameters for the given audio."""
+        if isinstance(audio_path, InMemoryAudio):
+            return {
+                "filename": audio_path.filename,
+                "data": audio_path.b64encode(),
+            }
+        if not isinstance(audio_path, Path):
+            audio_path = Path(audio_path)
+        return {
+            "filename": audio_path.name.__str__(),
+            "path": audio_path.__str__(),
+        }
+
+    def _discard_media(self, media: NoteMedia) -> None:
+        """Release the audios of an anki-note which is not sent, e.g. because one of
+        its audios failed.
+        """
+        for audio in media.values():
+            if not isinstance(audio, Exception):
+                self._discard_audio(audio)
+
+    def _discard_audio(self, audio_path: Union[Path, str, InMemoryAudio]) -> None:
+        """Release an audio which has been sent, unless it is cached."""
+        if isinstance(audio_path, StoredAudio):
+            return
+        if isinstance(audio_path, InMemoryAudio):
+            audio_path.close()
+        elif self._audio_cache is None:
+            os.remove(audio_path)
+
+    def send_media(
+        self, audio_path: Union[Path, str, InMemoryAudio]
+    ) -> AnkiSendMediaResponse:
         """Send the created mp3 file to Anki collection folder (collection.media/)
 
         Args:
-            audio_path (Union[Path, str]): _description_
+            audio_path (Union[Path, str, InMemoryAudio]): The audio file, or the audio
+                created in memory.
 
         Returns:
             _type_: _description_
         """
-        if not isinstance(audio_path, Path):
-            audio_path = Path(audio_path)
-
-        audio_filename = audio_path.name.__str__()
-        audio_file_path = audio_path.__str__()
+        media_params = self._media_params(audio_path)
         # Store the audio file in Anki's media folder
-        response: Response = requests.post(
-            API_URL,
-            json={
-                "action": "storeMediaFile",
-                "version": 6,
-                "params": {
-                    "filename": audio_filename,
-                    "path": audio_file_path,
-                },
-            },
-        )
+        with metrics.timer("store_media"):
+            response = self._client.invoke("storeMediaFile", **media_params)
 
         return AnkiSendMediaResponse(
-            audio_path=audio_file_path,
-            audio_file_name=audio_filename,
+            audio_path=media_params.get("path"),
+            audio_file_name=media_params["filename"],
             status_code=response.status_code,
-            result=json.loads(response.text)["result"],
-            error=json.loads(response.text)["error"],
+            result=response.result,
+            error=response.error,
+        )
+
+    def create_audio(self, text: str) -> Union[Path, InMemoryAudio, StoredAudio]:
+        """Create the audio of a word, as a file or in memory depending on the mode.
+        An audio already stored according to the journal is reused instead.
+        """
+        if self._journal is not None:
+            filename = self._journal.media(text)
+            if filename is not None:
+                return StoredAudio(filename)
+        if self._in_memory_audio:
+            return create_audio_data(text, max_memory_size=self._max_audio_memory_size)
+        return create_audio(text, cache=self._audio_cache)
+
+    def store_audio(self, text: str) -> str:
+        """Create the audio of a text and store it in Anki's media folder, e.g. for a
+        field updated in place.
+
+        Raises:
+            MediaAdditionError: The audio could not be stored in Anki.
+
+        Returns:
+            str: The sound tag of the audio.
+        """
+        audio_path = self.create_audio(text)
+        if isinstance(audio_path, StoredAudio):
+            return f"[sound:{audio_path.filename}]"
+        try:
+            media_response = self.send_media(audio_path)
+        finally:
+            self._discard_audio(audio_path)
+        if media_response.error is not None:
+            raise MediaAdditionError(media_response)
+        return f"[sound:{media_response.audio_file_name}]"
+
+    def _create_audios(self, tts_workers: Optional[int] = None) -> Iterator[NoteMedia]:
+        """Create the audios of every anki-note, in order: of its front side, and of its
+        sentence if the field map has a field for it. With `tts_workers`, the audios are
+        created concurrently ahead of the notes being sent, longest first, and a failure
+        is yielded as its exception. Otherwise, each audio is created when it is needed
+        and a failure is raised.
+        """
+        return schedule_media(
+            self._anki_notes,
+            self.create_audio,
+            attributes=voiced_attributes(self._field_map),
+            max_workers=tts_workers,
+            release=self._discard_audio,
         )
 
-    def send_notes(self, audio: bool = True) -> List[AnkiNoteResponse]:
-        response_json_list = []
-        for anki_note in self._anki_notes:
-            audio_str = ""
-            if audio:
-                # Create the mp3 file
-                audio_path = create_audio(anki_note.front)
+    @staticmethod
+    def _media_error(media: NoteMedia) -> Optional[Exception]:
+        return next((a for a in media.values() if isinstance(a, Exception)), None)
+
+    def send_notes(
+        self,
+        audio: bool = True,
+        batch_size: Optional[int] = None,
+        tts_workers: Optional[int] = None,
+    ) -> Union[List[AnkiNoteResponse], NoteResults]:
+        """Send the anki-notes to AnkiConnect.
+
+        Args:
+            audio (bool, optional): Attach a TTS audio of the front side. Defaults to True.
+            batch_size (Optional[int], optional): If given, the notes are grouped into
+                batches of this size and each batch is sent with a single `multi` request
+                (one for the media, one for the notes). Failures are then reported per note
+                instead of raising. Defaults to None, i.e. one request per note.
+            tts_workers (Optional[int], optional): If given, the audios are created by this
+                many concurrent TTS requests while the notes are being sent, and a failed
+                audio is reported in the response of its note. Defaults to None, i.e. each
+                audio is created right before its note is sent.
+
+        Returns:
+            Union[List[AnkiNoteResponse], NoteResults]: The responses, in the same order
+                as the anki-notes, as a NoteResults table for a NoteBatch.
+        """
+        audio_paths = self._create_audios(tts_workers) if audio else None
+        if batch_size is not None:
+            return self._send_notes_batched(audio_paths, batch_size=batch_size)
+
+        response_json_list = self._new_responses()
+        try:
+            for anki_note in self._anki_notes:
+                media = None
+                if audio_paths is not None:
+                    # Create the mp3 files
+                    media = next(audio_paths)
+                    error = self._media_error(media)
+                    if error is not None:
+                        self._discard_media(media)
+                        self._respond(
+                            response_json_list,
+                            anki_note,
+                            self._audio_error_response(error),
+                        )
+                        continue
+
+                self._respond(
+                    response_json_list, anki_note, self._add_note(anki_note, media)
+                )
+        finally:
+            # The journal is flushed once per chunk rather than once per note.
+            if self._journal is not None:
+                self._journal.commit()
+
+        return response_json_list
+
+    def send_note(
+        self,
+        anki_note: AnkiNoteModel,
+        audio_path: Union[None, Path, str, InMemoryAudio, NoteMedia] = None,
+    ) -> AnkiNoteResponse:
+        """Send a single anki-note to AnkiConnect, along with its audio if given.
+
+        Args:
+            anki_note (AnkiNoteModel): The anki-note.
+            audio_path (Union[None, Path, str, InMemoryAudio, NoteMedia], optional): The
+                audio of the front side, or the audios of several attributes.
+
+        Raises:
+            MediaAdditionError: The audio could not be stored in Anki.
+
+        Returns:
+            AnkiNoteResponse: The response of AnkiConnect.
+        """
+        # Translate the API response to a readable message
+        return self.create_response(anki_note, self._add_note(anki_note, audio_path))
+
+    def _add_note(
+        self,
+        anki_note: AnkiNoteModel,
+        audio_path: Union[None, Path, str, InMemoryAudio, NoteMedia] = None,
+    ) -> AnkiConnectResponse:
+        """See `send_note`, without turning the response into an AnkiNoteResponse."""
+        if isinstance(audio_path, dict):
+            media = audio_path
+        else:
+            media = {"front": audio_path} if audio_path is not None else {}
+
+        audio_strs = {}
+        # The audios not sent yet, released if sending fails.
+        unsent = dict(media)
+        try:
+            for attribute, audio in media.items():
+                if isinstance(audio, StoredAudio):
+                    audio_strs[attribute] = f"[sound:{audio.filename}]"
+                    continue
 
                 # Send the mp3 to Anki's media folder
-                media_response = self.send_media(audio_path)
+                media_response = self.send_media(audio)
                 if media_response.error is not None:
                     raise MediaAdditionError(media_response)
 
                 # Create a str for denoting the media file
-                audio_str = f"[sound:{media_response.audio_file_name}]"
+                audio_strs[attribute] = f"[sound:{media_response.audio_file_name}]"
+                self._record(
+                    getattr(anki_note, attribute),
+                    "audio",
+                    filename=media_response.audio_file_name,
+                )
 
                 # remove the audio file that has been sent:
-                os.remove(audio_path)
-
-            # Create the Anki payload based on the created anki-note
-            note = {
-                "deckName": anki_note.deckName,
-                "modelName": anki_note.modelName,
-                "fields": {
-                    "表面": anki_note.front + audio_str,
-                    "裏面": anki_note.back,
-                },
-            }
+                del unsent[attribute]
+                self._discard_audio(audio)
+        except BaseException:
+            self._discard_media(unsent)
+            raise
+
+        # Create the Anki payload based on the created anki-note
+        note = self._note_payload(anki_note, audio_strs)
+
+        # Send the request to AnkiConnect to add the note to the deck
+        with metrics.timer("add_note"):
+            response = self._client.invoke("addNote", note=note)
+        if response.error is None:
+            self._record(anki_note.front, "added", note_id=response.result)
+        return response
+
+    def _record(self, front: str, stage: str, **data) -> None:
+        if self._journal is not None:
+            self._journal.record(front, stage, **data)
 
-            # Send the request to AnkiConnect to add the note to the deck
-            response = requests.post(
-                API_URL,
-                json.dumps(
-                    {
-                        "action": "addNote",
-                        "version": 6,
-                        "params": {
-                            "note": note,
-                        },
-                    }
-                ),
-            )
+    @staticmethod
+    def error_response(error: str) -> AnkiConnectResponse:
+        """A response for a note which could not be sent, e.g. its audio failed."""
+        return AnkiConnectResponse(status_code=None, error=error)
 
-            # Translate the API response to a readable message
-            card_create_response = self.create_response(anki_note, response)
-            response_json_list.append(card_create_response)
-            print(create_message(card_create_response))
+    @staticmethod
+    def _audio_error_response(error: Exception) -> AnkiConnectResponse:
+        return CardCreator.error_response(f"Failed to create audio: {error}")
+
+    def _send_notes_batched(
+        self,
+        audio_paths: Optional[Iterator[NoteMedia]],
+        batch_size: int,
+    ) -> Union[List[AnkiNoteResponse], NoteResults]:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}.")
+
+        response_json_list = self._new_responses()
+        for start in range(0, len(self._anki_notes), batch_size):
+            batch = self._anki_notes[start : start + batch_size]
+            audio_strs: List[Dict[str, str]] = [{} for _ in range(len(batch))]
+            responses: List[Optional[AnkiConnectResponse]] = [None] * len(batch)
+
+            if audio_paths is not None:
+                # Create the mp3 files and send them within one request
+                batch_audio_paths = {}
+                for i, media in enumerate(islice(audio_paths, len(batch))):
+                    error = self._media_error(media)
+                    if error is not None:
+                        responses[i] = self._audio_error_response(error)
+                        self._discard_media(media)
+                        continue
+                    for attribute, audio in media.items():
+                        if isinstance(audio, StoredAudio):
+                            audio_strs[i][attribute] = f"[sound:{audio.filename}]"
+                        else:
+                            batch_audio_paths[(i, attribute)] = audio
+
+                media_params = {
+                    key: self._media_params(path)
+                    for key, path in batch_audio_paths.items()
+                }
+                with metrics.timer("store_media"):
+                    media_responses = self._client.multi(
+                        [
+                            {"action": "storeMediaFile", "params": p}
+                            for p in media_params.values()
+                        ]
+                    )
+                for ((i, attribute), params), media_response in zip(
+                    media_params.items(), media_responses
+                ):
+                    if media_response.error is not None:
+                        responses[i] = AnkiConnectResponse(
+                            status_code=media_response.status_code,
+                            error=f"Failed to add media: {media_response.error}",
+                        )
+                    else:
+                        audio_strs[i][attribute] = f"[sound:{params['filename']}]"
+                        self._record(
+                            getattr(batch[i], attribute),
+                            "audio",
+                            filename=params["filename"],
+                        )
+
+                # remove the audio files that have been sent:
+                for audio_path in batch_audio_paths.values():
+                    self._discard_audio(audio_path)
+
+            # Only the notes whose media has been stored are sent
+            pending = [i for i, response in enumerate(responses) if response is None]
+            with metrics.timer("add_note"):
+                note_responses = self._client.multi(
+                    [
+                        {
+                            "action": "addNote",
+                            "params": {
+                                "note": self._note_payload(batch[i], audio_strs[i])
+                            },
+                        }
+                        for i in pending
+                    ]
+                )
+            for i, note_response in zip(pending, note_responses):
+                responses[i] = note_response
+                if note_response.error is None:
+                    self._record(batch[i].front, "added", note_id=note_response.result)
+            if self._journal is not None:
+                self._journal.commit()
+
+            for anki_note, response in zip(batch, responses):
+                self._respond(response_json_list, anki_note, response)
 
         return response_json_list
@@ -0,0 +1,148 @@
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+# The layout of a compiled dictionary: a header (magic, number of entries, length of
+# the metadata), the metadata in JSON (the languages), the offset of each entry, and
+# the entries, sorted by the UTF-8 bytes of their word.
+MAGIC = b"KDICT001"
+HEADER = struct.Struct("<8sQQ")
+OFFSET = struct.Struct("<Q")
+# Separates the word and the translation of an entry, and ends the entry.
+SEPARATOR = b"\x00"
+
+# The suffix of a dictionary compiled from a vocabulary sheet.
+COMPILED_SUFFIX = ".kdict"
+
+
+def compile_dictionary(
+    entries: Iterable[Tuple[str, str]],
+    path: Union[Path, str],
+    src: str = "ko",
+    dest: str = "ja",
+) -> int:
+    """Compile the (word, translation) entries into a dictionary file, which is then
+    looked up with LocalDictionary. Only the first translation of a word is kept.
+
+    Returns:
+        int: The number of entries.
+    """
+    translations: Dict[bytes, bytes] = {}
+    for word, translation in entries:
+        key = word.strip().encode("utf-8")
+        value = translation.strip().encode("utf-8")
+        if key and value and SEPARATOR not in key + value:
+            translations.setdefault(key, value)
+
+    meta = json.dumps({"src": src, "dest": dest}).encode("utf-8")
+    # The offsets are aligned on 8 bytes.
+    meta += b" " * (-(HEADER.size + len(meta)) % 8)
+    table_start = HEADER.size + len(meta)
+    data_start = table_start + OFFSET.size * len(translations)
+
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(translations), len(meta)))
+        f.write(meta)
+        offset = data_start
+        keys = sorted(translations)
+        for key in keys:
+            f.write(OFFSET.pack(offset))
+            offset += len(key) + len(translations[key]) + 2
+        for key in keys:
+            f.write(key + SEPARATOR + translations[key] + SEPARATOR)
+    os.replace(tmp_path, path)
+    return len(translations)
+
+
+class LocalDictionary:
+    """A compiled bilingual dictionary, memory-mapped rather than loaded: a word is
+    found by a binary search on the sorted entries, in O(log n) reads of the file,
+    which the OS pages in on demand and shares between processes.
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._mmap[: len(MAGIC)]
+        if magic != MAGIC or len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a compiled dictionary.")
+        _, self._count, meta_size = HEADER.unpack_from(self._mmap, 0)
+        meta = json.loads(self._mmap[HEADER.size : HEADER.size + meta_size])
+        self.src: str = meta["src"]
+        self.dest: str = meta["dest"]
+        self._table_start = HEADER.size + meta_size
+
+    @classmethod
+    def from_sheet(
+        cls,
+        sheet_path: Union[Path, str],
+        src: str = "ko",
+        dest: str = "ja",
+        **read_kwargs,
+    ) -> "LocalDictionary":
+        """Open the dictionary of a vocabulary sheet, e.g. a TSV of front and back
+        sides read with `read_rows`. The sheet is compiled next to it, with the
+        COMPILED_SUFFIX, unless its compiled dictionary is up to date.
+        """
+        from src.readers import read_rows
+
+        sheet_path = Path(sheet_path)
+        path = sheet_path.with_name(sheet_path.name + COMPILED_SUFFIX)
+        if not path.exists() or path.stat().st_mtime < sheet_path.stat().st_mtime:
+            compile_dictionary(
+                (
+                    (row["front"], row["back"])
+                    for row in read_rows(sheet_path, **read_kwargs)
+                    if "back" in row
+                ),
+                path,
+                src=src,
+                dest=dest,
+            )
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, index: int) -> Tuple[bytes, int]:
+        """The word of the entry at the index, and the offset of its translation."""
+        (offset,) = OFFSET.unpack_from(
+            self._mmap, self._table_start + index * OFFSET.size
+        )
+        end = self._mmap.find(SEPARATOR, offset)
+        return self._mmap[offset:end], end + 1
+
+    def get(self, word: str) -> Optional[str]:
+        """The translation of the word, or None if it is not in the dictionary."""
+        key = word.strip().encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, value_offset = self._entry(middle)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                end = self._mmap.find(SEPARATOR, value_offset)
+                return self._mmap[value_offset:end].decode("utf-8")
+        return None
+
+    def __contains__(self, word: str) -> bool:
+        return self.get(word) is not None
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "LocalDictionary":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+
+class ImportJournal:
+    """An append-only journal of the progress of an import, one JSON record per line.
+
+    Each record marks a stage completed for a word: "translated" (with the back side),
+    "audio" (with the media file name stored in Anki) and "added" (with the note id).
+    The records are written as they come and flushed to disk with `commit`, once per
+    batch. Reopening the journal restores the progress, so that an interrupted import
+    can be resumed without redoing the completed stages.
+    """
+
+    def __init__(self, path: Union[Path, str], resume: bool = True):
+        """
+        Args:
+            path (Union[Path, str]): The journal file.
+            resume (bool, optional): Restore the progress recorded in the file. Otherwise,
+                the file is truncated. Defaults to True.
+        """
+        self.path = Path(path)
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if resume and self.path.exists():
+            self._load()
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last record may be partial if the import was killed.
+                    continue
+                progress = self._progress.setdefault(record.pop("front"), {})
+                progress[record.pop("stage")] = record
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, front: str, stage: str, **data) -> None:
+        """Record that a stage is completed for a word. Call `commit` to persist it."""
+        with self._lock:
+            self._progress.setdefault(front, {})[stage] = data
+            self._file.write(
+                json.dumps({"front": front, "stage": stage, **data}, ensure_ascii=False)
+                + "\n"
+            )
+
+    def commit(self) -> None:
+        """Flush the records to disk."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.commit()
+            self._file.close()
+
+    def translation(self, front: str) -> Optional[str]:
+        """The recorded translation of the word, if any."""
+        return self._progress.get(front, {}).get("translated", {}).get("back")
+
+    def media(self, front: str) -> Optional[str]:
+        """The file name of the audio of the word already stored in Anki, if any."""
+        return self._progress.get(front, {}).get("audio", {}).get("filename")
+
+    def note_id(self, front: str) -> Optional[int]:
+        """The id of the note of the word already added to Anki, if any."""
+        return self._progress.get(front, {}).get("added", {}).get("note_id")
+
+    def skip_added(
+        self, words: Iterable[T], key: Optional[Callable[[T], str]] = None
+    ) -> Iterator[T]:
+        """Yield the words whose note has not been added yet, lazily. `key` gives the
+        front side of an item, e.g. of a row of a file, and defaults to the item itself.
+        """
+        for item in words:
+            if self.note_id(key(item) if key is not None else item) is None:
+                yield item
+
+    def summary(self) -> str:
+        n_added = sum("added" in progress for progress in self._progress.values())
+        return f"journal: {n_added} notes added ({self.path})"
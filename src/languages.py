@@ -0,0 +1,125 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# The Unicode ranges of the scripts which identify a language on their own.
+SCRIPT_RANGES: Dict[str, List[Tuple[int, int]]] = {
+    "ko": [
+        (0x1100, 0x11FF),  # Hangul Jamo
+        (0x3130, 0x318F),  # Hangul Compatibility Jamo
+        (0xA960, 0xA97F),  # Hangul Jamo Extended-A
+        (0xAC00, 0xD7A3),  # Hangul Syllables
+        (0xD7B0, 0xD7FF),  # Hangul Jamo Extended-B
+    ],
+    "ja": [
+        (0x3040, 0x309F),  # Hiragana
+        (0x30A0, 0x30FF),  # Katakana
+        (0x31F0, 0x31FF),  # Katakana Phonetic Extensions
+        (0xFF66, 0xFF9F),  # Halfwidth Katakana
+    ],
+    "zh": [
+        (0x3400, 0x4DBF),  # CJK Unified Ideographs Extension A
+        (0x4E00, 0x9FFF),  # CJK Unified Ideographs
+    ],
+    "ru": [(0x0400, 0x04FF)],  # Cyrillic
+    "en": [(0x0041, 0x005A), (0x0061, 0x007A)],  # Basic Latin letters
+}
+
+# Above this share of letters in its script, a text is in the language. Without any
+# letter in its script, it is not. In between, the text is ambiguous.
+MIN_SCRIPT_RATIO = 0.5
+
+
+def _script_of(char: str) -> Optional[str]:
+    code_point = ord(char)
+    for lang, ranges in SCRIPT_RANGES.items():
+        for start, end in ranges:
+            if start <= code_point <= end:
+                return lang
+    return None
+
+
+def script_counts(text: str) -> Dict[Optional[str], int]:
+    """Count the letters of the text per script. Other letters are counted under None,
+    and the characters which are not letters (digits, spaces, ...) are ignored.
+    """
+    counts: Dict[Optional[str], int] = {}
+    for char in text:
+        if char.isalpha():
+            script = _script_of(char)
+            counts[script] = counts.get(script, 0) + 1
+    return counts
+
+
+def detect_script(text: str) -> Optional[str]:
+    """The language whose script most of the letters of the text are written in."""
+    counts = script_counts(text)
+    counts.pop(None, None)
+    if not counts:
+        return None
+    return max(counts, key=counts.get)
+
+
+def _detect_with_langdetect(text: str) -> Optional[str]:
+    try:
+        from langdetect import DetectorFactory, detect
+        from langdetect.lang_detect_exception import LangDetectException
+    except ImportError:
+        return None
+
+    # Make the detection deterministic.
+    DetectorFactory.seed = 0
+    try:
+        return detect(text)
+    except LangDetectException:
+        return None
+
+
+def check_language(text: str, lang: str, fallback: bool = True) -> Optional[str]:
+    """Check that the text is in the expected language, based on the Unicode script of
+    its letters. Only the ambiguous texts, e.g. mixing scripts or in a language without
+    a script of its own, are passed to langdetect if `fallback` is set and langdetect
+    is installed. An ambiguous text which cannot be checked is accepted.
+
+    Args:
+        text (str): The text.
+        lang (str): The expected language, e.g. "ko".
+        fallback (bool, optional): Use langdetect for the ambiguous texts. Defaults to True.
+
+    Returns:
+        Optional[str]: The detected language if it is not the expected one, else None.
+    """
+    counts = script_counts(text)
+    n_letters = sum(counts.values())
+    detected = None
+    if lang in SCRIPT_RANGES and n_letters > 0:
+        ratio = counts.get(lang, 0) / n_letters
+        if ratio >= MIN_SCRIPT_RATIO:
+            return None
+        # CJK ideographs are also written in Japanese and Korean, so they do not
+        # rule these languages out.
+        if ratio == 0 and (lang == "zh" or "zh" not in counts):
+            detected = detect_script(text) or "unknown"
+
+    if detected is None and fallback:
+        detected = _detect_with_langdetect(text)
+    if detected is None or detected == lang:
+        return None
+    return detected
+
+
+def check_languages(
+    texts: Iterable[str], lang: str, fallback: bool = True
+) -> List[Optional[str]]:
+    """Check a whole list of texts at once, see `check_language`. Each distinct text
+    is only checked once.
+
+    Returns:
+        List[Optional[str]]: The detected language of each text which is not in the
+            expected language, None for the others.
+    """
+    detected: Dict[str, Optional[str]] = {}
+    results = []
+    for text in texts:
+        if text not in detected:
+            detected[text] = check_language(text, lang, fallback=fallback)
+        results.append(detected[text])
+    return results
@@ -1,6 +1,8 @@
 import argparse
+import sys
+from operator import itemgetter
 
-from src.card_creator import AnkiNotes, CardCreator
+from src import API_URL, AUDIO_CACHE_PATH, TRANSLATION_CACHE_PATH, WATCH_OFFSETS_PATH
 
 
 def get_args_parser(known=False):
@@ -17,12 +19,41 @@ def get_args_parser(known=False):
         "--word",
         help="The vocabulary for Anki cards.",
     )
+    group.add_argument(
+        "--watch",
+        nargs="+",
+        metavar="PATH",
+        help="Keep running and add the cards of the lines appended to these files, or of "
+        "the files dropped in these directories, as they come.",
+    )
+    group.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep running as a local server to which clients submit words or rows, "
+        "added in micro-batches.",
+    )
 
+    parser.add_argument(
+        "--format",
+        choices=["txt", "tsv", "csv", "jsonl"],
+        default=None,
+        help="Format of the file: one word per line (txt), or one card per row (tsv, csv "
+        "or jsonl) with e.g. its front, back, deckName and modelName. Defaults to the "
+        "format of the file extension, or txt.",
+    )
+    parser.add_argument(
+        "--columns",
+        default=None,
+        help="Columns of the fields of the cards in a tsv, csv or jsonl file, e.g. "
+        "front=word,back=meaning, or front=0,back=1 for a file without header. "
+        "The cards with a back side are not translated.",
+    )
     parser.add_argument(
         "-d",
         "--deck_name",
         default="korean",
-        help="Name of the Anki deck to which the cards will be added.",
+        help="Name of the Anki deck to which the cards will be added, "
+        "unless the file gives one.",
     )
     parser.add_argument(
         "-m",
@@ -30,31 +61,701 @@ def get_args_parser(known=False):
         default="Basic (裏表反転カード付き)+sentense",
         help="Name of the Anki card model to which the cards will be added.",
     )
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        default=None,
+        help="Send the cards in batches of this size, one AnkiConnect request per batch. "
+        "By default, each card is sent with its own request.",
+    )
+    parser.add_argument(
+        "--skip_existing",
+        action="store_true",
+        help="Look up the cards already in the deck first, and skip their words "
+        "before translating them or creating their audios.",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=None,
+        help="Stream the file: read, translate and send its words in chunks of this size, "
+        "instead of translating the whole file first.",
+    )
+    parser.add_argument(
+        "--no_audio",
+        action="store_true",
+        help="Create the cards without audio.",
+    )
+    parser.add_argument(
+        "--tts_workers",
+        type=int,
+        default=None,
+        help="Create the audios with this many concurrent TTS requests.",
+    )
+    parser.add_argument(
+        "--async_pipeline",
+        action="store_true",
+        help="Translate, create the audios and send the cards concurrently, "
+        "as a pipeline with one pool of workers per stage.",
+    )
+    parser.add_argument(
+        "--translate_workers",
+        type=int,
+        default=4,
+        help="Number of concurrent translations of the async pipeline.",
+    )
+    parser.add_argument(
+        "--anki_workers",
+        type=int,
+        default=1,
+        help="Number of concurrent AnkiConnect requests of the async pipeline.",
+    )
+    parser.add_argument(
+        "--in_memory_audio",
+        action="store_true",
+        help="Create the audios in memory and send their content to AnkiConnect, without "
+        "writing any file, e.g. when Anki runs on another machine. Disables the audio cache.",
+    )
+    parser.add_argument(
+        "--audio_spool_size",
+        type=int,
+        default=1024 * 1024,
+        help="With --in_memory_audio, size in bytes beyond which an audio is spooled "
+        "to a temporary file.",
+    )
+    parser.add_argument(
+        "--audio_cache_dir",
+        default=AUDIO_CACHE_PATH,
+        help="Folder of the cache of the created audios.",
+    )
+    parser.add_argument(
+        "--audio_cache_size",
+        type=int,
+        default=256,
+        help="Size cap of the audio cache in MiB. The least recently used audios are removed beyond it.",
+    )
+    parser.add_argument(
+        "--no_audio_cache",
+        action="store_true",
+        help="Create every audio from scratch, without the audio cache.",
+    )
+    parser.add_argument(
+        "--translate_batch_size",
+        type=int,
+        default=None,
+        help="Translate the distinct words of the file in batches of this size, one request per batch.",
+    )
+    parser.add_argument(
+        "--translation_cache",
+        default=TRANSLATION_CACHE_PATH,
+        help="SQLite file of the cache of the translations.",
+    )
+    parser.add_argument(
+        "--translation_cache_ttl",
+        type=float,
+        default=None,
+        help="Lifetime in days of a cached translation. By default, they never expire.",
+    )
+    parser.add_argument(
+        "--no_translation_cache",
+        action="store_true",
+        help="Translate every word from scratch, without the translation cache.",
+    )
+    parser.add_argument(
+        "--clear_translation_cache",
+        action="store_true",
+        help="Remove every cached translation before translating.",
+    )
+    parser.add_argument(
+        "--journal",
+        default=None,
+        help="Record the progress of each card in this journal file, so that the import "
+        "can be resumed with --resume.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Journal the import, in --journal or the file of the words with a .journal "
+        "suffix, and resume it from there if it was interrupted: the cards already added "
+        "are skipped, and the translations and audios already done are reused.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Sync the deck with the file: only the new rows are added, the changed rows "
+        "are updated, based on a manifest of the rows of the last sync.",
+    )
+    parser.add_argument(
+        "--sync_manifest",
+        default=None,
+        help="File of the sync manifest. Defaults to the file of the words with a "
+        ".sync.json suffix.",
+    )
+    parser.add_argument(
+        "--sync_delete",
+        action="store_true",
+        help="With --sync, also delete the cards of the rows removed from the file.",
+    )
+    parser.add_argument(
+        "--watch_offsets",
+        default=WATCH_OFFSETS_PATH,
+        help="File of the positions reached in the watched files, so that a restarted "
+        "watch goes on where it stopped.",
+    )
+    parser.add_argument(
+        "--watch_interval",
+        type=float,
+        default=1.0,
+        help="Seconds between two checks of the watched files for new lines.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address on which the server listens.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8766,
+        help="Port on which the server listens.",
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help="Unix socket on which the server listens, instead of --host and --port.",
+    )
+    parser.add_argument(
+        "--batch_window",
+        type=float,
+        default=50,
+        help="Milliseconds during which the server gathers the submissions into a batch, "
+        "which is sent earlier once it has --chunk_size (default 100) rows.",
+    )
+    parser.add_argument(
+        "--apkg",
+        default=None,
+        help="Write the cards into this .apkg package, to import into Anki, instead of "
+        "adding them with AnkiConnect. Anki does not need to be running.",
+    )
+    parser.add_argument(
+        "--fields",
+        default=None,
+        help="Fields of the note type of the other columns, e.g. "
+        "'sentence=Sentence,translated_sentence=Translation'. The sentences get an "
+        "audio too. By default, only the front and back sides are filled in.",
+    )
+    parser.add_argument(
+        "--translator",
+        choices=["google", "identity"],
+        default="google",
+        help="Backend of the translations: googletrans, or identity to leave the words "
+        "untranslated.",
+    )
+    parser.add_argument(
+        "--dictionary",
+        default=None,
+        help="Local dictionary looked up before the translator: a vocabulary sheet with "
+        "front and back sides (compiled next to it on first use), or a compiled .kdict.",
+    )
+    parser.add_argument(
+        "--translate_rate",
+        type=float,
+        default=None,
+        help="Maximum number of translation requests per second. By default, there is no limit.",
+    )
+    parser.add_argument(
+        "--tts_rate",
+        type=float,
+        default=None,
+        help="Maximum number of TTS requests per second. By default, there is no limit.",
+    )
+    parser.add_argument(
+        "--anki_rate",
+        type=float,
+        default=None,
+        help="Maximum number of AnkiConnect requests per second. By default, there is no limit.",
+    )
+    parser.add_argument(
+        "--max_retries",
+        type=int,
+        default=3,
+        help="Number of retries of a failed translation, TTS or AnkiConnect request, "
+        "with an exponential backoff.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each stage (translation, TTS, AnkiConnect requests, ...) "
+        "and the counters (cache hits, failures, ...) at the end.",
+    )
+    parser.add_argument(
+        "--profile_output",
+        default=None,
+        help="Write the profile to this file, in the Prometheus text format if it ends "
+        "with .prom, as JSON otherwise.",
+    )
+    parser.add_argument(
+        "--api_url",
+        default=API_URL,
+        help="URL of AnkiConnect.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Timeout in seconds of each request to AnkiConnect.",
+    )
 
     opt = parser.parse_known_args()[0] if known else parser.parse_args()
+    if opt.sync and (opt.file is None or opt.async_pipeline):
+        parser.error("--sync requires --file and does not support --async_pipeline.")
+    if opt.apkg and (
+        opt.watch or opt.serve or opt.sync or opt.async_pipeline or opt.skip_existing
+    ):
+        parser.error(
+            "--apkg does not support --watch, --serve, --sync, --async_pipeline "
+            "nor --skip_existing, which need AnkiConnect."
+        )
+    if opt.tts_workers is not None and opt.tts_workers < 1:
+        parser.error(f"--tts_workers must be positive, got {opt.tts_workers}.")
+    if opt.resume and not (opt.file or opt.journal):
+        parser.error("--resume requires --file or --journal, to find the journal.")
+    if opt.async_pipeline and (
+        opt.batch_size or opt.chunk_size or opt.translate_batch_size
+    ):
+        parser.error(
+            "--async_pipeline does not support --batch_size, --chunk_size nor "
+            "--translate_batch_size: it streams and sends the cards one by one."
+        )
+    if (opt.watch or opt.serve) and (
+        opt.skip_existing or opt.resume or opt.async_pipeline
+    ):
+        parser.error(
+            "--watch and --serve do not support --skip_existing, --resume "
+            "nor --async_pipeline."
+        )
+    if opt.fields is not None:
+        from src.media import parse_field_map
+
+        if opt.async_pipeline:
+            parser.error("--fields does not support --async_pipeline.")
+        try:
+            opt.fields = parse_field_map(opt.fields)
+        except ValueError as e:
+            parser.error(str(e))
     return opt
 
 
 def main():
     args = get_args_parser(known=True)
 
+    # Imported after parsing the arguments, so that e.g. `kanki --help` stays fast.
+    from src.anki_connect import AnkiConnectClient
+    from src.audio_cache import AudioCache
+    from src.card_creator import AnkiNotes, CardCreator
+    from src.journal import ImportJournal
+    from src.models import AnkiNoteModel
+    from src.preflight import ExistingNotesFilter
+    from src.readers import parse_columns, read_rows
+    from src.sync import SyncManifest
+    from src.translation import (
+        TranslationCache,
+        create_backend,
+        set_default_backend,
+        translate_resilience,
+    )
+    from src.utils import tts_resilience
+
     print(f"deck name: {args.deck_name}; card model: {args.model_name}")
 
-    if args.file:
-        anki_notes = AnkiNotes.from_txt(
-            data_fname=args.file,
-            deck_name=args.deck_name,
-            model_name=args.model_name,
-        ).anki_notes
-    else:
-        anki_notes = AnkiNotes.from_input_word(
-            input_str=args.word,
-            deck_name=args.deck_name,
-            model_name=args.model_name,
-        ).anki_notes
-
-    card_creator = CardCreator(anki_notes)
-    response_list = card_creator.send_notes(audio=True)
+    translate_resilience.configure(
+        rate=args.translate_rate, max_retries=args.max_retries
+    )
+    tts_resilience.configure(rate=args.tts_rate, max_retries=args.max_retries)
+    set_default_backend(create_backend(args.translator, dictionary=args.dictionary))
+
+    translation_cache = None
+    if not args.no_translation_cache:
+        translation_cache = TranslationCache(
+            args.translation_cache,
+            ttl=(
+                args.translation_cache_ttl * 24 * 60 * 60
+                if args.translation_cache_ttl is not None
+                else None
+            ),
+        )
+        if args.clear_translation_cache:
+            translation_cache.clear()
+
+    audio_cache = None
+    if not (args.no_audio or args.no_audio_cache or args.in_memory_audio):
+        audio_cache = AudioCache(
+            args.audio_cache_dir, max_bytes=args.audio_cache_size * 1024 * 1024
+        )
+
+    # The imports are journaled on demand, so that they can be resumed.
+    journal = None
+    journal_path = args.journal or (
+        f"{args.file}.journal" if args.file and args.resume else None
+    )
+    if journal_path is not None:
+        journal = ImportJournal(journal_path, resume=args.resume)
+
+    with AnkiConnectClient(api_url=args.api_url, timeout=args.timeout) as client:
+        client.resilience.configure(rate=args.anki_rate, max_retries=args.max_retries)
+        if args.watch or args.serve:
+            (watch if args.watch else serve)(
+                args, client, translation_cache, audio_cache, journal
+            )
+            report(args, translation_cache, audio_cache, journal)
+            return
+
+        if args.file:
+            rows = read_rows(
+                args.file,
+                file_format=args.format,
+                columns=parse_columns(args.columns) if args.columns else None,
+            )
+        else:
+            rows = [{"front": args.word}]
+
+        # In sync mode, only the new rows are sent, the changed ones are updated later.
+        manifest = sync_plan = None
+        if args.sync:
+            manifest = SyncManifest(args.sync_manifest or f"{args.file}.sync.json")
+            sync_plan = manifest.diff(rows)
+            print(sync_plan.summary())
+            rows = sync_plan.new
+
+        if args.resume and journal is not None:
+            rows = journal.skip_added(rows, key=itemgetter("front"))
+
+        existing_notes_filter = None
+        if args.skip_existing:
+            existing_notes_filter = ExistingNotesFilter.from_deck(
+                client, deck_name=args.deck_name
+            )
+            rows = existing_notes_filter.filter(rows, key=itemgetter("front"))
+
+        if args.async_pipeline:
+            from src.async_card_creator import AsyncCardCreator
+
+            async_card_creator = AsyncCardCreator(
+                client=client,
+                audio_cache=audio_cache,
+                in_memory_audio=args.in_memory_audio,
+                max_audio_memory_size=args.audio_spool_size,
+                translation_cache=translation_cache,
+                translate_workers=args.translate_workers,
+                tts_workers=args.tts_workers or 4,
+                anki_workers=args.anki_workers,
+                journal=journal,
+            )
+            response_list = async_card_creator.send_notes(
+                (
+                    AnkiNoteModel(
+                        **{
+                            "deckName": args.deck_name,
+                            "modelName": args.model_name,
+                            **row,
+                        }
+                    )
+                    for row in rows
+                ),
+                audio=not args.no_audio,
+            )
+        else:
+            # The anki-notes are sent chunk by chunk; without streaming, there is one chunk.
+            anki_notes_chunks = AnkiNotes.iter_batches(
+                rows,
+                chunk_size=args.chunk_size or sys.maxsize,
+                deck_name=args.deck_name,
+                model_name=args.model_name,
+                translation_cache=translation_cache,
+                translate_batch_size=args.translate_batch_size,
+                journal=journal,
+            )
+
+            exporter = None
+            if args.apkg:
+                from src.apkg import ApkgExporter
+
+                exporter = ApkgExporter(
+                    args.apkg,
+                    audio_cache=audio_cache,
+                    in_memory_audio=args.in_memory_audio,
+                    max_audio_memory_size=args.audio_spool_size,
+                    field_map=args.fields,
+                )
+
+            try:
+                for anki_notes in anki_notes_chunks:
+                    if exporter is not None:
+                        exporter.add_notes(
+                            anki_notes,
+                            audio=not args.no_audio,
+                            tts_workers=args.tts_workers,
+                        )
+                        continue
+
+                    card_creator = CardCreator(
+                        anki_notes,
+                        client=client,
+                        audio_cache=audio_cache,
+                        in_memory_audio=args.in_memory_audio,
+                        max_audio_memory_size=args.audio_spool_size,
+                        journal=journal,
+                        field_map=args.fields,
+                    )
+                    response_list = card_creator.send_notes(
+                        audio=not args.no_audio,
+                        batch_size=args.batch_size,
+                        tts_workers=args.tts_workers,
+                    )
+                    if manifest is not None:
+                        manifest.record_results(sync_plan, response_list)
+
+                if manifest is not None:
+                    sync_changes(
+                        client,
+                        manifest,
+                        sync_plan,
+                        delete=args.sync_delete,
+                        translation_cache=translation_cache,
+                        batch_size=args.batch_size or 100,
+                        field_map=args.fields,
+                        audio_cache=audio_cache,
+                        audio=not args.no_audio,
+                        in_memory_audio=args.in_memory_audio,
+                        max_audio_memory_size=args.audio_spool_size,
+                    )
+            except BaseException:
+                if exporter is not None:
+                    exporter.abort()
+                raise
+            else:
+                if exporter is not None:
+                    exporter.close()
+                    print(exporter.summary())
+            finally:
+                # The notes added so far are kept, even if the sync is interrupted.
+                if manifest is not None:
+                    manifest.save()
+
+    report(args, translation_cache, audio_cache, journal, existing_notes_filter)
+
+
+def report(
+    args, translation_cache, audio_cache, journal=None, existing_notes_filter=None
+):
+    """Print the summaries of the run, and its profile if asked for."""
+    from src.metrics import metrics
+
+    if existing_notes_filter is not None:
+        print(existing_notes_filter.summary())
+    if journal is not None:
+        print(journal.summary())
+        journal.close()
+    print_summary(translation_cache, audio_cache)
+
+    if args.profile:
+        print(metrics.report_table())
+    if args.profile_output is not None:
+        with open(args.profile_output, "w") as f:
+            f.write(
+                metrics.to_prometheus()
+                if args.profile_output.endswith(".prom")
+                else metrics.to_json()
+            )
+
+
+def send_rows(
+    args, rows, client, translation_cache=None, audio_cache=None, journal=None
+):
+    """Add the notes of the rows, as a single batch, for the long-running modes.
+
+    Returns:
+        NoteResults: The response of each row, in order.
+    """
+    from src.card_creator import AnkiNotes, CardCreator
+
+    (anki_notes,) = AnkiNotes.iter_batches(
+        rows,
+        chunk_size=len(rows),
+        deck_name=args.deck_name,
+        model_name=args.model_name,
+        translation_cache=translation_cache,
+        translate_batch_size=args.translate_batch_size,
+        journal=journal,
+    )
+    return CardCreator(
+        anki_notes,
+        client=client,
+        audio_cache=audio_cache,
+        in_memory_audio=args.in_memory_audio,
+        max_audio_memory_size=args.audio_spool_size,
+        journal=journal,
+        field_map=args.fields,
+    ).send_notes(
+        audio=not args.no_audio,
+        batch_size=args.batch_size or len(rows),
+        # With TTS workers, a failed audio fails its own row rather than the batch,
+        # which gathers the rows of several clients.
+        tts_workers=args.tts_workers or 1,
+    )
+
+
+def watch(args, client, translation_cache=None, audio_cache=None, journal=None):
+    """Add the cards of the rows appended to the watched files, batch by batch, until
+    interrupted. The translator, the TTS and the connections to AnkiConnect are kept
+    warm between the batches.
+    """
+    from src.readers import parse_columns
+    from src.watch import Watcher, WatchOffsets
+
+    def process(rows):
+        send_rows(args, rows, client, translation_cache, audio_cache, journal)
+
+    watcher = Watcher(
+        args.watch,
+        WatchOffsets(args.watch_offsets),
+        file_format=args.format,
+        columns=parse_columns(args.columns) if args.columns else None,
+        batch_size=args.chunk_size or 100,
+        interval=args.watch_interval,
+    )
+    print(f"watching {', '.join(args.watch)}; press Ctrl+C to stop")
+    try:
+        watcher.run(process)
+    except KeyboardInterrupt:
+        print("watch stopped")
+
+
+def serve(args, client, translation_cache=None, audio_cache=None, journal=None):
+    """Serve the submissions of the clients until interrupted, adding their notes in
+    micro-batches which share the translation, TTS and AnkiConnect requests.
+    """
+    from src.server import MicroBatcher, create_server
+
+    def process(rows):
+        responses = send_rows(
+            args, rows, client, translation_cache, audio_cache, journal
+        )
+        table = responses.table()
+        return [
+            {name: column[i] for name, column in table.items()}
+            for i in range(len(responses))
+        ]
+
+    batcher = MicroBatcher(
+        process,
+        max_batch_size=args.chunk_size or 100,
+        max_delay=args.batch_window / 1000,
+    )
+    try:
+        server = create_server(
+            batcher, host=args.host, port=args.port, socket_path=args.socket
+        )
+    except OSError as e:
+        batcher.close()
+        print(f"Error: cannot serve: {e}")
+        return
+    print(
+        f"serving on {args.socket or f'http://{args.host}:{args.port}'}; "
+        "press Ctrl+C to stop"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("server stopped")
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+def sync_changes(
+    client,
+    manifest,
+    sync_plan,
+    delete,
+    translation_cache=None,
+    batch_size=100,
+    field_map=None,
+    audio_cache=None,
+    audio=True,
+    in_memory_audio=False,
+    max_audio_memory_size=1024 * 1024,
+):
+    """Update the notes of the changed rows, translating those without a back side and
+    voicing their mapped sentence again, and delete the notes of the removed rows if
+    `delete` is set.
+    """
+    from src.card_creator import CardCreator, translate_fronts
+    from src.media import DEFAULT_FIELD_MAP, voiced_attributes
+    from src.sync import delete_notes, update_notes
+
+    field_map = field_map if field_map is not None else DEFAULT_FIELD_MAP
+    # The front side keeps its audio, only the other voiced fields are replaced.
+    attributes = [a for a in voiced_attributes(field_map) if a != "front"]
+    audio_strs = {}
+    if audio and attributes:
+        card_creator = CardCreator(
+            [],
+            client=client,
+            audio_cache=audio_cache,
+            in_memory_audio=in_memory_audio,
+            max_audio_memory_size=max_audio_memory_size,
+        )
+        changed = []
+        for row, note_id in sync_plan.changed:
+            try:
+                audio_strs[row["front"]] = {
+                    attribute: card_creator.store_audio(row[attribute])
+                    for attribute in attributes
+                    if row.get(attribute)
+                }
+            except Exception as e:
+                # Not recorded in the manifest, so the row is synced again next time.
+                print(f"{row['front']}: Error: Failed to create audio: {e}")
+            else:
+                changed.append((row, note_id))
+        sync_plan.changed = changed
+
+    translations = translate_fronts(
+        [row["front"] for row, _ in sync_plan.changed if not row.get("back")],
+        translation_cache=translation_cache,
+    )
+    responses = update_notes(
+        client,
+        manifest,
+        sync_plan,
+        translations=translations,
+        batch_size=batch_size,
+        field_map=field_map,
+        audio_strs=audio_strs,
+    )
+    for (row, _), response in zip(sync_plan.changed, responses):
+        status = (
+            "Note updated" if response.error is None else f"Error: {response.error}"
+        )
+        print(f"{row['front']}: {status}")
+
+    if delete and sync_plan.removed:
+        responses = delete_notes(client, manifest, sync_plan, batch_size=batch_size)
+        n_errors = sum(response.error is not None for response in responses)
+        print(
+            f"deleted the notes of {len(sync_plan.removed)} removed rows"
+            + (f" ({n_errors} failed requests)" if n_errors else "")
+        )
+
+
+def print_summary(translation_cache, audio_cache):
+    if translation_cache is not None:
+        print(translation_cache.summary())
+        translation_cache.close()
+    if audio_cache is not None:
+        print(audio_cache.summary())
 
 
 if __name__ == "__main__":
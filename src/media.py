@@ -0,0 +1,193 @@
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import Future
+from itertools import count, islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from src import BACK_FIELD, FRONT_FIELD
+
+# The attributes of an anki-note which can be put into the fields of its note type.
+NOTE_ATTRIBUTES = ("front", "back", "sentence", "translated_sentence")
+
+# The attributes which are voiced, each audio being attached to the field of its text.
+AUDIO_ATTRIBUTES = ("front", "sentence")
+
+# The field of each attribute of the anki-notes, unless configured otherwise.
+DEFAULT_FIELD_MAP = {"front": FRONT_FIELD, "back": BACK_FIELD}
+
+# The window of anki-notes whose clips are scheduled, in multiples of the TTS workers.
+LOOKAHEAD = 4
+
+# The audios of an anki-note, by attribute, or the exception raised while creating one.
+NoteMedia = Dict[str, Union[Any, Exception]]
+
+
+def parse_field_map(spec: str) -> Dict[str, str]:
+    """Parse a field mapping such as "sentence=例文,translated_sentence=例文訳", on
+    top of the DEFAULT_FIELD_MAP.
+
+    Raises:
+        ValueError: The mapping is malformed, maps an unknown attribute or maps two
+            attributes to the same field.
+    """
+    field_map = dict(DEFAULT_FIELD_MAP)
+    for item in spec.split(","):
+        attribute, sep, field = item.partition("=")
+        attribute, field = attribute.strip(), field.strip()
+        if not sep or not field:
+            raise ValueError(
+                f"Invalid field mapping {item!r}, expected attribute=field."
+            )
+        if attribute not in NOTE_ATTRIBUTES:
+            raise ValueError(
+                f"Unknown attribute {attribute!r}, "
+                f"expected one of {', '.join(NOTE_ATTRIBUTES)}."
+            )
+        field_map[attribute] = field
+    if len(set(field_map.values())) < len(field_map):
+        raise ValueError(f"Several attributes are mapped to the same field: {spec!r}.")
+    return field_map
+
+
+def voiced_attributes(field_map: Dict[str, str]) -> List[str]:
+    """The attributes whose audio has a field to be attached to."""
+    return [attribute for attribute in AUDIO_ATTRIBUTES if attribute in field_map]
+
+
+def schedule_media(
+    anki_notes: Iterable[Any],
+    create: Callable[[str], Any],
+    attributes: Iterable[str] = ("front",),
+    max_workers: Optional[int] = None,
+    lookahead: int = LOOKAHEAD,
+    release: Optional[Callable[[Any], None]] = None,
+) -> Iterator[NoteMedia]:
+    """Create the audios of several attributes of each anki-note, e.g. of the word and
+    of its example sentence.
+
+    With `max_workers`, the clips share a pool of TTS workers, and each free worker
+    takes the longest clip of the next `lookahead * max_workers` anki-notes: the time of
+    a clip grows with its text, so starting the long sentences early keeps them from
+    being the last clips left, running alone while the other workers are idle. The
+    window slides as the anki-notes are consumed, so that the first ones are ready
+    early and only the audios of the window are held at once. Otherwise, the clips of
+    each anki-note are created when the previous ones have been consumed, and a failure
+    is raised.
+
+    Args:
+        anki_notes (Iterable[Any]): The anki-notes.
+        create (Callable[[str], Any]): Creates the audio of a text.
+        attributes (Iterable[str], optional): The attributes to voice. Defaults to
+            the front side only.
+        max_workers (Optional[int], optional): The number of concurrent TTS requests.
+        lookahead (int, optional): The size of the window of anki-notes whose clips
+            are scheduled, in multiples of `max_workers`. Defaults to LOOKAHEAD.
+        release (Optional[Callable[[Any], None]], optional): Releases an audio
+            created ahead but never yielded, e.g. when the consumer stops early.
+            Defaults to None.
+
+    Yields:
+        NoteMedia: The audio of each voiced attribute of each anki-note, in order,
+            or the exception raised while creating it. Empty attributes are skipped.
+    """
+    attributes = list(attributes)
+    if max_workers is None:
+        for anki_note in anki_notes:
+            yield {
+                attribute: create(text)
+                for attribute, text in _texts(anki_note, attributes)
+            }
+        return
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be positive, got {max_workers}.")
+
+    # The clips of the window which are not started yet, longest first.
+    heap: List[Tuple[int, int, str, Future]] = []
+    condition = threading.Condition()
+    closed = False
+    order = count()
+    notes = iter(anki_notes)
+    # The futures of the clips of each anki-note of the window, by attribute.
+    window: Deque[Dict[str, Future]] = deque()
+
+    def read(n_notes: int) -> None:
+        jobs = []
+        for anki_note in islice(notes, n_notes):
+            futures = {}
+            for attribute, text in _texts(anki_note, attributes):
+                futures[attribute] = Future()
+                jobs.append((-len(text), next(order), text, futures[attribute]))
+            window.append(futures)
+        with condition:
+            for job in jobs:
+                heapq.heappush(heap, job)
+            condition.notify(len(jobs))
+
+    def work() -> None:
+        while True:
+            with condition:
+                while not heap and not closed:
+                    condition.wait()
+                if closed:
+                    return
+                *_, text, future = heapq.heappop(heap)
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(create(text))
+            except Exception as e:
+                future.set_exception(e)
+
+    read(max(1, lookahead * max_workers))
+    workers = [threading.Thread(target=work, daemon=True) for _ in range(max_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        while window:
+            # Left in the window until yielded, so that its audios are released if
+            # reading the next anki-note fails.
+            note_futures = window[0]
+            # Keep the workers busy while this anki-note is consumed.
+            read(1)
+            media: NoteMedia = {}
+            # In the order of the attributes, whatever the order of the clips.
+            for attribute in attributes:
+                if attribute not in note_futures:
+                    continue
+                try:
+                    media[attribute] = note_futures[attribute].result()
+                except Exception as e:
+                    media[attribute] = e
+            window.popleft()
+            yield media
+    finally:
+        with condition:
+            closed = True
+            heap.clear()
+            condition.notify_all()
+        for worker in workers:
+            worker.join()
+        # The clips of the window are now either created or never started.
+        if release is not None:
+            for note_futures in window:
+                for future in note_futures.values():
+                    if future.done() and future.exception() is None:
+                        release(future.result())
+
+
+def _texts(anki_note: Any, attributes: List[str]) -> Iterator[Tuple[str, str]]:
+    for attribute in attributes:
+        text = getattr(anki_note, attribute)
+        if text:
+            yield attribute, text
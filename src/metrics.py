@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+# A sink receives every measurement as it is made: its kind ("timing" or "counter"),
+# its name, e.g. "translate" or "audio_cache_hits", and its value, in seconds for
+# the timings.
+MetricsSink = Callable[[str, str, float], None]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Metrics:
+    """A registry of the timings of the stages of kanki and of its counters.
+
+    The stages are timed with `timer`, e.g. "translate", "validate_language", "tts",
+    "store_media" and "add_note", and the events are counted with `incr`, e.g. the
+    cache hits, the retries and the failed notes. Library users can plug in their
+    own metrics system with `add_sink`.
+    """
+
+    def __init__(self):
+        self._timings: Dict[str, List[float]] = {}
+        self._counters: Dict[str, float] = {}
+        self._sinks: List[MetricsSink] = []
+        self._lock = threading.Lock()
+
+    def add_sink(self, sink: MetricsSink) -> None:
+        """Forward every measurement to the sink, in addition to the registry."""
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink: MetricsSink) -> None:
+        self._sinks.remove(sink)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as one run of the stage, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a run of the stage which took the given time."""
+        with self._lock:
+            self._timings.setdefault(stage, []).append(seconds)
+        for sink in self._sinks:
+            sink("timing", stage, seconds)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for sink in self._sinks:
+            sink("counter", name, value)
+
+    def reset(self) -> None:
+        """Forget every measurement. The sinks are kept."""
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """The statistics of each stage, in seconds, and the counters."""
+        with self._lock:
+            timings = {stage: sorted(values) for stage, values in self._timings.items()}
+            counters = dict(self._counters)
+        return {
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total": sum(values),
+                    "mean": sum(values) / len(values),
+                    "p50": _percentile(values, 0.5),
+                    "p99": _percentile(values, 0.99),
+                    "max": values[-1],
+                }
+                for stage, values in timings.items()
+            },
+            "counters": counters,
+        }
+
+    def report_table(self) -> str:
+        """A readable table of the timings and the counters."""
+        summary = self.summary()
+        lines = [
+            f"{'stage':<20}{'count':>8}{'total s':>11}{'mean ms':>11}"
+            f"{'p50 ms':>11}{'p99 ms':>11}{'max ms':>11}"
+        ]
+        for stage, stats in summary["stages"].items():
+            lines.append(
+                f"{stage:<20}{stats['count']:>8}{stats['total']:>11.3f}"
+                + "".join(
+                    f"{stats[key] * 1000:>11.2f}"
+                    for key in ("mean", "p50", "p99", "max")
+                )
+            )
+        if summary["counters"]:
+            lines.append("")
+            lines.append(f"{'counter':<20}{'value':>8}")
+            for name, value in summary["counters"].items():
+                lines.append(f"{name:<20}{value:>8g}")
+        return "\n".join(lines)
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, prefix: str = "kanki") -> str:
+        """The measurements in the Prometheus text format, e.g. for the textfile
+        collector of the node exporter.
+        """
+        summary = self.summary()
+        lines = []
+        if summary["stages"]:
+            name = f"{prefix}_stage_seconds"
+            lines.append(f"# HELP {name} The time spent in each stage of kanki.")
+            lines.append(f"# TYPE {name} summary")
+            for stage, stats in summary["stages"].items():
+                for quantile in ("p50", "p99"):
+                    lines.append(
+                        f'{name}{{stage="{stage}",quantile="0.{quantile[1:]}"}} '
+                        f"{stats[quantile]}"
+                    )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {stats["total"]}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        for counter, value in summary["counters"].items():
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry of the measurements of kanki.
+metrics = Metrics()
@@ -1,16 +1,20 @@
-from typing import Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
-from langdetect import detect
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, ValidationInfo, model_validator
 
 from src import DECK_NAME, MODEL_NAME
+from src.languages import check_language, check_languages
+from src.metrics import metrics
+
+# Validation context flag of the anki-notes whose languages are already checked.
+SKIP_LANGUAGE_CHECK = "skip_language_check"
 
 
 class AnkiNoteModel(BaseModel):
     deckName: str = DECK_NAME
     modelName: str = MODEL_NAME
     front: str
-    back: str = None
+    back: Optional[str] = None
     sentence: Optional[str] = None
     translated_sentence: Optional[str] = None
     audio: Optional[str] = None
@@ -23,16 +27,20 @@ class AnkiNoteModel(BaseModel):
     # ]  # Default expected language for the 'back' field
 
     @model_validator(mode="after")
-    def check_languages(self):
+    def check_languages(self, info: ValidationInfo):
+        if info.context and info.context.get(SKIP_LANGUAGE_CHECK):
+            return self
+
         front_lang = self.frontLang
         # back_lang = self.backLang
 
         # Detect languages of `front` and `back` fields
-        detected_front_lang = detect(self.front)
+        with metrics.timer("validate_language"):
+            detected_front_lang = check_language(self.front, front_lang)
         # detected_back_lang = detect(self.back)
 
         # Validate detected languages against expected languages
-        if front_lang != detected_front_lang:
+        if detected_front_lang is not None:
             raise ValueError(
                 f"Expected language for 'front' field is '{front_lang}', but detected '{detected_front_lang}'."
             )
@@ -44,9 +52,76 @@ class AnkiNoteModel(BaseModel):
 
         return self
 
+    @classmethod
+    def validate_many(cls, notes: List[Dict[str, Any]]) -> List["AnkiNoteModel"]:
+        """Create several anki-notes, checking the languages of the whole list at once
+        instead of note by note.
+
+        Raises:
+            ValueError: The front side of some notes is not in the expected language.
+        """
+        check_front_languages(
+            [note["front"] for note in notes],
+            [note.get("frontLang", "ko") for note in notes],
+        )
+
+        return [
+            cls.model_validate(note, context={SKIP_LANGUAGE_CHECK: True})
+            for note in notes
+        ]
+
+
+def check_front_languages(fronts: List[str], front_langs: List[str]) -> None:
+    """Check the languages of the front sides of a whole list of anki-notes at once.
+
+    Args:
+        fronts (List[str]): The front sides.
+        front_langs (List[str]): The expected language of each front side.
+
+    Raises:
+        ValueError: Some front sides are not in the expected language, all reported.
+    """
+    fronts_by_lang: Dict[str, List[int]] = {}
+    for i, front_lang in enumerate(front_langs):
+        fronts_by_lang.setdefault(front_lang, []).append(i)
+
+    errors = []
+    for front_lang, indices in fronts_by_lang.items():
+        with metrics.timer("validate_language"):
+            detected_langs = check_languages([fronts[i] for i in indices], front_lang)
+        for i, detected_lang in zip(indices, detected_langs):
+            if detected_lang is not None:
+                errors.append(
+                    f"{fronts[i]!r}: Expected language for 'front' field "
+                    f"is '{front_lang}', but detected '{detected_lang}'."
+                )
+    if errors:
+        raise ValueError("\n".join(errors))
+
+
+def check_row(row: Any, front_lang: str = "ko") -> Dict[str, str]:
+    """Check a single row of note fields, e.g. submitted to the server or appended to a
+    watched file, so that an invalid row is reported on its own rather than failing
+    the whole batch it came in.
+
+    Returns:
+        Dict[str, str]: The row, with the non-empty fields of NOTE_FIELDS only.
+
+    Raises:
+        ValueError: The row has no front side, or not in the expected language.
+    """
+    from src.readers import NOTE_FIELDS
+
+    front = row.get("front") if isinstance(row, dict) else None
+    if not isinstance(front, str) or not front.strip():
+        raise ValueError(f"Row without a front side: {row!r}.")
+    check_front_languages([front], [front_lang])
+    return {field: row[field] for field in NOTE_FIELDS if row.get(field)}
+
 
 class AnkiNoteResponse(AnkiNoteModel):
-    status_code: int
+    # None if the request has not been sent, e.g. the audio could not be created.
+    status_code: Union[None, int]
     result: Union[None, int]
     error: Union[None, str]
 
@@ -55,8 +130,15 @@ class AnkiNoteResponse(AnkiNoteModel):
 
 
 class AnkiSendMediaResponse(BaseModel):
-    audio_path: str
+    # None if the audio has been sent from memory.
+    audio_path: Union[None, str]
     audio_file_name: str
     status_code: int
     result: Union[None, str] = None
     error: Union[None, str] = None
+
+
+class AnkiConnectResponse(BaseModel):
+    status_code: Union[None, int]
+    result: Any = None
+    error: Union[None, str] = None
@@ -0,0 +1,228 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from src import DECK_NAME, MODEL_NAME
+from src.models import (
+    AnkiConnectResponse,
+    AnkiNoteModel,
+    AnkiNoteResponse,
+    check_front_languages,
+)
+
+# The fields of AnkiNoteModel, each stored as a column of a NoteBatch.
+NOTE_COLUMNS = (
+    "deckName",
+    "modelName",
+    "front",
+    "back",
+    "sentence",
+    "translated_sentence",
+    "audio",
+    "frontLang",
+)
+
+# The fields which AnkiNoteResponse adds, each stored as a column of a NoteResults.
+RESULT_COLUMNS = ("status_code", "result", "error")
+
+
+class NoteView:
+    """A view of one anki-note of a NoteBatch, or of its result in a NoteResults, with
+    the attributes of AnkiNoteModel (or AnkiNoteResponse). Nothing is copied: the
+    attributes are read from the columns.
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: Union["NoteBatch", "NoteResults"], index: int):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        return self._table.column(name)[self._index]
+
+    def to_model(self) -> Union[AnkiNoteModel, AnkiNoteResponse]:
+        return self._table.to_model(self._index)
+
+
+class NoteBatch:
+    """A batch of anki-notes stored column by column, instead of one pydantic model
+    per note. The deck and model names are shared between the notes, and the
+    languages of the whole batch are checked at once. The notes are only turned into
+    AnkiNoteModel when asked for with `to_model`.
+
+    Indexing the batch gives a NoteView of a note, and slicing it gives a NoteBatch,
+    so that it can be used in place of a list of anki-notes.
+    """
+
+    __slots__ = NOTE_COLUMNS
+
+    def __init__(self, **columns: List[Any]):
+        """
+        Args:
+            **columns (List[Any]): The column of each field of NOTE_COLUMNS, all of the
+                same length. The front column is required, the missing ones are None.
+        """
+        unknown = set(columns) - set(NOTE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns {sorted(unknown)}.")
+        size = len(columns["front"])
+        for name in NOTE_COLUMNS:
+            column = columns.get(name)
+            if column is None:
+                column = [None] * size
+            elif len(column) != size:
+                raise ValueError(
+                    f"Column {name!r} has {len(column)} values, not {size}."
+                )
+            setattr(self, name, column)
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Dict[str, Any]],
+        deck_name: str = DECK_NAME,
+        model_name: str = MODEL_NAME,
+        front_lang: str = "ko",
+    ) -> "NoteBatch":
+        """Create a batch from rows of note fields, e.g. read by `read_rows`, checking
+        the languages of all the front sides at once. The rows without a deck or a model
+        get the given ones.
+
+        Raises:
+            ValueError: A row has no front side, or the front side of some rows is not
+                in the expected language.
+        """
+        columns: Dict[str, List[Any]] = {name: [] for name in NOTE_COLUMNS}
+        # A single string object per distinct value of these columns.
+        shared: Dict[str, str] = {}
+        defaults = {
+            "deckName": deck_name,
+            "modelName": model_name,
+            "frontLang": front_lang,
+        }
+        for row in rows:
+            if not row.get("front"):
+                raise ValueError(f"Row without a front side: {row!r}.")
+            for name, column in columns.items():
+                value = row.get(name, defaults.get(name))
+                if name in defaults:
+                    value = shared.setdefault(value, value)
+                column.append(value)
+
+        check_front_languages(columns["front"], columns["frontLang"])
+        return cls(**columns)
+
+    @classmethod
+    def from_models(cls, anki_notes: Iterable[AnkiNoteModel]) -> "NoteBatch":
+        """Create a batch from validated anki-notes."""
+        columns: Dict[str, List[Any]] = {name: [] for name in NOTE_COLUMNS}
+        for anki_note in anki_notes:
+            for name, column in columns.items():
+                column.append(getattr(anki_note, name))
+        return cls(**columns)
+
+    def __len__(self) -> int:
+        return len(self.front)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[NoteView, "NoteBatch"]:
+        if isinstance(index, slice):
+            return NoteBatch(
+                **{name: getattr(self, name)[index] for name in NOTE_COLUMNS}
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("NoteBatch index out of range")
+        return NoteView(self, index)
+
+    def __iter__(self) -> Iterator[NoteView]:
+        return (NoteView(self, i) for i in range(len(self)))
+
+    def column(self, name: str) -> List[Any]:
+        if name not in NOTE_COLUMNS:
+            raise AttributeError(name)
+        return getattr(self, name)
+
+    def missing_backs(self) -> List[str]:
+        """The front sides of the notes without a back side, to translate."""
+        return [front for front, back in zip(self.front, self.back) if back is None]
+
+    def fill_backs(self, translations: Dict[str, str]) -> None:
+        """Set the back side of the notes without one, from the translations of their
+        front sides.
+        """
+        self.back = [
+            back if back is not None else translations[front]
+            for front, back in zip(self.front, self.back)
+        ]
+
+    def to_model(self, index: int) -> AnkiNoteModel:
+        """The anki-note at the index, as a pydantic model."""
+        # The notes have been validated already.
+        return AnkiNoteModel.model_construct(
+            **{name: getattr(self, name)[index] for name in NOTE_COLUMNS}
+        )
+
+    def to_models(self) -> List[AnkiNoteModel]:
+        return [self.to_model(i) for i in range(len(self))]
+
+
+class NoteResults:
+    """The responses of AnkiConnect to a NoteBatch, stored as a table: the status code,
+    the result (e.g. the note id) and the error of each note, in the order of the batch.
+
+    Indexing the results gives an AnkiNoteResponse, created on demand, so that they can
+    be used in place of a list of responses.
+    """
+
+    __slots__ = ("batch",) + RESULT_COLUMNS
+
+    def __init__(self, batch: NoteBatch):
+        self.batch = batch
+        self.status_code: List[Optional[int]] = []
+        self.result: List[Any] = []
+        self.error: List[Optional[str]] = []
+
+    def append(self, response: AnkiConnectResponse) -> None:
+        """Record the response of the next note of the batch."""
+        self.status_code.append(response.status_code)
+        self.result.append(response.result)
+        self.error.append(response.error)
+
+    def __len__(self) -> int:
+        return len(self.status_code)
+
+    def __getitem__(self, index: int) -> AnkiNoteResponse:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("NoteResults index out of range")
+        return self.to_model(index)
+
+    def __iter__(self) -> Iterator[AnkiNoteResponse]:
+        return (self.to_model(i) for i in range(len(self)))
+
+    def view(self, index: int) -> NoteView:
+        """A view of the result of a note, without creating its AnkiNoteResponse."""
+        return NoteView(self, index)
+
+    def column(self, name: str) -> List[Any]:
+        if name in RESULT_COLUMNS:
+            return getattr(self, name)
+        return self.batch.column(name)
+
+    @property
+    def n_errors(self) -> int:
+        return sum(error is not None for error in self.error)
+
+    def table(self) -> Dict[str, List[Any]]:
+        """The results as columns: the front side, status code, result and error."""
+        return {
+            "front": self.batch.front[: len(self)],
+            **{name: getattr(self, name) for name in RESULT_COLUMNS},
+        }
+
+    def to_model(self, index: int) -> AnkiNoteResponse:
+        """The response of the note at the index, as a pydantic model."""
+        return AnkiNoteResponse.model_construct(
+            **{name: self.column(name)[index] for name in NOTE_COLUMNS + RESULT_COLUMNS}
+        )
@@ -0,0 +1,76 @@
+import html
+import re
+from typing import Callable, Iterable, Iterator, Optional, Set, TypeVar
+
+from src import DECK_NAME, FRONT_FIELD
+from src.anki_connect import AnkiConnectClient
+
+T = TypeVar("T")
+
+_SOUND_TAG = re.compile(r"\[sound:[^\]]*\]")
+_HTML_TAG = re.compile(r"<[^>]*>")
+
+
+def normalize_field(value: str) -> str:
+    """The text of a field as stored in Anki, without its media and HTML tags."""
+    value = _HTML_TAG.sub("", _SOUND_TAG.sub("", value))
+    return html.unescape(value).replace("\xa0", " ").strip()
+
+
+class ExistingNotesFilter:
+    """Drop the words whose card already exists in the deck, before any translation or
+    audio is created for them. The words are compared with an in-memory index of the
+    front fields of the deck, built with a few bulk requests to AnkiConnect.
+    """
+
+    def __init__(self, existing_fronts: Set[str]):
+        self.existing_fronts = existing_fronts
+        self.skipped = 0
+
+    @classmethod
+    def from_deck(
+        cls,
+        client: AnkiConnectClient,
+        deck_name: str = DECK_NAME,
+        field: str = FRONT_FIELD,
+    ):
+        """Index the front fields of the notes of a deck.
+
+        Args:
+            client (AnkiConnectClient): The AnkiConnect client.
+            deck_name (str, optional): The deck. Defaults to DECK_NAME.
+            field (str, optional): The front field. Defaults to FRONT_FIELD.
+
+        Raises:
+            AnkiConnectError: The notes could not be fetched.
+        """
+        deck_query = deck_name.replace("\\", "\\\\").replace('"', '\\"')
+        existing_fronts = set()
+        for note_info in client.find_notes_info(f'deck:"{deck_query}"'):
+            if field in note_info["fields"]:
+                existing_fronts.add(
+                    normalize_field(note_info["fields"][field]["value"])
+                )
+        return cls(existing_fronts)
+
+    def filter(
+        self, words: Iterable[T], key: Optional[Callable[[T], str]] = None
+    ) -> Iterator[T]:
+        """Yield the words without a card yet, lazily. A word repeated in the input is
+        only yielded once, since Anki would reject the repetition as a duplicate.
+
+        Args:
+            words (Iterable[T]): The words, or e.g. the rows of a file.
+            key (Optional[Callable[[T], str]], optional): Gives the front side of an
+                item. Defaults to the item itself.
+        """
+        for item in words:
+            word = key(item) if key is not None else item
+            if word in self.existing_fronts:
+                self.skipped += 1
+                continue
+            self.existing_fronts.add(word)
+            yield item
+
+    def summary(self) -> str:
+        return f"skipped {self.skipped} words already in the deck"
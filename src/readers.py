@@ -0,0 +1,191 @@
+import csv
+import json
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# The fields of an anki-note which can be read from a file.
+NOTE_FIELDS = (
+    "front",
+    "back",
+    "sentence",
+    "translated_sentence",
+    "deckName",
+    "modelName",
+)
+
+# The file formats, by file suffix. Other files are read as one word per line.
+FORMATS = {
+    ".tsv": "tsv",
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".txt": "txt",
+}
+
+
+def parse_columns(spec: str) -> Dict[str, str]:
+    """Parse a column mapping such as "front=word,back=meaning" (or "front=0,back=1"
+    for the positions of the columns in a file without header).
+
+    Raises:
+        ValueError: The mapping is malformed or maps an unknown field.
+    """
+    columns = {}
+    for item in spec.split(","):
+        field, sep, column = item.partition("=")
+        field, column = field.strip(), column.strip()
+        if not sep or not column:
+            raise ValueError(f"Invalid column mapping {item!r}, expected field=column.")
+        if field not in NOTE_FIELDS:
+            raise ValueError(
+                f"Unknown field {field!r}, expected one of {', '.join(NOTE_FIELDS)}."
+            )
+        columns[field] = column
+    return columns
+
+
+def _note_row(values: Dict[str, str], columns: Dict[str, str]) -> Dict[str, str]:
+    row = {}
+    for field, column in columns.items():
+        value = values.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        # An empty cell is a missing value, e.g. a back side left to translate.
+        if value not in (None, ""):
+            row[field] = value
+    return row
+
+
+def read_rows(
+    data_fname: Union[Path, str],
+    file_format: Optional[str] = None,
+    columns: Optional[Dict[str, str]] = None,
+) -> Iterator[Dict[str, str]]:
+    """Read the anki-notes listed in a file, lazily, as rows of note fields.
+
+    The rows of a TSV or CSV file are mapped to the fields with `columns`, by column
+    name if the file has a header, or by position otherwise. Without `columns`, a file
+    whose first row names some of the fields is read by its header, and any other file
+    is read as front, back, sentence and translated_sentence columns, like the export
+    of an Anki deck. The keys of a JSONL file are mapped in the same way. A row without
+    a front side is skipped.
+
+    Args:
+        data_fname (Union[Path, str]): The file.
+        file_format (Optional[str], optional): "txt", "tsv", "csv" or "jsonl". Defaults to
+            the format of the file suffix, or "txt".
+        columns (Optional[Dict[str, str]], optional): The column of each field, e.g.
+            {"front": "word", "back": "meaning"}.
+
+    Yields:
+        Dict[str, str]: The fields of each anki-note, e.g. front, back and deckName.
+    """
+    if file_format is None:
+        file_format = file_format_of(data_fname)
+    parser = RowParser(file_format, columns)
+    with open(data_fname, "r", encoding="utf-8", newline="") as f:
+        yield from parser.parse(f)
+
+
+def file_format_of(data_fname: Union[Path, str]) -> str:
+    """The format of a file, from its suffix."""
+    return FORMATS.get(Path(data_fname).suffix.lower(), "txt")
+
+
+class RowParser:
+    """Parse the lines of a file into rows of note fields, incrementally: the lines can
+    be given in several calls to `parse`, e.g. as they are appended to the file. The
+    header of a TSV or CSV file is taken from its first row, and kept for the next
+    lines.
+    """
+
+    def __init__(
+        self,
+        file_format: str,
+        columns: Optional[Dict[str, str]] = None,
+        header: Optional[List[str]] = None,
+        started: bool = False,
+    ):
+        """
+        Args:
+            file_format (str): "txt", "tsv", "csv" or "jsonl".
+            columns (Optional[Dict[str, str]], optional): The column of each field.
+            header (Optional[List[str]], optional): The header of the table, if the
+                first row has been parsed already.
+            started (bool, optional): Whether the first row has been parsed already,
+                i.e. the next lines are data. Defaults to False.
+        """
+        if file_format not in ("txt", "tsv", "csv", "jsonl"):
+            raise ValueError(
+                f"Unknown format {file_format!r}, expected txt, tsv, csv or jsonl."
+            )
+        self.file_format = file_format
+        self.header = header
+        self.started = started or header is not None
+        self.columns = columns
+        if file_format == "jsonl" and columns is None:
+            self.columns = {field: field for field in NOTE_FIELDS}
+        elif self.started:
+            self._set_columns(header)
+
+    def parse(self, lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+        """Parse the lines, which must be whole lines.
+
+        Yields:
+            Dict[str, str]: The fields of each anki-note with a front side.
+        """
+        if self.file_format == "txt":
+            rows = ({"front": line.strip()} for line in lines if line.strip())
+        elif self.file_format == "jsonl":
+            rows = (
+                _note_row(json.loads(line), self.columns)
+                for line in lines
+                if line.strip()
+            )
+        else:
+            rows = self._parse_table(lines)
+
+        for row in rows:
+            if "front" in row:
+                yield row
+
+    def _parse_table(self, lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+        # Skip the "#separator:tab" like headers of the exports of Anki.
+        lines = (line for line in lines if not line.startswith("#"))
+        reader = csv.reader(lines, delimiter="\t" if self.file_format == "tsv" else ",")
+        if not self.started:
+            first_row: Optional[List[str]] = next(reader, None)
+            if first_row is None:
+                return
+            self.started = True
+            header = [cell.strip() for cell in first_row]
+            if self.columns is None:
+                is_header = any(cell in NOTE_FIELDS for cell in header)
+            else:
+                is_header = not all(c.isdigit() for c in self.columns.values())
+            self._set_columns(header if is_header else None)
+            if self.header is None:
+                # The first row is data.
+                reader = chain([first_row], reader)
+
+        for values in reader:
+            if self.header is None:
+                values = {str(i): value for i, value in enumerate(values)}
+            else:
+                values = dict(zip(self.header, values))
+            yield _note_row(values, self.columns)
+
+    def _set_columns(self, header: Optional[List[str]]) -> None:
+        self.header = header
+        if self.columns is None:
+            if header is not None:
+                self.columns = {field: field for field in NOTE_FIELDS}
+            else:
+                self.columns = {
+                    field: str(i) for i, field in enumerate(NOTE_FIELDS[:4])
+                }
+        elif header is not None:
+            missing = [c for c in self.columns.values() if c not in header]
+            if missing:
+                raise ValueError(f"Columns {missing} are not in the header {header}.")
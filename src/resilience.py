@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple, Type, TypeVar
+
+from src.metrics import metrics
+
+T = TypeVar("T")
+
+# The HTTP status codes of a backend which is overloaded, and should be retried later.
+OVERLOADED_STATUS_CODES = (429, 503)
+
+
+class BackendOverloaded(Exception):
+    """Exception raised when a backend answers that it is overloaded, e.g. HTTP 429."""
+
+    def __init__(self, status_code: Optional[int] = None, response: Any = None):
+        self.status_code = status_code
+        self.response = response
+        super().__init__(f"Backend overloaded. Status code: {status_code}")
+
+
+class TokenBucket:
+    """A token-bucket rate limiter: `rate` calls per second on average, with bursts of
+    up to `capacity` calls. A caller which finds the bucket empty reserves its token
+    and sleeps until it is refilled, so that the callers are served in order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (Optional[float], optional): The size of the bucket. Defaults to
+                `rate`, i.e. a burst of one second of calls.
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket, waiting for them if needed.
+
+        Returns:
+            float: The time waited, in seconds.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class AdaptiveLimiter:
+    """An adaptive limit on the number of concurrent calls, in the AIMD way of TCP:
+    the limit grows by one call per `limit` successful calls, and is cut by
+    `backoff` on every failure, so that it settles near what the backend can take.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.5,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the concurrent calls, waiting until the limit allows it."""
+        with self._condition:
+            while self._in_flight >= max(int(self.limit), 1):
+                self._condition.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_failure(self) -> None:
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+
+
+class Resilience:
+    """The rate limit, the adaptive concurrency and the retries of the calls to a
+    backend, e.g. the translator, the TTS or AnkiConnect. A single instance is shared
+    by all the callers of a backend.
+
+    A failed call is retried after an exponential backoff with full jitter, i.e. a
+    random delay of up to `base_delay * 2 ** attempt` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+        retry_on: Tuple[Type[Exception], ...] = (Exception,),
+        limiter: Optional[AdaptiveLimiter] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            name (str): The name of the backend, which prefixes its counters.
+            rate (Optional[float], optional): The maximum number of calls per second.
+                Defaults to None, i.e. no rate limit.
+            max_retries (int, optional): The number of retries of a failed call.
+                Defaults to 3.
+            base_delay (float, optional): The maximum delay before the first retry, in
+                seconds. Defaults to 0.5.
+            max_delay (float, optional): The cap of the delays. Defaults to 30.
+            retry_on (Tuple[Type[Exception], ...], optional): The exceptions which are
+                retried. Defaults to every exception.
+            limiter (Optional[AdaptiveLimiter], optional): The limit on the concurrent
+                calls. Defaults to a new `AdaptiveLimiter`.
+        """
+        self.name = name
+        self.bucket = TokenBucket(rate) if rate is not None else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.limiter = limiter if limiter is not None else AdaptiveLimiter()
+        self._sleep = sleep
+        self._random = random.Random()
+
+    def configure(
+        self, rate: Optional[float] = None, max_retries: Optional[int] = None
+    ) -> None:
+        """Change the rate limit or the number of retries, e.g. from the command line."""
+        if rate is not None:
+            self.bucket = TokenBucket(rate)
+        if max_retries is not None:
+            self.max_retries = max_retries
+
+    def delay(self, attempt: int) -> float:
+        """The random delay before the retry following the given failed attempt."""
+        return self._random.uniform(
+            0, min(self.max_delay, self.base_delay * 2**attempt)
+        )
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """Call the function within the rate limit and the concurrency limit,
+        retrying it on failure.
+
+        Raises:
+            Exception: The exception of the last attempt, or any exception which is
+                not retried.
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            with self.limiter.slot():
+                try:
+                    result = function(*args, **kwargs)
+                except self.retry_on as e:
+                    self.limiter.on_failure()
+                    if isinstance(e, BackendOverloaded):
+                        metrics.incr(f"{self.name}_overloaded")
+                    if attempt >= self.max_retries:
+                        metrics.incr(f"{self.name}_failures")
+                        raise
+                else:
+                    self.limiter.on_success()
+                    return result
+
+            metrics.incr(f"{self.name}_retries")
+            self._sleep(self.delay(attempt))
+            attempt += 1
@@ -0,0 +1,254 @@
+import json
+import os
+import queue
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.models import check_row
+
+# Processes the rows of a micro-batch, returning the result of each row, in order.
+BatchProcessor = Callable[[List[Dict[str, str]]], List[Dict[str, Any]]]
+
+
+class MicroBatcher:
+    """Coalesce the rows submitted concurrently, e.g. by several clients, into
+    micro-batches: a batch is processed once it has `max_batch_size` rows, or
+    `max_delay` seconds after its first row. The batches are processed one at a time,
+    by a background thread, while the next one fills up.
+    """
+
+    def __init__(
+        self,
+        process: BatchProcessor,
+        max_batch_size: int = 100,
+        max_delay: float = 0.05,
+    ):
+        """
+        Args:
+            process (BatchProcessor): Processes the rows of a batch, e.g. adds their
+                notes to Anki, and returns the result of each row.
+            max_batch_size (int, optional): The maximum number of rows of a batch.
+                Defaults to 100.
+            max_delay (float, optional): The maximum time a row waits for the next ones,
+                in seconds. Defaults to 0.05.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}.")
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, str], Future]]]" = (
+            queue.Queue()
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, rows: List[Dict[str, str]]) -> List[Future]:
+        """Queue the rows for the next batches.
+
+        Returns:
+            List[Future]: The future result of each row.
+        """
+        futures = []
+        for row in rows:
+            future: Future = Future()
+            self._queue.put((row, future))
+            futures.append(future)
+        return futures
+
+    def close(self) -> None:
+        """Process the queued rows, then stop."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[Dict[str, str], Future]]) -> None:
+        try:
+            results = self.process([row for row, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Got {len(results)} results for a batch of {len(batch)} rows."
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def parse_submission(
+    body: Dict[str, Any], front_lang: str = "ko"
+) -> Tuple[List[Dict[str, str]], Dict[int, Dict[str, Any]]]:
+    """Read the rows of a submission, `{"words": [...]}` and/or `{"rows": [{...}]}`,
+    and check the language of their front sides.
+
+    Raises:
+        ValueError: `words` is not a list of strings, or `rows` not a list of objects.
+
+    Returns:
+        Tuple[List[Dict[str, str]], Dict[int, Dict[str, Any]]]: The valid rows, with
+            the fields of NOTE_FIELDS only, and the result of each invalid one, by its
+            position in the submission.
+    """
+    words = body.get("words", [])
+    if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+        raise ValueError("Expected 'words' to be a list of strings.")
+    submitted_rows = body.get("rows", [])
+    if not isinstance(submitted_rows, list) or not all(
+        isinstance(row, dict) for row in submitted_rows
+    ):
+        raise ValueError("Expected 'rows' to be a list of objects.")
+    rows = [{"front": word} for word in words] + submitted_rows
+    valid_rows, errors = [], {}
+    for i, row in enumerate(rows):
+        try:
+            valid_rows.append(check_row(row, front_lang))
+        except ValueError as e:
+            errors[i] = {
+                "front": row.get("front") if isinstance(row, dict) else None,
+                "status_code": None,
+                "result": None,
+                "error": str(e),
+            }
+    return valid_rows, errors
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """The API of the ingestion server:
+
+    - `POST /notes` with `{"words": [...]}` or `{"rows": [{"front": ..., ...}]}` adds
+      the notes, and answers with the result of each of them, in order.
+    - `GET /health` tells whether the server is up, and the number of queued rows.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "IngestServerMixin"
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json(404, {"error": f"Unknown path {self.path!r}."})
+        self._send_json(200, {"status": "ok", "pending": self.server.batcher.pending})
+
+    def do_POST(self):
+        if self.path != "/notes":
+            return self._send_json(404, {"error": f"Unknown path {self.path!r}."})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Expected a JSON object.")
+            rows, results = parse_submission(body, front_lang=self.server.front_lang)
+        except ValueError as e:
+            return self._send_json(400, {"error": f"Invalid request: {e}"})
+
+        submitted = iter(zip(rows, self.server.batcher.submit(rows)))
+        for i in range(len(rows) + len(results)):
+            if i in results:
+                continue
+            row, future = next(submitted)
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {
+                    "front": row["front"],
+                    "status_code": None,
+                    "result": None,
+                    "error": str(e),
+                }
+        self._send_json(200, {"results": [results[i] for i in sorted(results)]})
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # The client address of a Unix socket is not a (host, port) pair.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixIngestHandler(IngestHandler):
+    # TCP options do not apply to a Unix socket.
+    disable_nagle_algorithm = False
+
+
+class IngestServerMixin:
+    batcher: MicroBatcher
+    front_lang: str
+
+
+class IngestServer(IngestServerMixin, ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixIngestServer(IngestServerMixin, socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(
+    batcher: MicroBatcher,
+    host: str = "127.0.0.1",
+    port: int = 8766,
+    socket_path: Optional[str] = None,
+    front_lang: str = "ko",
+) -> socketserver.BaseServer:
+    """Create the ingestion server, listening on a TCP port or on a Unix socket.
+
+    Args:
+        batcher (MicroBatcher): Processes the submitted rows.
+        socket_path (Optional[str], optional): Listen on this Unix socket instead of
+            `host` and `port`. A socket left there, e.g. by a server which was killed,
+            is replaced. Defaults to None.
+
+    Raises:
+        FileExistsError: `socket_path` exists and is not a socket.
+    """
+    if socket_path is not None:
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise FileExistsError(f"{socket_path} exists and is not a socket.")
+            os.remove(socket_path)
+        server = UnixIngestServer(socket_path, UnixIngestHandler)
+    else:
+        server = IngestServer((host, port), IngestHandler)
+    server.batcher = batcher
+    server.front_lang = front_lang
+    return server
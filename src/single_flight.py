@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: the work is only coalesced within the process.
+    fcntl = None
+
+
+class SingleFlight:
+    """Coalesce the concurrent computations of the same keys, across the threads and
+    the processes, e.g. the translations of a word or the audios of a text.
+
+    A computation holds the locks of its keys with `hold`: a file lock per key, which
+    works across processes, and a thread lock, within the process. Under the locks, the
+    caller checks the shared store (e.g. the translation or audio cache) before
+    computing and storing the result, so that the callers waiting for the same key find
+    the result in the store rather than computing it again.
+
+    The keys are hashed onto a fixed number of lock files, which are never removed, so
+    that the lock directory stays small.
+    """
+
+    def __init__(self, path: Union[Path, str], stripes: int = 256):
+        """
+        Args:
+            path (Union[Path, str]): The directory of the lock files, shared by the
+                processes.
+            stripes (int, optional): The number of lock files. Defaults to 256.
+        """
+        self.path = Path(path)
+        self.stripes = stripes
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+
+    def _stripe(self, key: str) -> int:
+        digest = hashlib.sha1(key.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") % self.stripes
+
+    @contextmanager
+    def hold(self, keys: Iterable[str]) -> Iterator[None]:
+        """Hold the locks of the keys, waiting for the computations in flight. The locks
+        are taken in a fixed order, so that holding several keys cannot deadlock.
+        """
+        stripes = sorted({self._stripe(key) for key in keys})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._thread_locks[stripe])
+            if fcntl is not None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                for stripe in stripes:
+                    stack.enter_context(self._file_lock(stripe))
+            yield
+
+    @contextmanager
+    def _file_lock(self, stripe: int) -> Iterator[None]:
+        with open(self.path / f"{stripe:03x}.lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
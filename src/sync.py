@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from src.anki_connect import AnkiConnectClient
+from src.media import DEFAULT_FIELD_MAP
+from src.metrics import metrics
+from src.models import AnkiConnectResponse
+from src.note_batch import NoteResults
+
+
+class SyncPlan:
+    """The differences between the rows of a file and its sync manifest."""
+
+    def __init__(self):
+        # The rows whose front side is not in the manifest, to add.
+        self.new: List[Dict[str, str]] = []
+        # The rows whose content changed, along with the id of their note, to update.
+        self.changed: List[Tuple[Dict[str, str], int]] = []
+        # The front sides which are no longer in the file, along with their note id.
+        self.removed: List[Tuple[str, int]] = []
+        self.unchanged = 0
+        # The content hash of each row of the file, by front side.
+        self.hashes: Dict[str, str] = {}
+
+    def summary(self) -> str:
+        return (
+            f"sync: {len(self.new)} new, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+class SyncManifest:
+    """The notes created from a file, by front side: the content hash of their row and
+    the id of their note in Anki. Comparing a file with its manifest tells which rows
+    are new, changed or removed since the last sync, so that only those are processed.
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.notes: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.notes = json.load(f)["notes"]
+
+    @staticmethod
+    def row_hash(row: Dict[str, str]) -> str:
+        """The content hash of a row, independent of the order of its fields."""
+        content = json.dumps(row, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def diff(self, rows: Iterable[Dict[str, str]]) -> SyncPlan:
+        """Compare the rows of the file with the manifest. A front side repeated in the
+        file is only taken once, as Anki would reject the repetition as a duplicate.
+        """
+        plan = SyncPlan()
+        for row in rows:
+            front = row["front"]
+            if front in plan.hashes:
+                continue
+            plan.hashes[front] = row_hash = self.row_hash(row)
+            entry = self.notes.get(front)
+            if entry is None:
+                plan.new.append(row)
+            elif entry["hash"] != row_hash:
+                plan.changed.append((row, entry["note_id"]))
+            else:
+                plan.unchanged += 1
+        plan.removed = [
+            (front, entry["note_id"])
+            for front, entry in self.notes.items()
+            if front not in plan.hashes
+        ]
+        return plan
+
+    def record(self, front: str, row_hash: str, note_id: int) -> None:
+        self.notes[front] = {"hash": row_hash, "note_id": note_id}
+
+    def record_results(self, plan: SyncPlan, results: NoteResults) -> None:
+        """Record the notes added successfully."""
+        table = results.table()
+        for front, note_id, error in zip(
+            table["front"], table["result"], table["error"]
+        ):
+            if error is None:
+                self.record(front, plan.hashes[front], note_id)
+
+    def remove(self, front: str) -> None:
+        self.notes.pop(front, None)
+
+    def save(self) -> None:
+        """Write the manifest, atomically."""
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "notes": self.notes}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def update_notes(
+    client: AnkiConnectClient,
+    manifest: SyncManifest,
+    plan: SyncPlan,
+    translations: Optional[Dict[str, str]] = None,
+    batch_size: int = 100,
+    field_map: Optional[Dict[str, str]] = None,
+    audio_strs: Optional[Dict[str, Dict[str, str]]] = None,
+) -> List[AnkiConnectResponse]:
+    """Update the fields of the changed notes, but their front side, with one `multi`
+    request of `updateNoteFields` per batch. The front side, and its audio, are left
+    as is since the rows are matched by their front side.
+
+    Args:
+        translations (Optional[Dict[str, str]], optional): The translation of the
+            changed rows without a back side, by front side.
+        field_map (Optional[Dict[str, str]], optional): The field of each attribute,
+            see `CardCreator`. Defaults to DEFAULT_FIELD_MAP.
+        audio_strs (Optional[Dict[str, Dict[str, str]]], optional): The sound tags of
+            the new audios of the changed rows, e.g. of their sentence, by front side
+            and attribute.
+
+    Returns:
+        List[AnkiConnectResponse]: The response of each changed note, in order.
+    """
+    field_map = field_map if field_map is not None else DEFAULT_FIELD_MAP
+    audio_strs = audio_strs or {}
+
+    def fields(row: Dict[str, str]) -> Dict[str, str]:
+        values = {**row, "back": row.get("back") or translations[row["front"]]}
+        row_audio_strs = audio_strs.get(row["front"], {})
+        return {
+            field: (values.get(attribute) or "") + row_audio_strs.get(attribute, "")
+            for attribute, field in field_map.items()
+            if attribute != "front"
+        }
+
+    responses = []
+    for start in range(0, len(plan.changed), batch_size):
+        batch = plan.changed[start : start + batch_size]
+        actions = [
+            {
+                "action": "updateNoteFields",
+                "params": {"note": {"id": note_id, "fields": fields(row)}},
+            }
+            for row, note_id in batch
+        ]
+        with metrics.timer("update_note"):
+            batch_responses = client.multi(actions)
+        for (row, note_id), response in zip(batch, batch_responses):
+            if response.error is None:
+                manifest.record(row["front"], plan.hashes[row["front"]], note_id)
+            responses.append(response)
+    return responses
+
+
+def delete_notes(
+    client: AnkiConnectClient,
+    manifest: SyncManifest,
+    plan: SyncPlan,
+    batch_size: int = 100,
+) -> List[AnkiConnectResponse]:
+    """Delete the notes of the rows removed from the file, with one `deleteNotes`
+    request per batch.
+
+    Returns:
+        List[AnkiConnectResponse]: The response of each batch.
+    """
+    responses = []
+    for start in range(0, len(plan.removed), batch_size):
+        batch = plan.removed[start : start + batch_size]
+        with metrics.timer("delete_notes"):
+            response = client.invoke(
+                "deleteNotes", notes=[note_id for _, note_id in batch]
+            )
+        if response.error is None:
+            for front, _ in batch:
+                manifest.remove(front)
+        responses.append(response)
+    return responses
@@ -0,0 +1,493 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+from src import TRANSLATION_CACHE_PATH
+from src.metrics import metrics
+from src.resilience import Resilience
+from src.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from googletrans import Translator
+
+    from src.dictionary import LocalDictionary
+
+# The rate limit and the retries of the translator, shared by all the translations.
+translate_resilience = Resilience("translate")
+
+
+class TranslationCache:
+    """A persistent local cache of the translations, stored in SQLite and keyed by
+    (text, src, dest, backend), so that the translations of a backend are not served
+    to another one. Entries older than `ttl` seconds are treated as missing.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = TRANSLATION_CACHE_PATH,
+        ttl: Optional[float] = None,
+        single_flight: bool = True,
+    ):
+        """
+        Args:
+            path (Union[Path, str], optional): The SQLite database file.
+                Defaults to TRANSLATION_CACHE_PATH.
+            ttl (Optional[float], optional): The lifetime of an entry in seconds,
+                or None for no expiry. Defaults to None.
+            single_flight (bool, optional): Translate a word only once when several
+                threads or processes sharing the cache miss it at the same time.
+                Defaults to True.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.single_flight = (
+            SingleFlight(self.path.with_name(f"{self.path.name}.locks"))
+            if single_flight
+            else None
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            columns = [
+                row[1]
+                for row in self._connection.execute("PRAGMA table_info(translations)")
+            ]
+            if columns and "backend" not in columns:
+                # The backend of the entries of older caches is unknown.
+                self._connection.execute("DROP TABLE translations")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "text TEXT NOT NULL, src TEXT NOT NULL, dest TEXT NOT NULL, "
+                "backend TEXT NOT NULL, translation TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (text, src, dest, backend))"
+            )
+
+    def get(
+        self, text: str, src: str, dest: str, backend: str = "google"
+    ) -> Optional[str]:
+        """Get the cached translation of the text by the backend, or None if it is
+        missing or expired.
+        """
+        translation = self.peek(text, src, dest, backend)
+        with self._lock:
+            if translation is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return translation
+
+    def peek(
+        self, text: str, src: str, dest: str, backend: str = "google"
+    ) -> Optional[str]:
+        """Like `get`, without counting a hit or a miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT translation, created_at FROM translations "
+                "WHERE text = ? AND src = ? AND dest = ? AND backend = ?",
+                (text, src, dest, backend),
+            ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        return row[0]
+
+    def set(
+        self, text: str, src: str, dest: str, translation: str, backend: str = "google"
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                (text, src, dest, backend, translation, time.time()),
+            )
+
+    def set_many(
+        self, translations: Iterable[Tuple[str, str, str, str]], backend: str = "google"
+    ) -> None:
+        """Store several (text, src, dest, translation) entries of the backend in one
+        transaction.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (text, src, dest, backend, translation, now)
+                    for text, src, dest, translation in translations
+                ],
+            )
+
+    def invalidate(
+        self, text: str, src: str, dest: str, backend: str = "google"
+    ) -> None:
+        """Remove the cached translation of the text by the backend."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM translations "
+                "WHERE text = ? AND src = ? AND dest = ? AND backend = ?",
+                (text, src, dest, backend),
+            )
+
+    def clear(self) -> None:
+        """Remove every cached translation."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM translations")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def summary(self) -> str:
+        return f"translation cache: {self.hits} hits, {self.misses} misses"
+
+
+_default_translator: Optional["Translator"] = None
+_default_translator_lock = threading.Lock()
+
+
+def default_translator() -> "Translator":
+    """The translator shared by the translations, created on first use and then kept,
+    so that a long-running process reuses its connections.
+    """
+    global _default_translator
+    with _default_translator_lock:
+        if _default_translator is None:
+            # googletrans is only imported when a word is missing from the cache.
+            from googletrans import Translator
+
+            _default_translator = Translator()
+        return _default_translator
+
+
+def _translate_batch(
+    translator: "Translator", words: List[str], src: str, dest: str
+) -> List[str]:
+    """Translate several words with a single request, one word per line. googletrans
+    only takes a single string, so the words are joined by line breaks and the
+    translation is split back. If the lines do not match, e.g. because the translator
+    merged two of them, the words are translated one by one instead.
+    """
+    if len(words) > 1:
+        translated_text = translator.translate(
+            "\n".join(words), src=src, dest=dest
+        ).text
+        translated_words = [line.strip() for line in translated_text.split("\n")]
+        if len(translated_words) == len(words) and all(translated_words):
+            return translated_words
+
+    return [translator.translate(word, src=src, dest=dest).text for word in words]
+
+
+class TranslationBackend(ABC):
+    """A source of translations. A backend may answer some words locally with `lookup`,
+    e.g. from a dictionary, and translate the others with `translate`, e.g. with a
+    remote service. Only the translations of `translate` are cached.
+    """
+
+    name = "backend"
+
+    @property
+    def translator_name(self) -> str:
+        """The name of the translations of `translate`, under which they are cached."""
+        return self.name
+
+    def lookup(self, words: List[str], src: str, dest: str) -> Dict[str, str]:
+        """The translations found locally, by word. Defaults to none."""
+        return {}
+
+    @abstractmethod
+    def translate(
+        self,
+        words: List[str],
+        src: str,
+        dest: str,
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        """Translate the words not found by `lookup`.
+
+        Args:
+            batch_size (Optional[int], optional): If given, up to this many words are
+                sent within a single request. Defaults to None, i.e. one request per
+                word.
+
+        Returns:
+            List[str]: The translated words, in the same order.
+        """
+
+
+class GoogleBackend(TranslationBackend):
+    """Translations by googletrans, with the rate limit and the retries of
+    `translate_resilience`.
+    """
+
+    name = "google"
+
+    def __init__(self, translator: Optional["Translator"] = None):
+        """
+        Args:
+            translator (Optional[Translator], optional): The translator. Defaults to the
+                shared googletrans translator, created on first use.
+        """
+        self.translator = translator
+
+    def translate(
+        self,
+        words: List[str],
+        src: str,
+        dest: str,
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        if self.translator is None:
+            self.translator = default_translator()
+
+        translated_words: List[str] = []
+        step = batch_size or 1
+        for start in range(0, len(words), step):
+            batch = words[start : start + step]
+            with metrics.timer("translate"):
+                translated_words.extend(
+                    translate_resilience.call(
+                        _translate_batch, self.translator, batch, src, dest
+                    )
+                )
+        return translated_words
+
+
+class IdentityBackend(TranslationBackend):
+    """No translation: each word is its own translation, e.g. to fill in the back
+    sides later, or for tests without network.
+    """
+
+    name = "identity"
+
+    def lookup(self, words: List[str], src: str, dest: str) -> Dict[str, str]:
+        return {word: word for word in words}
+
+    def translate(
+        self,
+        words: List[str],
+        src: str,
+        dest: str,
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        return list(words)
+
+
+class DictionaryBackend(TranslationBackend):
+    """Translations found in a local dictionary, for its pair of languages only."""
+
+    name = "dictionary"
+
+    def __init__(self, dictionary: "LocalDictionary"):
+        self.dictionary = dictionary
+
+    def lookup(self, words: List[str], src: str, dest: str) -> Dict[str, str]:
+        if (src, dest) != (self.dictionary.src, self.dictionary.dest):
+            return {}
+        translations = {}
+        for word in words:
+            translated_word = self.dictionary.get(word)
+            if translated_word is not None:
+                translations[word] = translated_word
+        return translations
+
+    def translate(
+        self,
+        words: List[str],
+        src: str,
+        dest: str,
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        raise KeyError(f"No translation in {self.dictionary.path} for {words}.")
+
+
+class LayeredBackend(TranslationBackend):
+    """Backends consulted in turn: the words are looked up in each of them, and the
+    words found in none are translated by the last one. E.g. a local dictionary
+    before googletrans, so that only the words missing from the dictionary are
+    sent over the network.
+    """
+
+    def __init__(self, backends: List[TranslationBackend]):
+        if not backends:
+            raise ValueError("LayeredBackend needs at least one backend.")
+        self.backends = backends
+        self.name = "+".join(backend.name for backend in backends)
+
+    @property
+    def translator_name(self) -> str:
+        return self.backends[-1].translator_name
+
+    def lookup(self, words: List[str], src: str, dest: str) -> Dict[str, str]:
+        translations: Dict[str, str] = {}
+        for backend in self.backends:
+            missing_words = [word for word in words if word not in translations]
+            if not missing_words:
+                break
+            translations.update(backend.lookup(missing_words, src, dest))
+        return translations
+
+    def translate(
+        self,
+        words: List[str],
+        src: str,
+        dest: str,
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        return self.backends[-1].translate(words, src, dest, batch_size=batch_size)
+
+
+# The backend of the translations, unless one is given.
+_default_backend: TranslationBackend = GoogleBackend()
+
+
+def set_default_backend(backend: TranslationBackend) -> None:
+    """Set the backend of the translations, e.g. from the command line."""
+    global _default_backend
+    _default_backend = backend
+
+
+def get_default_backend() -> TranslationBackend:
+    return _default_backend
+
+
+def create_backend(
+    name: str = "google", dictionary: Optional[Union[Path, str]] = None
+) -> TranslationBackend:
+    """Create a backend by name, "google" or "identity", with a local dictionary in
+    front of it if given.
+
+    Args:
+        dictionary (Optional[Union[Path, str]], optional): A compiled dictionary, or a
+            vocabulary sheet to compile. Defaults to None.
+    """
+    backends = {"google": GoogleBackend, "identity": IdentityBackend}
+    if name not in backends:
+        raise ValueError(
+            f"Unknown translator {name!r}, expected one of {', '.join(backends)}."
+        )
+    backend = backends[name]()
+    if dictionary is None:
+        return backend
+
+    from src.dictionary import COMPILED_SUFFIX, LocalDictionary
+
+    if str(dictionary).endswith(COMPILED_SUFFIX):
+        local_dictionary = LocalDictionary(dictionary)
+    else:
+        local_dictionary = LocalDictionary.from_sheet(dictionary)
+    return LayeredBackend([DictionaryBackend(local_dictionary), backend])
+
+
+def translate_words(
+    words: List[str],
+    src: str = "ko",
+    dest: str = "ja",
+    translator: Optional["Translator"] = None,
+    cache: Optional[TranslationCache] = None,
+    batch_size: Optional[int] = None,
+    backend: Optional[TranslationBackend] = None,
+) -> List[str]:
+    """Translate the words: the words found locally by the backend first, then the
+    cache, and only then the backend's translator. Each distinct word is translated
+    only once.
+
+    Args:
+        words (List[str]): The words to translate.
+        src (str, optional): The language of the words. Defaults to "ko".
+        dest (str, optional): The language of the translations. Defaults to "ja".
+        translator (Optional[Translator], optional): A googletrans translator, used
+            instead of the backend.
+        cache (Optional[TranslationCache], optional): The translation cache. Defaults to None.
+        batch_size (Optional[int], optional): If given, up to this many words are sent
+            to the translator within a single request. Defaults to None, i.e. one
+            request per word.
+        backend (Optional[TranslationBackend], optional): The backend. Defaults to the
+            one set with `set_default_backend`, googletrans unless changed.
+
+    Returns:
+        List[str]: The translated words, in the same order.
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError(f"batch_size must be positive, got {batch_size}.")
+    if backend is None:
+        backend = (
+            GoogleBackend(translator) if translator is not None else _default_backend
+        )
+
+    distinct_words = list(dict.fromkeys(words))
+    translations = backend.lookup(distinct_words, src, dest)
+    if translations:
+        metrics.incr("translation_local_hits", len(translations))
+
+    missing_words = []
+    cache_hits = 0
+    for word in distinct_words:
+        if word in translations:
+            continue
+        translated_word = (
+            cache.get(word, src, dest, backend.translator_name)
+            if cache is not None
+            else None
+        )
+        if translated_word is None:
+            missing_words.append(word)
+        else:
+            translations[word] = translated_word
+            cache_hits += 1
+    if cache is not None:
+        metrics.incr("translation_cache_hits", cache_hits)
+        metrics.incr("translation_cache_misses", len(missing_words))
+
+    # Cached batch by batch, so that an interrupted translation is not lost.
+    step = batch_size or 1
+    for start in range(0, len(missing_words), step):
+        batch = missing_words[start : start + step]
+        if cache is None or cache.single_flight is None:
+            translations.update(_translate_and_cache(backend, batch, src, dest, cache))
+            continue
+
+        keys = [
+            f"{backend.translator_name}\x1f{src}\x1f{dest}\x1f{word}" for word in batch
+        ]
+        with cache.single_flight.hold(keys):
+            # The words translated by others while waiting for the locks are not
+            # translated again.
+            coalesced = {}
+            for word in batch:
+                translated_word = cache.peek(word, src, dest, backend.translator_name)
+                if translated_word is not None:
+                    coalesced[word] = translated_word
+            if coalesced:
+                metrics.incr("translation_coalesced", len(coalesced))
+                translations.update(coalesced)
+            batch = [word for word in batch if word not in coalesced]
+            translations.update(_translate_and_cache(backend, batch, src, dest, cache))
+
+    return [translations[word] for word in words]
+
+
+def _translate_and_cache(
+    backend: TranslationBackend,
+    words: List[str],
+    src: str,
+    dest: str,
+    cache: Optional[TranslationCache] = None,
+) -> Dict[str, str]:
+    if not words:
+        return {}
+    translations = dict(
+        zip(words, backend.translate(words, src, dest, batch_size=len(words)))
+    )
+    if cache is not None:
+        cache.set_many(
+            (
+                (word, src, dest, translated_word)
+                for word, translated_word in translations.items()
+            ),
+            backend.translator_name,
+        )
+    return translations
@@ -1,11 +1,30 @@
+import base64
+import tempfile
 import uuid
 from pathlib import Path
-from typing import Union
-
-from navertts import NaverTTS
+from typing import Iterator, Optional, Union
 
 from src import MP3_PATH
+from src.audio_cache import AudioCache
+from src.metrics import metrics
 from src.models import AnkiNoteResponse, AnkiSendMediaResponse
+from src.resilience import Resilience
+
+
+def read_words(data_fname: Union[Path, str]) -> Iterator[str]:
+    """Read the words listed in a file, one per line, lazily. Blank lines are skipped.
+
+    Args:
+        data_fname (Union[Path, str]): The file.
+
+    Yields:
+        str: Each word, without surrounding whitespace.
+    """
+    with open(data_fname, "r") as f:
+        for line in f:
+            word = line.strip()
+            if word:
+                yield word
 
 
 def create_message(card_create_response: AnkiNoteResponse) -> str:
@@ -17,9 +36,9 @@ def create_message(card_create_response: AnkiNoteResponse) -> str:
     Returns:
         str: The message.
     """
+    word_being_sent = f"{card_create_response.front}, {card_create_response.back}"
     # Check if the deck exists and the note was added successfully
     if card_create_response.status_code == 200:
-        word_being_sent = f"{card_create_response.front}, {card_create_response.back}"
         if card_create_response.error is not None:
             # Check if the error message indicates that the deck does not exist
             if "deck not found" in card_create_response.error:
@@ -28,31 +47,126 @@ def create_message(card_create_response: AnkiNoteResponse) -> str:
                 return word_being_sent + f": Error: {card_create_response.error}"
         else:
             return word_being_sent + ": Note added successfully"
+    elif card_create_response.error is not None:
+        return (
+            word_being_sent
+            + f": Error adding note to deck: {card_create_response.error}"
+        )
     else:
         return word_being_sent + ": Error adding note to deck"
 
 
-def create_audio(text: str, path: Union[Path, str] = MP3_PATH) -> Union[Path, str]:
+# The voice settings of Naver TTS, also part of the key of the audio cache.
+NAVER_TTS_VOICE = {"lang": "ko", "speed": "normal", "gender": "f"}
+
+# The rate limit and the retries of Naver TTS, shared by all the audios.
+tts_resilience = Resilience("tts")
+
+
+def naver_tts(text: str):
+    """Create the Naver TTS of a text. navertts is only imported on the first audio."""
+    from navertts import NaverTTS
+
+    return NaverTTS(text, **NAVER_TTS_VOICE)
+
+
+def save_naver_tts(text: str, audio_path: Union[Path, str]) -> None:
+    """Create the Naver TTS of a text and save it to the given file."""
+    with metrics.timer("tts"):
+        tts_resilience.call(lambda: naver_tts(text).save(audio_path))
+
+
+def create_audio(
+    text: str,
+    path: Union[Path, str] = MP3_PATH,
+    cache: Optional[AudioCache] = None,
+) -> Union[Path, str]:
     """Create an audio file (.mp3) for the input korean word. Based on Naver TTS API.
 
     Args:
         text (str): Korean word.
         path (Union[Path, str], optional): _description_. Defaults to MP3_PATH.
+        cache (Optional[AudioCache], optional): If given, the audio is taken from the
+            cache when possible, and created in the cache otherwise (`path` is then
+            ignored). Defaults to None.
 
     Returns:
         Union[Path, str]: The path of the output audio file.
     """
+    if cache is not None:
+        return cache.get_or_create(
+            text,
+            lambda audio_path: save_naver_tts(text, audio_path),
+            voice=NAVER_TTS_VOICE,
+        )
+
     # texts = [note.front for note in self._anki_notes]
     if not isinstance(path, Path):
         path = Path(path)
     if not path.exists():
         path.mkdir(parents=True, exist_ok=True)
-    tts = NaverTTS(text)
     audio_filename = path / f"naver_{uuid.uuid4()}.mp3"
-    tts.save(audio_filename)
+    save_naver_tts(text, audio_filename)
     return audio_filename
 
 
+class InMemoryAudio:
+    """An audio created in memory rather than as a file. The buffer is spooled to a
+    temporary file only if the audio is larger than its `max_memory_size`.
+    """
+
+    def __init__(self, filename: str, buffer: tempfile.SpooledTemporaryFile):
+        self.filename = filename
+        self.buffer = buffer
+
+    def b64encode(self) -> str:
+        """The content of the audio, encoded for the `data` parameter of AnkiConnect."""
+        self.buffer.seek(0)
+        return base64.b64encode(self.buffer.read()).decode("ascii")
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+class StoredAudio:
+    """An audio already stored in Anki's media folder, e.g. by an interrupted import.
+    It is referred to by its file name, without being created nor sent again.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+
+def create_audio_data(text: str, max_memory_size: int = 1024 * 1024) -> InMemoryAudio:
+    """Create the audio (.mp3) of the input korean word in memory, without writing any
+    file. Based on Naver TTS API.
+
+    Args:
+        text (str): Korean word.
+        max_memory_size (int, optional): The size in bytes beyond which the audio is
+            spooled to a temporary file. Defaults to 1 MiB.
+
+    Returns:
+        InMemoryAudio: The audio, named after the content hash of the word.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+
+    def write_to_buffer():
+        # Start over from an empty buffer on each attempt.
+        buffer.seek(0)
+        buffer.truncate()
+        naver_tts(text).write_to_fp(buffer)
+
+    try:
+        with metrics.timer("tts"):
+            tts_resilience.call(write_to_buffer)
+    except Exception:
+        buffer.close()
+        raise
+    filename = f"kanki_{AudioCache.key(text, NAVER_TTS_VOICE)[:32]}.mp3"
+    return InMemoryAudio(filename, buffer)
+
+
 class MediaAdditionError(Exception):
     """Exception raised when adding media fails."""
 
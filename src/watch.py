@@ -0,0 +1,261 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from src.models import check_row
+from src.readers import FORMATS, RowParser, file_format_of
+
+
+class WatchOffsets:
+    """The positions reached in the watched files, persisted so that a restarted
+    watcher goes on where it stopped. The position of a file is its byte offset, its
+    inode, to detect a file replaced by another one, and the state of its parser, i.e.
+    the header of a table.
+    """
+
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)["files"]
+
+    def get(self, path: Union[Path, str]) -> Optional[Dict[str, Any]]:
+        return self.files.get(str(path))
+
+    def set(self, path: Union[Path, str], position: Dict[str, Any]) -> None:
+        self.files[str(path)] = position
+
+    def save(self) -> None:
+        """Write the offsets, atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class WatchBatch:
+    """The rows read in one poll of the watcher, and the positions of the files after
+    them, which are committed once the rows are processed.
+    """
+
+    def __init__(self):
+        self.rows: List[Dict[str, str]] = []
+        self.positions: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class Watcher:
+    """Follow files as lines are appended to them, like `tail -f`, and process the new
+    rows in micro-batches. A directory is watched as a drop directory: each of its
+    files with a known suffix (.txt, .tsv, .csv, .jsonl) is followed, including the ones
+    added later.
+
+    The offsets are only committed after a batch has been processed, so that a batch
+    interrupted by a crash or a transient failure, e.g. of the connection to Anki, is
+    processed again, rather than lost. A line which cannot be parsed and an invalid
+    row, e.g. in another language, are reported and skipped, so that they do not hold
+    back the rows after them. When a batch fails, its rows are processed one by one,
+    and those which still fail are skipped, unless none of them went through, e.g.
+    because Anki is not running: then the batch is retried up to `max_retries` times.
+    A file
+    which is truncated or replaced is read again from its start, and a trailing line
+    without line break is left until it is completed.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Union[Path, str]],
+        offsets: WatchOffsets,
+        file_format: Optional[str] = None,
+        columns: Optional[Dict[str, str]] = None,
+        batch_size: int = 100,
+        interval: float = 1.0,
+        front_lang: str = "ko",
+        max_retries: int = 3,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            paths (Iterable[Union[Path, str]]): The files and drop directories to watch.
+            offsets (WatchOffsets): The positions reached in the files.
+            file_format (Optional[str], optional): The format of the files. Defaults to
+                the format of the suffix of each file.
+            columns (Optional[Dict[str, str]], optional): The column of each field, as
+                in `read_rows`.
+            batch_size (int, optional): The maximum number of rows of a batch.
+                Defaults to 100.
+            interval (float, optional): The time between two polls of the files without
+                new rows, in seconds. Defaults to 1.0.
+            front_lang (str, optional): The expected language of the front sides.
+                Defaults to "ko".
+            max_retries (int, optional): The number of times a batch none of whose rows
+                can be processed is read again, before its rows are skipped.
+                Defaults to 3.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive, got {batch_size}.")
+        self.paths = [Path(path) for path in paths]
+        self.offsets = offsets
+        self.file_format = file_format
+        self.columns = columns
+        self.batch_size = batch_size
+        self.interval = interval
+        self.front_lang = front_lang
+        self.max_retries = max_retries
+        self._sleep = sleep
+
+    def files(self) -> List[Path]:
+        """The watched files which exist, in order."""
+        files = []
+        for path in self.paths:
+            if path.is_dir():
+                files.extend(
+                    sorted(
+                        child
+                        for child in path.iterdir()
+                        if child.is_file() and child.suffix.lower() in FORMATS
+                    )
+                )
+            elif path.is_file():
+                files.append(path)
+        return files
+
+    def poll(self) -> WatchBatch:
+        """Read the rows appended to the files since the committed offsets, up to
+        `batch_size` rows.
+        """
+        batch = WatchBatch()
+        for path in self.files():
+            if len(batch) >= self.batch_size:
+                break
+            rows, position = self._read(path, self.batch_size - len(batch))
+            batch.rows.extend(rows)
+            if position is not None:
+                batch.positions[str(path)] = position
+        return batch
+
+    def _read(
+        self, path: Path, max_rows: int
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        position = self.offsets.get(path) or {}
+        stat = path.stat()
+        offset = position.get("offset", 0)
+        if position.get("inode") != stat.st_ino or stat.st_size < offset:
+            # A new, replaced or truncated file is read from its start.
+            position, offset = {}, 0
+        if stat.st_size == offset and position:
+            return [], None
+
+        parser = RowParser(
+            self.file_format or file_format_of(path),
+            self.columns,
+            header=position.get("header"),
+            started=position.get("started", False),
+        )
+        rows: List[Dict[str, str]] = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while len(rows) < max_rows:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    rows.extend(parser.parse([line.decode("utf-8")]))
+                except Exception as e:
+                    # E.g. invalid JSON or UTF-8: reading it again would fail the same.
+                    print(f"Error: skipped line {line!r} of {path}: {e}")
+
+        return rows, {
+            "offset": offset,
+            "inode": stat.st_ino,
+            "header": parser.header,
+            "started": parser.started,
+        }
+
+    def commit(self, batch: WatchBatch) -> None:
+        """Record the positions reached by a processed batch."""
+        if not batch.positions:
+            return
+        for path, position in batch.positions.items():
+            self.offsets.set(path, position)
+        self.offsets.save()
+
+    def run(
+        self,
+        process: Callable[[List[Dict[str, str]]], Any],
+        max_polls: Optional[int] = None,
+    ) -> None:
+        """Poll the files and process their new rows, until interrupted.
+
+        Args:
+            process (Callable[[List[Dict[str, str]]], Any]): Processes the rows of a
+                batch, e.g. adds their notes to Anki.
+            max_polls (Optional[int], optional): Stop after this many polls. Defaults to
+                None, i.e. run forever.
+        """
+        polls = 0
+        retries = 0
+        while max_polls is None or polls < max_polls:
+            polls += 1
+            batch = self.poll()
+            rows = self._valid_rows(batch.rows)
+            if rows:
+                try:
+                    process(rows)
+                except ValueError as e:
+                    # Retrying would fail the same way: the rows are skipped.
+                    print(f"Error: skipped {len(rows)} rows: {e}")
+                except Exception as e:
+                    print(f"Error: failed to process {len(rows)} rows: {e}")
+                    failed = self._process_each(process, rows)
+                    if len(failed) == len(rows) and retries < self.max_retries:
+                        # The offsets are not committed: the rows are read again.
+                        retries += 1
+                        self._sleep(self.interval)
+                        continue
+                    for row, error in failed:
+                        print(f"Error: skipped {row['front']!r}: {error}")
+            retries = 0
+            self.commit(batch)
+            if len(batch) < self.batch_size:
+                # Caught up with the files.
+                self._sleep(self.interval)
+
+    @staticmethod
+    def _process_each(
+        process: Callable[[List[Dict[str, str]]], Any], rows: List[Dict[str, str]]
+    ) -> List[Tuple[Dict[str, str], Exception]]:
+        """Process the rows one by one, so that a failing row does not fail the others.
+
+        Returns:
+            List[Tuple[Dict[str, str], Exception]]: The rows which failed, but with a
+                ValueError, and their error.
+        """
+        failed = []
+        for row in rows:
+            try:
+                process([row])
+            except ValueError as e:
+                print(f"Error: skipped {row['front']!r}: {e}")
+            except Exception as e:
+                failed.append((row, e))
+        return failed
+
+    def _valid_rows(self, rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """The valid rows, the invalid ones being reported."""
+        valid_rows = []
+        for row in rows:
+            try:
+                valid_rows.append(check_row(row, self.front_lang))
+            except ValueError as e:
+                print(f"Error: skipped an invalid row: {e}")
+        return valid_rows
@@ -2,6 +2,7 @@ from pathlib import Path
 from typing import Dict
 
 import pytest
+
 from src.models import AnkiNoteResponse
 
 
@@ -25,9 +26,9 @@ def setup_anki_mock(mocker):
         "result": 1496198395707,
         "error": None,
     }
-    # Mock requests.post to return a mock response object with .json() method
+    # Mock requests.Session.post to return a mock response object with .json() method
     mocker.patch(
-        "requests.post",
+        "requests.Session.post",
         return_value=mocker.Mock(status_code=200, json=lambda: expected_response),
     )
     yield mocker
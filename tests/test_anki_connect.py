@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from src.anki_connect import AnkiConnectClient, AnkiConnectError
+
+
+def test_invoke(mocker):
+    """The request is encoded as JSON and the response decoded into a model."""
+    post = mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=200, json=lambda: {"result": 1496198395707, "error": None}
+        ),
+    )
+    client = AnkiConnectClient(api_url="http://anki", timeout=5)
+
+    response = client.invoke("addNote", note={"fields": {"表面": "안녕하세요"}})
+
+    assert response.status_code == 200
+    assert response.result == 1496198395707
+    assert response.error is None
+    assert post.call_args.args[0] == "http://anki"
+    assert post.call_args.kwargs["timeout"] == 5
+    payload = json.loads(post.call_args.kwargs["data"])
+    assert payload == {
+        "action": "addNote",
+        "version": 6,
+        "params": {"note": {"fields": {"表面": "안녕하세요"}}},
+    }
+
+
+def test_multi(mocker):
+    """The result of a `multi` request is split into one response per action."""
+    mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=200,
+            json=lambda: {
+                "result": [
+                    {"result": 1, "error": None},
+                    {"result": None, "error": "x"},
+                ],
+                "error": None,
+            },
+        ),
+    )
+    client = AnkiConnectClient()
+
+    responses = client.multi([{"action": "addNote", "params": {}}] * 2)
+
+    assert [r.result for r in responses] == [1, None]
+    assert [r.error for r in responses] == [None, "x"]
+
+
+def test_multi_request_failure(mocker):
+    """If the `multi` request fails as a whole, every action reports the error."""
+    mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=500, json=mocker.Mock(side_effect=ValueError)
+        ),
+    )
+    client = AnkiConnectClient()
+
+    responses = client.multi([{"action": "addNote", "params": {}}] * 3)
+
+    assert len(responses) == 3
+    assert all(r.status_code == 500 and r.error is not None for r in responses)
+
+
+def test_find_notes_info_in_chunks(mocker):
+    """The notes found are fetched with one `notesInfo` request per chunk."""
+    responses = [
+        {"result": [1, 2, 3], "error": None},
+        {"result": [{"noteId": 1}, {"noteId": 2}], "error": None},
+        {"result": [{"noteId": 3}], "error": None},
+    ]
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            mocker.Mock(status_code=200, json=lambda r=r: r) for r in responses
+        ],
+    )
+
+    notes_info = list(AnkiConnectClient().find_notes_info("deck:test", chunk_size=2))
+
+    assert [note_info["noteId"] for note_info in notes_info] == [1, 2, 3]
+    payloads = [json.loads(c.kwargs["data"]) for c in post.call_args_list]
+    assert [p["action"] for p in payloads] == ["findNotes", "notesInfo", "notesInfo"]
+    assert payloads[2]["params"] == {"notes": [3]}
+
+
+def test_find_notes_info_error(mocker):
+    mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=200, json=lambda: {"result": None, "error": "bad query"}
+        ),
+    )
+
+    with pytest.raises(AnkiConnectError, match="bad query"):
+        list(AnkiConnectClient().find_notes_info("deck:"))
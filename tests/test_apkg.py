@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from src import BACK_FIELD, FRONT_FIELD
+from src.apkg import ApkgExporter
+from src.media import parse_field_map
+from src.note_batch import NoteBatch
+
+
+def fake_create_audio(tmp_path):
+    created = []
+
+    def create_audio(text, path=None, cache=None):
+        created.append(text)
+        audio_path = tmp_path / f"naver_{len(created)}.mp3"
+        audio_path.write_bytes(text.encode("utf-8"))
+        return audio_path
+
+    return create_audio
+
+
+def test_export_apkg(mocker, tmp_path):
+    """The notes, their cards and their audios are written into the package."""
+    mocker.patch("src.apkg.create_audio", side_effect=fake_create_audio(tmp_path))
+    batch = NoteBatch.from_rows(
+        [
+            {"front": "안녕하세요", "back": "こんにちは"},
+            {
+                "front": "죄송합니다",
+                "back": "すみません",
+                "deckName": "korean::phrases",
+            },
+            {"front": "안녕하세요", "back": "duplicate"},
+        ]
+    )
+    path = tmp_path / "korean.apkg"
+    with ApkgExporter(path) as exporter:
+        assert exporter.add_notes(batch) == 2
+    assert exporter.summary() == (
+        f"exported 2 notes and 2 audios to {path} (1 duplicates skipped)"
+    )
+    # The audios which are not cached are removed once written.
+    assert list(tmp_path.glob("*.mp3")) == []
+
+    with zipfile.ZipFile(path) as package:
+        media = json.loads(package.read("media"))
+        assert sorted(package.read(entry).decode() for entry in media) == sorted(
+            ["안녕하세요", "죄송합니다"]
+        )
+        (tmp_path / "collection.anki2").write_bytes(package.read("collection.anki2"))
+
+    connection = sqlite3.connect(tmp_path / "collection.anki2")
+    notes = connection.execute("SELECT id, mid, flds, sfld FROM notes").fetchall()
+    assert [flds.split("\x1f") for _, _, flds, _ in notes] == [
+        [f"안녕하세요[sound:{media['0']}]", "こんにちは"],
+        [f"죄송합니다[sound:{media['1']}]", "すみません"],
+    ]
+    assert [sfld for *_, sfld in notes] == ["안녕하세요", "죄송합니다"]
+    cards = connection.execute("SELECT nid, did, ord, due FROM cards").fetchall()
+    assert len(cards) == 4 and {ord for _, _, ord, _ in cards} == {0, 1}
+
+    models_json, decks_json = connection.execute(
+        "SELECT models, decks FROM col"
+    ).fetchone()
+    (model,) = json.loads(models_json).values()
+    assert model["name"] == "Basic (裏表反転カード付き)+sentense"
+    assert [field["name"] for field in model["flds"]] == [FRONT_FIELD, BACK_FIELD]
+    assert {notes[0][1]} == {model["id"]}
+    decks = {deck["name"]: deck["id"] for deck in json.loads(decks_json).values()}
+    assert {did for _, did, _, _ in cards} == {
+        decks["korean"],
+        decks["korean::phrases"],
+    }
+
+
+def test_export_apkg_is_discarded_on_failure(tmp_path):
+    path = tmp_path / "korean.apkg"
+    with pytest.raises(RuntimeError):
+        with ApkgExporter(path) as exporter:
+            exporter.add_notes(
+                NoteBatch.from_rows([{"front": "안녕하세요"}]), audio=False
+            )
+            raise RuntimeError("interrupted")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_export_apkg_sentence_fields(mocker, tmp_path):
+    """The mapped attributes get a field of the note type, the sentence its audio."""
+    mocker.patch("src.apkg.create_audio", side_effect=fake_create_audio(tmp_path))
+    batch = NoteBatch.from_rows(
+        [{"front": "안녕", "back": "やあ", "sentence": "안녕, 친구야."}]
+    )
+    path = tmp_path / "korean.apkg"
+    field_map = parse_field_map("sentence=例文,translated_sentence=例文訳")
+    with ApkgExporter(path, field_map=field_map) as exporter:
+        exporter.add_notes(batch, tts_workers=2)
+
+    with zipfile.ZipFile(path) as package:
+        assert len(json.loads(package.read("media"))) == 2
+        (tmp_path / "collection.anki2").write_bytes(package.read("collection.anki2"))
+
+    connection = sqlite3.connect(tmp_path / "collection.anki2")
+    ((flds,),) = connection.execute("SELECT flds FROM notes").fetchall()
+    front, back, sentence, translated_sentence = flds.split("\x1f")
+    assert front.startswith("안녕[sound:") and back == "やあ"
+    assert sentence.startswith("안녕, 친구야.[sound:") and translated_sentence == ""
+    ((models_json,),) = connection.execute("SELECT models FROM col").fetchall()
+    (model,) = json.loads(models_json).values()
+    assert [field["name"] for field in model["flds"]] == list(field_map.values())
+    assert model["req"] == [[0, "any", [0]], [1, "any", [1]]]
+
+
+def test_export_apkg_ids_are_unique(mocker, tmp_path):
+    """Colliding stable ids are made unique, rather than failing the export."""
+    mocker.patch("src.apkg._stable_id", return_value=1 << 40)
+    batch = NoteBatch.from_rows([{"front": "안녕"}, {"front": "감사"}])
+    path = tmp_path / "korean.apkg"
+    with ApkgExporter(path) as exporter:
+        assert exporter.add_notes(batch, audio=False) == 2
+
+    with zipfile.ZipFile(path) as package:
+        (tmp_path / "collection.anki2").write_bytes(package.read("collection.anki2"))
+    connection = sqlite3.connect(tmp_path / "collection.anki2")
+    notes = connection.execute("SELECT id, guid FROM notes").fetchall()
+    assert len({note_id for note_id, _ in notes}) == 2
+    assert len({guid for _, guid in notes}) == 2
+    (n_cards,) = connection.execute("SELECT COUNT(DISTINCT id) FROM cards").fetchone()
+    assert n_cards == 4
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.async_card_creator import AsyncCardCreator
+from src.models import AnkiNoteModel
+
+WORDS = ["안녕하세요", "죄송합니다", "감사합니다", "사랑해요"]
+
+
+@pytest.fixture
+def anki_mock(mocker):
+    mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=200, json=lambda: {"result": 1, "error": None}
+        ),
+    )
+
+
+def test_send_notes_in_order(mocker, anki_mock):
+    """Every note is translated and sent, the responses keep the input order."""
+
+    def fake_translate_words(words, **kwargs):
+        if words == ["감사합니다"]:
+            raise RuntimeError("translator down")
+        time.sleep(0.01 * len(words[0]))
+        return [f"<{word}>" for word in words]
+
+    mocker.patch(
+        "src.async_card_creator.translate_words", side_effect=fake_translate_words
+    )
+    async_card_creator = AsyncCardCreator(translate_workers=3)
+
+    response_list = async_card_creator.send_notes(
+        (AnkiNoteModel(front=word) for word in WORDS), audio=False
+    )
+
+    assert [r.front for r in response_list] == WORDS
+    assert [r.back for r in response_list] == [
+        "<안녕하세요>",
+        "<죄송합니다>",
+        None,
+        "<사랑해요>",
+    ]
+    assert response_list[2].status_code is None
+    assert "translator down" in response_list[2].error
+    assert all(r.result == 1 for i, r in enumerate(response_list) if i != 2)
+
+
+def test_stage_concurrency_limit(mocker, anki_mock, tmp_path):
+    """No more audios than `tts_workers` are created at the same time."""
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def fake_create_audio(text, cache=None):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        audio_path = tmp_path / f"{text}.mp3"
+        audio_path.touch()
+        return audio_path
+
+    mocker.patch("src.card_creator.create_audio", side_effect=fake_create_audio)
+    async_card_creator = AsyncCardCreator(tts_workers=2, queue_size=1)
+
+    response_list = async_card_creator.send_notes(
+        AnkiNoteModel(front=word, back="x") for word in WORDS
+    )
+
+    assert peak == 2
+    assert len(response_list) == len(WORDS)
+
+
+def test_cancellation_stops_workers(mocker, anki_mock):
+    """Cancelling the pipeline cancels its workers instead of hanging."""
+    mocker.patch(
+        "src.async_card_creator.translate_words",
+        side_effect=lambda words, **kwargs: time.sleep(0.05) or words,
+    )
+
+    async def run():
+        task = asyncio.create_task(
+            AsyncCardCreator(translate_workers=1).asend_notes(
+                (AnkiNoteModel(front=word) for word in WORDS * 10), audio=False
+            )
+        )
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+
+
+def test_failed_send_releases_audio(mocker, tmp_path):
+    """The audio of a note which cannot be sent is removed, rather than leaked."""
+    mocker.patch(
+        "requests.Session.post",
+        return_value=mocker.Mock(
+            status_code=200, json=lambda: {"result": None, "error": "media failed"}
+        ),
+    )
+
+    def fake_create_audio(text, cache=None):
+        audio_path = tmp_path / f"naver_{len(text)}.mp3"
+        audio_path.write_bytes(b"0")
+        return audio_path
+
+    mocker.patch("src.card_creator.create_audio", side_effect=fake_create_audio)
+    response_list = AsyncCardCreator().send_notes(
+        [AnkiNoteModel(front="안녕하세요", back="こんにちは")]
+    )
+
+    assert "media failed" in response_list[0].error
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,75 @@
+import os
+
+from src.audio_cache import AudioCache
+
+
+def write_audio(size):
+    def create(path):
+        path.write_bytes(b"0" * size)
+
+    return create
+
+
+def test_get_or_create(tmp_path):
+    """The audio is created on the first call only, under a deterministic name."""
+    cache = AudioCache(tmp_path)
+
+    first = cache.get_or_create("안녕하세요", write_audio(10), voice={"lang": "ko"})
+    second = cache.get_or_create("안녕하세요", write_audio(99), voice={"lang": "ko"})
+    other_voice = cache.get_or_create(
+        "안녕하세요", write_audio(10), voice={"lang": "ja"}
+    )
+
+    assert first == second
+    assert first.read_bytes() == b"0" * 10
+    assert first.name == cache.file_path("안녕하세요", {"lang": "ko"}).name
+    assert other_voice != first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_failed_creation_is_not_cached(tmp_path):
+    cache = AudioCache(tmp_path)
+
+    def fail(path):
+        path.write_bytes(b"partial")
+        raise RuntimeError("tts failed")
+
+    try:
+        cache.get_or_create("안녕하세요", fail)
+    except RuntimeError:
+        pass
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lru_eviction(tmp_path):
+    """Beyond the size cap, the least recently used audios are removed."""
+    cache = AudioCache(tmp_path, max_bytes=25)
+    a = cache.get_or_create("a", write_audio(10))
+    b = cache.get_or_create("b", write_audio(10))
+    os.utime(a, (0, 0))
+    os.utime(b, (1, 1))
+    cache.get_or_create("a", write_audio(10))  # hit: a becomes the most recent
+
+    c = cache.get_or_create("c", write_audio(10))
+
+    assert a.exists()
+    assert not b.exists()
+    assert c.exists()
+
+
+def test_misses_under_the_cap_do_not_scan(mocker, tmp_path):
+    """The cache folder is indexed once, and scanned again only beyond the cap."""
+    AudioCache(tmp_path).get_or_create("a", write_audio(10))
+    cache = AudioCache(tmp_path, max_bytes=45)
+    scan = mocker.spy(cache, "_scan")
+
+    for text in "bcd":
+        cache.get_or_create(text, write_audio(10))
+    assert scan.call_count == 0
+
+    cache.get_or_create("e", write_audio(10))
+    assert scan.call_count == 1
+    # Shrunk under 90% of the cap, the least recently used audio first.
+    assert not cache.file_path("a").exists()
+    assert len(list(tmp_path.glob("*.mp3"))) == 4
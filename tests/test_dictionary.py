@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from src.dictionary import LocalDictionary, compile_dictionary
+
+
+def test_compiled_dictionary_lookup(tmp_path):
+    path = tmp_path / "ko-ja.kdict"
+    entries = [("안녕하세요", "こんにちは"), ("사랑", "愛"), ("가다", "行く")]
+    assert compile_dictionary(entries + [("사랑", "恋")], path) == 3
+
+    with LocalDictionary(path) as dictionary:
+        assert (dictionary.src, dictionary.dest, len(dictionary)) == ("ko", "ja", 3)
+        for word, translation in entries:
+            assert dictionary.get(word) == translation
+        # The first translation of a word is kept.
+        assert dictionary.get(" 사랑 ") == "愛"
+        assert "감사합니다" not in dictionary
+        assert dictionary.get("") is None
+        assert dictionary.get("힣") is None
+
+
+def test_empty_and_invalid_dictionaries(tmp_path):
+    compile_dictionary([], tmp_path / "empty.kdict")
+    with LocalDictionary(tmp_path / "empty.kdict") as dictionary:
+        assert dictionary.get("안녕하세요") is None
+
+    (tmp_path / "words.txt").write_text("안녕하세요\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        LocalDictionary(tmp_path / "words.txt")
+
+
+def test_dictionary_from_sheet_is_recompiled_when_changed(tmp_path):
+    sheet = tmp_path / "vocabulary.tsv"
+    sheet.write_text("안녕하세요\tこんにちは\n죄송합니다\t\n", encoding="utf-8")
+    with LocalDictionary.from_sheet(sheet) as dictionary:
+        assert dictionary.path == tmp_path / "vocabulary.tsv.kdict"
+        assert dictionary.get("안녕하세요") == "こんにちは"
+        assert dictionary.get("죄송합니다") is None
+
+    sheet.write_text("죄송합니다\tすみません\n", encoding="utf-8")
+    mtime = dictionary.path.stat().st_mtime + 1
+    os.utime(sheet, (mtime, mtime))
+    with LocalDictionary.from_sheet(sheet) as dictionary:
+        assert dictionary.get("죄송합니다") == "すみません"
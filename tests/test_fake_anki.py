@@ -0,0 +1,30 @@
+from benchmarks.fake_anki import FakeAnkiConnect
+from src.anki_connect import AnkiConnectClient
+from src.card_creator import CardCreator
+from src.models import AnkiNoteModel
+
+
+def test_send_notes_to_fake_anki(global_data):
+    """The stand-in of AnkiConnect accepts the notes of CardCreator, single or batched."""
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front=word, back="x")
+        for word in ["안녕하세요", "죄송합니다", "감사합니다"]
+    ]
+    with FakeAnkiConnect() as anki, AnkiConnectClient(api_url=anki.url) as client:
+        card_creator = CardCreator(anki_notes, client=client)
+        single = card_creator.send_notes(audio=False)
+        batched = card_creator.send_notes(audio=False, batch_size=2)
+
+        assert [r.result for r in single + batched] == [1, 2, 3, 4, 5, 6]
+        assert len(list(client.find_notes_info("deck:test"))) == 6
+
+
+def test_fake_anki_error_injection():
+    with (
+        FakeAnkiConnect(error_rate=1.0) as anki,
+        AnkiConnectClient(api_url=anki.url) as client,
+    ):
+        response = client.invoke("addNote", note={"fields": {}})
+
+    assert response.status_code == 200
+    assert response.error == "cannot create note because it is a duplicate"
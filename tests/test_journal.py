@@ -0,0 +1,75 @@
+from src.card_creator import AnkiNotes, CardCreator
+from src.journal import ImportJournal
+from src.models import AnkiConnectResponse, AnkiNoteModel
+
+
+def test_journal_resume(tmp_path):
+    """The progress is restored on reopening, and a partial last record is ignored."""
+    path = tmp_path / "words.txt.journal"
+    with ImportJournal(path) as journal:
+        journal.record("안녕하세요", "translated", back="こんにちは")
+        journal.record("안녕하세요", "audio", filename="kanki_0123.mp3")
+        journal.record("안녕하세요", "added", note_id=1)
+        journal.record("죄송합니다", "translated", back="すみません")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"front": "감사합니다", "sta')
+
+    journal = ImportJournal(path)
+    assert journal.translation("죄송합니다") == "すみません"
+    assert journal.media("안녕하세요") == "kanki_0123.mp3"
+    assert journal.note_id("안녕하세요") == 1
+    assert journal.note_id("감사합니다") is None
+    assert list(journal.skip_added(["안녕하세요", "죄송합니다"])) == ["죄송합니다"]
+    journal.close()
+
+    # Without resuming, the journal starts over.
+    with ImportJournal(path, resume=False) as journal:
+        assert journal.translation("죄송합니다") is None
+    assert path.read_text() == ""
+
+
+def test_resume_reuses_translations_and_media(mocker, tmp_path):
+    """Neither the recorded translations nor the stored audios are done again."""
+    path = tmp_path / "words.txt.journal"
+    with ImportJournal(path) as journal:
+        journal.record("안녕하세요", "translated", back="こんにちは")
+        journal.record("안녕하세요", "audio", filename="kanki_0123.mp3")
+
+    translate = mocker.patch(
+        "src.card_creator.translate_words",
+        side_effect=lambda words, **_: ["?"] * len(words),
+    )
+    create_audio = mocker.patch("src.card_creator.create_audio")
+    client = mocker.Mock()
+    client.invoke.return_value = AnkiConnectResponse(status_code=200, result=42)
+
+    with ImportJournal(path) as journal:
+        anki_notes = AnkiNotes.from_words(["안녕하세요"], journal=journal).anki_notes
+        response_list = CardCreator(
+            anki_notes, client=client, journal=journal
+        ).send_notes()
+
+    assert translate.call_args.args[0] == []
+    create_audio.assert_not_called()
+    client.invoke.assert_called_once()
+    action, params = client.invoke.call_args.args[0], client.invoke.call_args.kwargs
+    assert action == "addNote"
+    assert params["note"]["fields"]["表面"] == "안녕하세요[sound:kanki_0123.mp3]"
+    assert params["note"]["fields"]["裏面"] == "こんにちは"
+    assert response_list[0].result == 42
+    assert ImportJournal(path).note_id("안녕하세요") == 42
+
+
+def test_journal_is_committed_once_per_chunk(mocker, tmp_path):
+    """The per-note mode flushes the journal once, not once per note."""
+    client = mocker.Mock()
+    client.invoke.return_value = AnkiConnectResponse(status_code=200, result=1)
+
+    with ImportJournal(tmp_path / "words.txt.journal") as journal:
+        commit = mocker.spy(journal, "commit")
+        anki_notes = [
+            AnkiNoteModel(front=front, back="?") for front in ["안녕", "감사", "미안"]
+        ]
+        CardCreator(anki_notes, client=client, journal=journal).send_notes(audio=False)
+        assert commit.call_count == 1
+        assert journal.note_id("미안") == 1
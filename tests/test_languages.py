@@ -0,0 +1,31 @@
+from src.languages import check_language, check_languages
+
+
+def test_check_language_by_script(mocker):
+    """Texts mostly written in a script are decided without langdetect."""
+    langdetect = mocker.patch("src.languages._detect_with_langdetect")
+
+    assert check_language("안녕하세요", "ko") is None
+    assert check_language("이거 얼마예요?", "ko") is None
+    assert check_language("hello", "ko") == "en"
+    assert check_language("こんにちは", "ko") == "ja"
+    assert check_language("食べる", "ja") is None
+    langdetect.assert_not_called()
+
+
+def test_check_language_ambiguous(mocker):
+    """Only the ambiguous texts are passed to langdetect, if enabled."""
+    langdetect = mocker.patch(
+        "src.languages._detect_with_langdetect", return_value="en"
+    )
+
+    assert check_language("Kpop 좋아", "ko") == "en"
+    assert check_language("Kpop 좋아", "ko", fallback=False) is None
+    langdetect.assert_called_once_with("Kpop 좋아")
+
+
+def test_check_languages_once_per_text(mocker):
+    check = mocker.patch("src.languages.check_language", return_value=None)
+
+    assert check_languages(["안녕", "안녕", "감사"], "ko") == [None, None, None]
+    assert check.call_count == 2
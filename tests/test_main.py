@@ -0,0 +1,84 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.main import get_args_parser
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("googletrans", "navertts", "langdetect", "pydantic", "requests")
+
+
+def imported_modules(code: str) -> list:
+    """The heavy modules imported by a code, run in a fresh interpreter."""
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys\n{code}\nprint(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])",
+        ],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return output.split()
+
+
+def test_cli_parsing_is_lightweight():
+    """Parsing the arguments, e.g. for `kanki --help`, imports no heavy dependency."""
+    code = "sys.argv = ['kanki', '-w', '안녕하세요']\nfrom src.main import get_args_parser\nget_args_parser()"
+    assert imported_modules(code) == []
+
+
+def test_translator_and_tts_are_lazy():
+    """googletrans, navertts and langdetect are only imported on first use."""
+    assert imported_modules("import src.card_creator") == ["pydantic", "requests"]
+
+
+def test_args_parser(monkeypatch):
+    monkeypatch.setattr(
+        sys, "argv", ["kanki", "-f", "words.txt", "--batch_size", "50", "--no_audio"]
+    )
+    args = get_args_parser()
+    assert args.file == "words.txt"
+    assert args.batch_size == 50
+    assert args.no_audio
+
+
+@pytest.mark.parametrize("flag", ["--skip_existing", "--resume", "--async_pipeline"])
+def test_watch_rejects_one_shot_flags(monkeypatch, flag):
+    monkeypatch.setattr(sys, "argv", ["kanki", "--watch", "inbox", flag])
+    with pytest.raises(SystemExit):
+        get_args_parser()
+
+
+@pytest.mark.parametrize(
+    "flag", ["--batch_size", "--chunk_size", "--translate_batch_size"]
+)
+def test_async_pipeline_rejects_batching_flags(monkeypatch, flag):
+    monkeypatch.setattr(
+        sys, "argv", ["kanki", "-f", "words.txt", "--async_pipeline", flag, "10"]
+    )
+    with pytest.raises(SystemExit):
+        get_args_parser()
+
+
+@pytest.mark.parametrize("tts_workers", ["0", "-1"])
+def test_tts_workers_must_be_positive(monkeypatch, tts_workers):
+    monkeypatch.setattr(
+        sys, "argv", ["kanki", "-w", "안녕하세요", "--tts_workers", tts_workers]
+    )
+    with pytest.raises(SystemExit):
+        get_args_parser()
+
+
+def test_resume_requires_a_journal(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["kanki", "-w", "안녕하세요", "--resume"])
+    with pytest.raises(SystemExit):
+        get_args_parser()
+    monkeypatch.setattr(
+        sys, "argv", ["kanki", "-w", "안녕하세요", "--resume", "--journal", "j"]
+    )
+    assert get_args_parser().resume
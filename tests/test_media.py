@@ -0,0 +1,159 @@
+import threading
+
+import pytest
+
+from src import BACK_FIELD, FRONT_FIELD
+from src.card_creator import CardCreator
+from src.media import parse_field_map, schedule_media, voiced_attributes
+from src.models import AnkiConnectResponse
+from src.note_batch import NoteBatch
+
+ROWS = [
+    {"front": "안녕", "sentence": "안녕, 오늘 날씨가 정말 좋네요."},
+    {"front": "죄송합니다"},
+    {"front": "감사합니다", "sentence": "도와주셔서 감사합니다."},
+]
+
+
+def test_parse_field_map():
+    field_map = parse_field_map("sentence=例文, translated_sentence=例文訳")
+    assert field_map == {
+        "front": FRONT_FIELD,
+        "back": BACK_FIELD,
+        "sentence": "例文",
+        "translated_sentence": "例文訳",
+    }
+    assert voiced_attributes(field_map) == ["front", "sentence"]
+    assert voiced_attributes(parse_field_map("front=Word")) == ["front"]
+
+    for spec in ["sentence", "sentence=", "example=例文", f"sentence={BACK_FIELD}"]:
+        with pytest.raises(ValueError):
+            parse_field_map(spec)
+
+
+def test_schedule_media_longest_first():
+    """The clips of the whole batch are created longest first, and each anki-note gets
+    its audios in the order of the attributes.
+    """
+    created = []
+    lock = threading.Lock()
+
+    def create(text):
+        with lock:
+            created.append(text)
+        if text == "죄송합니다":
+            raise ConnectionError("TTS is down")
+        return f"{text}.mp3"
+
+    batch = NoteBatch.from_rows(ROWS)
+    media = list(
+        schedule_media(batch, create, attributes=["front", "sentence"], max_workers=1)
+    )
+
+    texts = [text for row in ROWS for text in row.values()]
+    assert created == sorted(texts, key=len, reverse=True)
+    assert list(media[0].items()) == [
+        ("front", "안녕.mp3"),
+        ("sentence", "안녕, 오늘 날씨가 정말 좋네요..mp3"),
+    ]
+    assert list(media[1]) == ["front"]
+    assert isinstance(media[1]["front"], ConnectionError)
+
+
+def test_schedule_media_lookahead_window():
+    """Only the clips of the next notes are scheduled, so the first note is ready
+    early, even though its clip is the shortest.
+    """
+    created = []
+    fronts = ["가"] + ["가" * (i + 2) for i in range(20)]
+    media = schedule_media(
+        NoteBatch.from_rows([{"front": front} for front in fronts]),
+        lambda text: created.append(text) or text,
+        max_workers=1,
+        lookahead=2,
+    )
+
+    assert next(media) == {"front": "가"}
+    assert created[:2] == ["가가", "가"]
+    assert fronts[-1] not in created
+    assert [audio["front"] for audio in media] == fronts[1:]
+    assert sorted(created, key=len) == fronts
+
+
+def test_schedule_media_releases_unconsumed_audios():
+    """The audios created ahead of the notes are released if the consumer stops."""
+    released = []
+    fronts = ["가" * (i + 1) for i in range(6)]
+    media = schedule_media(
+        NoteBatch.from_rows([{"front": front} for front in fronts]),
+        lambda text: text,
+        max_workers=2,
+        release=released.append,
+    )
+
+    assert next(media) == {"front": "가"}
+    media.close()
+    # The shortest clip is the last one started, so the others are all created.
+    assert sorted(released, key=len) == fronts[1:]
+
+
+def test_schedule_media_sequential_raises():
+    def create(text):
+        raise ConnectionError("TTS is down")
+
+    media = schedule_media(NoteBatch.from_rows(ROWS), create)
+    with pytest.raises(ConnectionError):
+        next(media)
+
+
+def test_schedule_media_needs_a_worker():
+    with pytest.raises(ValueError):
+        next(
+            schedule_media(NoteBatch.from_rows(ROWS), lambda text: text, max_workers=0)
+        )
+
+
+@pytest.mark.parametrize("batch_size", [None, 10])
+def test_send_sentence_audios(mocker, tmp_path, batch_size):
+    """The audio of the sentence is attached to the field of the sentence."""
+
+    def create_audio(text, cache=None):
+        audio_path = tmp_path / f"{len(text)}.mp3"
+        audio_path.write_bytes(text.encode("utf-8"))
+        return audio_path
+
+    def multi(actions):
+        return [AnkiConnectResponse(status_code=200, result=1) for _ in actions]
+
+    mocker.patch("src.card_creator.create_audio", side_effect=create_audio)
+    client = mocker.Mock()
+    client.multi.side_effect = multi
+    client.invoke.side_effect = lambda action, **params: AnkiConnectResponse(
+        status_code=200, result=1 if action == "addNote" else None
+    )
+
+    batch = NoteBatch.from_rows(ROWS[:1], deck_name="korean")
+    batch.fill_backs({"안녕": "やあ"})
+    results = CardCreator(
+        batch, client=client, field_map=parse_field_map("sentence=例文")
+    ).send_notes(batch_size=batch_size, tts_workers=2)
+
+    assert results.n_errors == 0
+    if batch_size is None:
+        store_media = [
+            call for call in client.invoke.call_args_list if call.args[0] != "addNote"
+        ]
+        (note,) = [
+            call.kwargs["note"]
+            for call in client.invoke.call_args_list
+            if call.args[0] == "addNote"
+        ]
+    else:
+        store_media, add_notes = [call.args[0] for call in client.multi.call_args_list]
+        note = add_notes[0]["params"]["note"]
+    assert len(store_media) == 2
+    assert note["fields"] == {
+        FRONT_FIELD: "안녕[sound:2.mp3]",
+        BACK_FIELD: "やあ",
+        "例文": "안녕, 오늘 날씨가 정말 좋네요.[sound:18.mp3]",
+    }
@@ -0,0 +1,54 @@
+import pytest
+
+from src.card_creator import CardCreator
+from src.metrics import Metrics, metrics
+from src.models import AnkiConnectResponse, AnkiNoteModel
+
+
+def test_metrics_timer_and_counters():
+    registry = Metrics()
+    events = []
+    registry.add_sink(lambda kind, name, value: events.append((kind, name)))
+
+    with registry.timer("translate"):
+        pass
+    with pytest.raises(RuntimeError):
+        with registry.timer("translate"):
+            raise RuntimeError
+    registry.incr("retries")
+    registry.incr("retries", 2)
+
+    summary = registry.summary()
+    assert summary["stages"]["translate"]["count"] == 2
+    assert summary["counters"] == {"retries": 3}
+    assert events == [
+        ("timing", "translate"),
+        ("timing", "translate"),
+        ("counter", "retries"),
+        ("counter", "retries"),
+    ]
+    assert "translate" in registry.report_table()
+    prometheus = registry.to_prometheus()
+    assert 'kanki_stage_seconds_count{stage="translate"} 2' in prometheus
+    assert "kanki_retries_total 3" in prometheus
+
+
+def test_card_creator_metrics(mocker, global_data):
+    """Sending the notes times the AnkiConnect requests and counts the failures."""
+    metrics.reset()
+    client = mocker.Mock()
+    client.invoke.side_effect = [
+        AnkiConnectResponse(status_code=200, result=1),
+        AnkiConnectResponse(status_code=200, error="duplicate"),
+    ]
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front=word, back="x")
+        for word in ["안녕하세요", "죄송합니다"]
+    ]
+
+    CardCreator(anki_notes, client=client).send_notes(audio=False)
+
+    summary = metrics.summary()
+    assert summary["stages"]["add_note"]["count"] == 2
+    assert summary["stages"]["validate_language"]["count"] == 2
+    assert summary["counters"] == {"notes_added": 1, "notes_failed": 1}
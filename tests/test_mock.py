@@ -1,4 +1,10 @@
+import base64
+import json
+import tempfile
+
 from src.card_creator import AnkiNotes, CardCreator
+from src.models import AnkiNoteModel
+from src.utils import InMemoryAudio
 
 
 def test_add_note_to_anki(mocker, global_data):
@@ -7,9 +13,9 @@ def test_add_note_to_anki(mocker, global_data):
         "result": 1496198395707,
         "error": None,
     }
-    # Mock requests.post to return a mock response object with .json() method
+    # Mock requests.Session.post to return a mock response object with .json() method
     mocker.patch(
-        "requests.post",
+        "requests.Session.post",
         return_value=mocker.Mock(status_code=200, json=lambda: expected_response),
     )
 
@@ -29,3 +35,157 @@ def test_add_note_to_anki(mocker, global_data):
     assert response_list[0].result == expected_response["result"]
     assert response_list[0].error == expected_response["error"]
     assert response_list[0].status_code == 200
+
+
+def test_send_notes_batched(mocker, global_data):
+    """Notes are grouped into `multi` requests and the results are mapped back per note."""
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front=word, back="x")
+        for word in ["안녕하세요", "죄송합니다", "감사합니다"]
+    ]
+    responses = [
+        {
+            "result": [
+                {"result": 1, "error": None},
+                {"result": None, "error": "duplicate"},
+            ],
+            "error": None,
+        },
+        {"result": [{"result": 3, "error": None}], "error": None},
+    ]
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            mocker.Mock(status_code=200, json=lambda r=r: r) for r in responses
+        ],
+    )
+
+    card_creator = CardCreator(anki_notes)
+    response_list = card_creator.send_notes(audio=False, batch_size=2)
+
+    assert post.call_count == 2
+    payload = json.loads(post.call_args_list[0].kwargs["data"])
+    assert payload["action"] == "multi"
+    assert [a["action"] for a in payload["params"]["actions"]] == ["addNote"] * 2
+    assert [r.result for r in response_list] == [1, None, 3]
+    assert [r.error for r in response_list] == [None, "duplicate", None]
+    assert [r.front for r in response_list] == [n.front for n in anki_notes]
+
+
+def test_send_notes_batched_media_failure(mocker, global_data, tmp_path):
+    """A note whose media could not be stored is reported, the others are still added."""
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front=word, back="x")
+        for word in ["안녕하세요", "죄송합니다"]
+    ]
+    audio_paths = [tmp_path / "a.mp3", tmp_path / "b.mp3"]
+    for audio_path in audio_paths:
+        audio_path.touch()
+    mocker.patch("src.card_creator.create_audio", side_effect=audio_paths)
+    responses = [
+        {
+            "result": [
+                {"result": "a.mp3", "error": None},
+                {"result": None, "error": "boom"},
+            ],
+            "error": None,
+        },
+        {"result": [{"result": 1, "error": None}], "error": None},
+    ]
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            mocker.Mock(status_code=200, json=lambda r=r: r) for r in responses
+        ],
+    )
+
+    response_list = CardCreator(anki_notes).send_notes(audio=True, batch_size=2)
+
+    note_payload = json.loads(post.call_args_list[1].kwargs["data"])
+    actions = note_payload["params"]["actions"]
+    assert len(actions) == 1
+    assert actions[0]["params"]["note"]["fields"]["表面"] == "안녕하세요[sound:a.mp3]"
+    assert response_list[0].result == 1
+    assert response_list[1].result is None
+    assert "boom" in response_list[1].error
+    assert not any(audio_path.exists() for audio_path in audio_paths)
+
+
+def test_send_notes_concurrent_audio_failure(mocker, global_data, tmp_path):
+    """With concurrent TTS, a failed audio is reported in the response of its note."""
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front=word, back="x")
+        for word in ["안녕하세요", "죄송합니다"]
+    ]
+    audio_path = tmp_path / "a.mp3"
+    audio_path.touch()
+
+    def fake_create_audio(text, cache=None):
+        if text == "죄송합니다":
+            raise OSError("tts unavailable")
+        return audio_path
+
+    mocker.patch("src.card_creator.create_audio", side_effect=fake_create_audio)
+    responses = [{"result": "a.mp3", "error": None}, {"result": 1, "error": None}]
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            mocker.Mock(status_code=200, json=lambda r=r: r) for r in responses
+        ],
+    )
+
+    response_list = CardCreator(anki_notes).send_notes(audio=True, tts_workers=2)
+
+    assert post.call_count == 2  # storeMediaFile + addNote of the first note only
+    assert response_list[0].result == 1
+    assert response_list[1].status_code is None
+    assert "tts unavailable" in response_list[1].error
+
+
+def test_iter_txt_chunks(mocker, tmp_path):
+    """The file is translated chunk by chunk, without its blank lines."""
+    file_path = tmp_path / "words.txt"
+    file_path.write_text("안녕하세요\n죄송합니다\n\n감사합니다\n")
+    translate = mocker.patch(
+        "src.card_creator.translate_words",
+        side_effect=lambda words, **kwargs: [f"<{word}>" for word in words],
+    )
+
+    chunks = AnkiNotes.iter_txt(data_fname=file_path, chunk_size=2)
+    first = next(chunks)
+
+    assert translate.call_count == 1
+    assert [note.front for note in first.anki_notes] == ["안녕하세요", "죄송합니다"]
+    assert [[note.back for note in chunk.anki_notes] for chunk in chunks] == [
+        ["<감사합니다>"]
+    ]
+
+
+def test_send_notes_in_memory_audio(mocker, global_data):
+    """In memory mode, the audio content is sent through the `data` parameter."""
+    anki_notes = [
+        AnkiNoteModel(deckName=global_data["deck_name"], front="안녕하세요", back="x")
+    ]
+    audio = InMemoryAudio("kanki_test.mp3", tempfile.SpooledTemporaryFile())
+    audio.buffer.write(b"mp3")
+    mocker.patch("src.card_creator.create_audio_data", return_value=audio)
+    responses = [
+        {"result": "kanki_test.mp3", "error": None},
+        {"result": 1, "error": None},
+    ]
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            mocker.Mock(status_code=200, json=lambda r=r: r) for r in responses
+        ],
+    )
+
+    response_list = CardCreator(anki_notes, in_memory_audio=True).send_notes()
+
+    media_payload = json.loads(post.call_args_list[0].kwargs["data"])
+    assert media_payload["params"] == {
+        "filename": "kanki_test.mp3",
+        "data": base64.b64encode(b"mp3").decode(),
+    }
+    assert response_list[0].result == 1
+    assert audio.buffer.closed
@@ -1,3 +1,6 @@
+import pytest
+from pydantic import ValidationError
+
 from src.models import AnkiNoteModel
 
 
@@ -29,3 +32,26 @@ def test_anki_note_model_no_back():
     assert note.modelName == "Basic (裏表反転カード付き)+sentense"
     assert note.front == "안녕하세요"
     assert note.frontLang == "ko"
+
+
+def test_anki_note_model_wrong_language():
+    """test 3: A front side which is not in the expected language is rejected"""
+    with pytest.raises(ValidationError, match="detected 'ja'"):
+        AnkiNoteModel(front="こんにちは")
+
+
+def test_anki_note_model_validate_many():
+    """test 4: Validate a whole list of notes at once, reporting every invalid note"""
+    notes = AnkiNoteModel.validate_many(
+        [{"front": "안녕하세요"}, {"front": "이거 얼마예요?", "deckName": "test"}]
+    )
+    assert [note.front for note in notes] == ["안녕하세요", "이거 얼마예요?"]
+    assert notes[1].deckName == "test"
+
+    with pytest.raises(ValueError) as excinfo:
+        AnkiNoteModel.validate_many(
+            [{"front": "hello"}, {"front": "안녕하세요"}, {"front": "ごめん"}]
+        )
+    assert "'hello'" in str(excinfo.value)
+    assert "'ごめん'" in str(excinfo.value)
+    assert "안녕하세요" not in str(excinfo.value)
@@ -0,0 +1,63 @@
+import pytest
+
+from src.card_creator import AnkiNotes, CardCreator
+from src.models import AnkiConnectResponse, AnkiNoteResponse
+from src.note_batch import NoteBatch
+
+
+def test_note_batch_from_rows():
+    batch = NoteBatch.from_rows(
+        [{"front": "안녕하세요", "back": "こんにちは"}, {"front": "죄송합니다"}],
+        deck_name="korean",
+    )
+
+    assert len(batch) == 2
+    assert batch.deckName[0] is batch.deckName[1]
+    assert batch[1].front == "죄송합니다"
+    assert batch.missing_backs() == ["죄송합니다"]
+    batch.fill_backs({"죄송합니다": "すみません"})
+    assert batch[-1].back == "すみません"
+    assert batch[1:][0].front == "죄송합니다"
+    assert batch.to_model(0).model_dump()["back"] == "こんにちは"
+
+
+def test_note_batch_checks_every_language():
+    with pytest.raises(ValueError) as e:
+        NoteBatch.from_rows(
+            [{"front": "hello"}, {"front": "안녕"}, {"front": "こんにちは"}]
+        )
+    assert "'hello'" in str(e.value) and "'こんにちは'" in str(e.value)
+
+
+def test_send_note_batch(mocker):
+    """A NoteBatch is sent like a list of notes, and its responses come as a table."""
+    mocker.patch(
+        "src.card_creator.translate_words",
+        side_effect=lambda words, **_: [f"{word}!" for word in words],
+    )
+    client = mocker.Mock()
+    client.multi.return_value = [
+        AnkiConnectResponse(status_code=200, result=1),
+        AnkiConnectResponse(status_code=200, error="duplicate"),
+    ]
+
+    (batch,) = AnkiNotes.iter_batches(
+        [{"front": "안녕하세요", "back": "こんにちは"}, {"front": "죄송합니다"}],
+        chunk_size=10,
+    )
+    results = CardCreator(batch, client=client).send_notes(audio=False, batch_size=2)
+
+    actions = client.multi.call_args.args[0]
+    assert [a["params"]["note"]["fields"]["裏面"] for a in actions] == [
+        "こんにちは",
+        "죄송합니다!",
+    ]
+    assert results.table() == {
+        "front": ["안녕하세요", "죄송합니다"],
+        "status_code": [200, 200],
+        "result": [1, None],
+        "error": [None, "duplicate"],
+    }
+    assert results.n_errors == 1
+    assert isinstance(results[1], AnkiNoteResponse)
+    assert results[1].error == "duplicate"
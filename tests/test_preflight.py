@@ -0,0 +1,28 @@
+from src.preflight import ExistingNotesFilter, normalize_field
+
+
+def test_normalize_field():
+    assert normalize_field("안녕하세요[sound:kanki_0123.mp3]") == "안녕하세요"
+    assert normalize_field("<b>감사&nbsp;합니다</b> ") == "감사 합니다"
+
+
+def test_filter_existing_notes(mocker):
+    """Words already in the deck, or repeated in the input, are skipped."""
+    client = mocker.Mock()
+    client.find_notes_info.return_value = iter(
+        [
+            {"fields": {"表面": {"value": "안녕하세요[sound:a.mp3]"}}},
+            {"fields": {"Front": {"value": "죄송합니다"}}},
+        ]
+    )
+
+    existing_notes_filter = ExistingNotesFilter.from_deck(client, deck_name='my "deck"')
+    words = list(
+        existing_notes_filter.filter(
+            ["안녕하세요", "죄송합니다", "감사합니다", "감사합니다"]
+        )
+    )
+
+    client.find_notes_info.assert_called_once_with('deck:"my \\"deck\\""')
+    assert words == ["죄송합니다", "감사합니다"]
+    assert existing_notes_filter.skipped == 2
@@ -0,0 +1,70 @@
+import pytest
+
+from src.card_creator import AnkiNotes
+from src.readers import parse_columns, read_rows
+
+
+def test_read_tsv_without_header(tmp_path):
+    """An Anki export is read as front, back, ... columns, with empty cells missing."""
+    data_fname = tmp_path / "export.tsv"
+    data_fname.write_text(
+        "#separator:tab\n#html:true\n안녕하세요\tこんにちは\n\n죄송합니다\t\n",
+        encoding="utf-8",
+    )
+
+    assert list(read_rows(data_fname)) == [
+        {"front": "안녕하세요", "back": "こんにちは"},
+        {"front": "죄송합니다"},
+    ]
+
+
+def test_read_csv_with_columns(tmp_path):
+    data_fname = tmp_path / "sheet.csv"
+    data_fname.write_text(
+        'word,meaning,deck\n안녕하세요,"こんにちは, 今日は",greetings\n,empty,x\n',
+        encoding="utf-8",
+    )
+
+    rows = read_rows(
+        data_fname, columns=parse_columns("front=word, back=meaning, deckName=deck")
+    )
+    assert list(rows) == [
+        {"front": "안녕하세요", "back": "こんにちは, 今日は", "deckName": "greetings"}
+    ]
+    with pytest.raises(ValueError):
+        list(read_rows(data_fname, columns={"front": "missing"}))
+    with pytest.raises(ValueError):
+        parse_columns("face=word")
+
+
+def test_read_jsonl(tmp_path):
+    data_fname = tmp_path / "notes.jsonl"
+    data_fname.write_text(
+        '{"front": "안녕하세요", "modelName": "Basic"}\n\n{"front": "죄송합니다", "back": ""}\n',
+        encoding="utf-8",
+    )
+
+    assert list(read_rows(data_fname)) == [
+        {"front": "안녕하세요", "modelName": "Basic"},
+        {"front": "죄송합니다"},
+    ]
+
+
+def test_from_rows_translates_missing_backs(mocker):
+    """Only the rows without a back side are translated, and each row keeps its deck."""
+    translate = mocker.patch(
+        "src.card_creator.translate_words",
+        side_effect=lambda words, **_: [f"{word}!" for word in words],
+    )
+
+    anki_notes = AnkiNotes.from_rows(
+        [
+            {"front": "안녕하세요", "back": "こんにちは", "deckName": "greetings"},
+            {"front": "죄송합니다"},
+        ],
+        deck_name="korean",
+    ).anki_notes
+
+    assert translate.call_args.args[0] == ["죄송합니다"]
+    assert [note.back for note in anki_notes] == ["こんにちは", "죄송합니다!"]
+    assert [note.deckName for note in anki_notes] == ["greetings", "korean"]
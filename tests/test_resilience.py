@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+import requests
+
+from src.anki_connect import AnkiConnectClient
+from src.resilience import AdaptiveLimiter, BackendOverloaded, Resilience, TokenBucket
+
+
+def test_token_bucket():
+    """A burst is served right away, then the calls are spaced by 1 / rate."""
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.5, 0.5]
+    assert waits == [0.5, 0.5]
+
+
+def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=5)
+    limiter.on_failure()
+    assert limiter.limit == 2
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 5
+
+    limiter = AdaptiveLimiter(initial_limit=2)
+    release = threading.Event()
+    peak = []
+
+    def call():
+        with limiter.slot():
+            peak.append(limiter.in_flight)
+            release.wait()
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 2
+
+
+def test_retry():
+    """A failing call is retried with a growing delay, until it succeeds."""
+    delays = []
+    resilience = Resilience("test", max_retries=3, base_delay=1, sleep=delays.append)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise BackendOverloaded(429)
+        return "ok"
+
+    assert resilience.call(flaky) == "ok"
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 1 and 0 <= delays[1] <= 2
+    assert resilience.limiter.limit < 8
+
+
+def test_retry_gives_up():
+    resilience = Resilience("test", max_retries=2, sleep=lambda _: None)
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise ValueError("translator failed")
+
+    with pytest.raises(ValueError):
+        resilience.call(failing)
+    assert len(attempts) == 3
+
+    resilience = Resilience("test", retry_on=(KeyError,), sleep=lambda _: None)
+    attempts.clear()
+    with pytest.raises(ValueError):
+        resilience.call(failing)
+    assert len(attempts) == 1
+
+
+def test_anki_connect_retries(mocker):
+    """Failed connections and overloaded responses are retried, not the errors of Anki."""
+    post = mocker.patch(
+        "requests.Session.post",
+        side_effect=[
+            requests.ConnectionError(),
+            mocker.Mock(status_code=429),
+            mocker.Mock(status_code=200, json=lambda: {"result": 1, "error": None}),
+        ],
+    )
+    client = AnkiConnectClient(
+        resilience=Resilience(
+            "anki",
+            retry_on=(requests.ConnectionError, BackendOverloaded),
+            sleep=lambda _: None,
+        )
+    )
+
+    response = client.invoke("addNote", note={})
+
+    assert post.call_count == 3
+    assert response.result == 1
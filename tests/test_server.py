@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from src.card_creator import CardCreator
+from src.main import get_args_parser, send_rows
+from src.models import AnkiConnectResponse
+from src.server import MicroBatcher, create_server, parse_submission
+from src.utils import StoredAudio
+
+
+def _added(rows):
+    return [
+        {"front": row["front"], "status_code": 200, "result": i, "error": None}
+        for i, row in enumerate(rows)
+    ]
+
+
+def test_micro_batcher_flushes_on_size_and_window():
+    batches = []
+
+    def process(rows):
+        batches.append([row["front"] for row in rows])
+        return _added(rows)
+
+    batcher = MicroBatcher(process, max_batch_size=3, max_delay=0.2)
+    futures = batcher.submit([{"front": f"{i}"} for i in range(4)])
+    # The first three rows fill a batch, the last one waits for the window.
+    assert futures[0].result(timeout=0.15)["result"] == 0
+    assert futures[3].result(timeout=1)["result"] == 0
+    batcher.close()
+    assert batches == [["0", "1", "2"], ["3"]]
+
+
+def test_micro_batcher_reports_failures_per_row():
+    def process(rows):
+        raise ConnectionError("Anki is not running")
+
+    batcher = MicroBatcher(process, max_delay=0)
+    (future,) = batcher.submit([{"front": "안녕하세요"}])
+    assert isinstance(future.exception(timeout=1), ConnectionError)
+    batcher.close()
+
+
+def test_parse_submission():
+    rows, errors = parse_submission(
+        {
+            "words": ["안녕하세요", "hello"],
+            "rows": [{"front": "죄송합니다", "back": ""}, {}],
+        }
+    )
+    assert rows == [{"front": "안녕하세요"}, {"front": "죄송합니다"}]
+    assert sorted(errors) == [1, 3]
+    assert "Expected language" in errors[1]["error"]
+
+
+def test_server_coalesces_concurrent_clients():
+    """The submissions of concurrent clients share a batch, and each client gets the
+    results of its own rows, in order.
+    """
+    batch_sizes = []
+
+    def process(rows):
+        batch_sizes.append(len(rows))
+        return _added(rows)
+
+    batcher = MicroBatcher(process, max_delay=0.2)
+    server = create_server(batcher, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def submit(words):
+        return requests.post(f"{url}/notes", json={"words": words}).json()["results"]
+
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            start = time.monotonic()
+            results = list(
+                executor.map(
+                    submit, [["안녕하세요", "hello"], ["죄송합니다"], ["감사합니다"]]
+                )
+            )
+        assert time.monotonic() - start < 2
+        assert [[r["front"] for r in result] for result in results] == [
+            ["안녕하세요", "hello"],
+            ["죄송합니다"],
+            ["감사합니다"],
+        ]
+        assert results[0][1]["error"] is not None
+        assert batch_sizes == [3]
+
+        health = requests.get(f"{url}/health").json()
+        assert health == {"status": "ok", "pending": 0}
+        response = requests.post(f"{url}/notes", data="[1")
+        assert response.status_code == 400
+        assert "Invalid request" in json.loads(response.text)["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+@pytest.mark.parametrize(
+    "body", [{"words": "사과"}, {"words": ["사과", 1]}, {"rows": {"front": "사과"}}]
+)
+def test_parse_submission_rejects_malformed_lists(body):
+    with pytest.raises(ValueError):
+        parse_submission(body)
+
+
+def test_unix_socket_path_must_be_a_socket(tmp_path):
+    socket_path = tmp_path / "kanki.sock"
+    socket_path.write_text("not a socket")
+    batcher = MicroBatcher(lambda rows: _added(rows))
+    try:
+        with pytest.raises(FileExistsError):
+            create_server(batcher, socket_path=str(socket_path))
+        assert socket_path.read_text() == "not a socket"
+    finally:
+        batcher.close()
+
+
+def test_send_rows_fails_audio_per_row(mocker):
+    """The failed audio of a row fails that row only, not the whole micro-batch."""
+
+    def fake_create_audio(text, cache=None):
+        if text == "죄송합니다":
+            raise ConnectionError("TTS is down")
+        return StoredAudio(f"{text}.mp3")
+
+    mocker.patch.object(CardCreator, "create_audio", side_effect=fake_create_audio)
+    mocker.patch(
+        "src.card_creator.translate_words",
+        side_effect=lambda words, **_: ["?"] * len(words),
+    )
+    client = mocker.Mock()
+    client.multi.side_effect = lambda actions: [
+        AnkiConnectResponse(status_code=200, result=1) for _ in actions
+    ]
+    mocker.patch("sys.argv", ["kanki", "--serve"])
+
+    results = send_rows(
+        get_args_parser(), [{"front": "안녕하세요"}, {"front": "죄송합니다"}], client
+    )
+    assert results.table()["error"][0] is None
+    assert "TTS is down" in results.table()["error"][1]
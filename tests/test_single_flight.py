@@ -0,0 +1,67 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.audio_cache import AudioCache
+from src.single_flight import fcntl
+from src.translation import TranslationBackend, TranslationCache, translate_words
+
+
+class SlowBackend(TranslationBackend):
+    """Records each word it translates in a file shared by the processes."""
+
+    name = "slow"
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+
+    def translate(self, words, src, dest, batch_size=None):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{word}\n" for word in words))
+        time.sleep(0.2)
+        return [f"<{word}>" for word in words]
+
+
+def _translate(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite3")
+    translate_words(
+        ["안녕하세요", "죄송합니다"],
+        cache=cache,
+        batch_size=2,
+        backend=SlowBackend(tmp_path / "calls.log"),
+    )
+
+
+@pytest.mark.skipif(fcntl is None, reason="file locks need fcntl")
+def test_translations_are_coalesced_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_translate, args=(tmp_path,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+
+    calls = (tmp_path / "calls.log").read_text(encoding="utf-8").split()
+    assert sorted(calls) == ["안녕하세요", "죄송합니다"]
+
+
+def test_audios_are_coalesced_across_threads(tmp_path):
+    cache = AudioCache(tmp_path / "audio")
+    created = []
+
+    def create(path):
+        created.append(path)
+        time.sleep(0.1)
+        path.write_bytes(b"mp3")
+
+    with ThreadPoolExecutor(8) as executor:
+        paths = list(
+            executor.map(lambda _: cache.get_or_create("안녕하세요", create), range(8))
+        )
+
+    assert len(created) == 1
+    assert set(paths) == {cache.file_path("안녕하세요")}
+    assert (cache.hits, cache.misses) == (7, 1)
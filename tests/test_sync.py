@@ -0,0 +1,152 @@
+import tempfile
+
+from src import BACK_FIELD
+from src.main import sync_changes
+from src.media import parse_field_map
+from src.models import AnkiConnectResponse
+from src.note_batch import NoteBatch, NoteResults
+from src.sync import SyncManifest, delete_notes, update_notes
+from src.utils import InMemoryAudio
+
+
+def _manifest(tmp_path, rows):
+    manifest = SyncManifest(tmp_path / "words.tsv.sync.json")
+    for note_id, row in enumerate(rows, start=1):
+        manifest.record(row["front"], manifest.row_hash(row), note_id)
+    return manifest
+
+
+def test_diff(tmp_path):
+    """The rows are split into new, changed, removed and unchanged ones."""
+    manifest = _manifest(
+        tmp_path,
+        [
+            {"front": "안녕하세요", "back": "こんにちは"},
+            {"front": "죄송합니다"},
+            {"front": "감사합니다"},
+        ],
+    )
+    plan = manifest.diff(
+        [
+            {"front": "안녕하세요", "back": "こんにちは"},
+            {"front": "죄송합니다", "back": "すみません"},
+            {"front": "사랑해요"},
+            {"front": "사랑해요", "back": "repeated"},
+        ]
+    )
+    assert plan.new == [{"front": "사랑해요"}]
+    assert plan.changed == [({"front": "죄송합니다", "back": "すみません"}, 2)]
+    assert plan.removed == [("감사합니다", 3)]
+    assert plan.unchanged == 1
+    assert plan.summary() == "sync: 1 new, 1 changed, 1 removed, 1 unchanged"
+
+
+def test_manifest_roundtrip(tmp_path):
+    """The added notes are recorded with their hash, and the manifest is reloaded."""
+    manifest = SyncManifest(tmp_path / "words.tsv.sync.json")
+    rows = [{"front": "안녕하세요"}, {"front": "죄송합니다"}]
+    plan = manifest.diff(rows)
+    results = NoteResults(NoteBatch.from_rows(plan.new))
+    results.append(AnkiConnectResponse(status_code=200, result=11, error=None))
+    results.append(AnkiConnectResponse(status_code=200, result=None, error="duplicate"))
+    manifest.record_results(plan, results)
+    manifest.save()
+
+    plan = SyncManifest(manifest.path).diff(rows)
+    assert plan.new == [{"front": "죄송합니다"}]
+    assert plan.unchanged == 1
+
+
+def test_update_and_delete_notes(mocker, tmp_path):
+    """The changed notes get their new back side, and the removed ones are deleted."""
+    manifest = _manifest(
+        tmp_path,
+        [{"front": "안녕하세요"}, {"front": "죄송합니다"}, {"front": "감사합니다"}],
+    )
+    plan = manifest.diff(
+        [
+            {"front": "안녕하세요", "back": "こんにちは"},
+            {"front": "죄송합니다", "sentence": "."},
+        ]
+    )
+    client = mocker.Mock()
+    client.multi.return_value = [
+        AnkiConnectResponse(status_code=200, result=None, error=None),
+        AnkiConnectResponse(status_code=200, result=None, error="not found"),
+    ]
+    client.invoke.return_value = AnkiConnectResponse(
+        status_code=200, result=None, error=None
+    )
+
+    responses = update_notes(
+        client, manifest, plan, translations={"죄송합니다": "すみません"}
+    )
+    assert [response.error for response in responses] == [None, "not found"]
+    actions = client.multi.call_args.args[0]
+    assert [action["params"]["note"] for action in actions] == [
+        {"id": 1, "fields": {BACK_FIELD: "こんにちは"}},
+        {"id": 2, "fields": {BACK_FIELD: "すみません"}},
+    ]
+    # Only the updated note has its new hash recorded.
+    assert manifest.notes["안녕하세요"]["hash"] == plan.hashes["안녕하세요"]
+    assert manifest.notes["죄송합니다"]["hash"] != plan.hashes["죄송합니다"]
+
+    delete_notes(client, manifest, plan)
+    client.invoke.assert_called_once_with("deleteNotes", notes=[3])
+    assert "감사합니다" not in manifest.notes
+
+
+def test_update_mapped_fields(mocker, tmp_path):
+    """With a field map, an edited sentence is updated along with its new audio."""
+    manifest = _manifest(tmp_path, [{"front": "안녕", "back": "やあ"}])
+    plan = manifest.diff(
+        [{"front": "안녕", "back": "やあ", "sentence": "안녕, 친구야."}]
+    )
+    client = mocker.Mock()
+    client.multi.return_value = [AnkiConnectResponse(status_code=200, result=None)]
+
+    update_notes(
+        client,
+        manifest,
+        plan,
+        field_map=parse_field_map("sentence=例文,translated_sentence=例文訳"),
+        audio_strs={"안녕": {"sentence": "[sound:kanki_0123.mp3]"}},
+    )
+    (action,) = client.multi.call_args.args[0]
+    assert action["params"]["note"]["fields"] == {
+        BACK_FIELD: "やあ",
+        "例文": "안녕, 친구야.[sound:kanki_0123.mp3]",
+        "例文訳": "",
+    }
+    assert manifest.notes["안녕"]["hash"] == plan.hashes["안녕"]
+
+
+def test_sync_in_memory_audio(mocker, tmp_path):
+    """The audio of an edited sentence is created in memory with --in_memory_audio."""
+    manifest = _manifest(tmp_path, [{"front": "안녕", "back": "やあ"}])
+    plan = manifest.diff(
+        [{"front": "안녕", "back": "やあ", "sentence": "안녕, 친구야."}]
+    )
+    audio = InMemoryAudio("kanki_0123.mp3", tempfile.SpooledTemporaryFile())
+    mocker.patch("src.card_creator.create_audio_data", return_value=audio)
+    create_audio = mocker.patch("src.card_creator.create_audio")
+    client = mocker.Mock()
+    client.invoke.return_value = AnkiConnectResponse(
+        status_code=200, result="kanki_0123.mp3"
+    )
+    client.multi.return_value = [AnkiConnectResponse(status_code=200, result=None)]
+
+    sync_changes(
+        client,
+        manifest,
+        plan,
+        delete=False,
+        field_map=parse_field_map("sentence=例文"),
+        in_memory_audio=True,
+    )
+
+    create_audio.assert_not_called()
+    assert client.invoke.call_args.kwargs["filename"] == "kanki_0123.mp3"
+    assert audio.buffer.closed
+    (action,) = client.multi.call_args.args[0]
+    assert action["params"]["note"]["fields"]["例文"].endswith("[sound:kanki_0123.mp3]")
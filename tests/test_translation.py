@@ -0,0 +1,158 @@
+import sqlite3
+import time
+
+import pytest
+
+from src.dictionary import LocalDictionary, compile_dictionary
+from src.translation import (
+    DictionaryBackend,
+    GoogleBackend,
+    LayeredBackend,
+    TranslationBackend,
+    TranslationCache,
+    create_backend,
+    translate_words,
+)
+
+
+def fake_translator(mocker, translations):
+    return mocker.Mock(
+        translate=mocker.Mock(
+            side_effect=lambda text, src, dest: mocker.Mock(text=translations[text])
+        )
+    )
+
+
+def test_translation_cache(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite3")
+    cache.set("안녕하세요", "ko", "ja", "こんにちは")
+
+    assert cache.get("안녕하세요", "ko", "ja") == "こんにちは"
+    assert cache.get("안녕하세요", "ko", "en") is None
+    cache.invalidate("안녕하세요", "ko", "ja")
+    assert cache.get("안녕하세요", "ko", "ja") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_translation_cache_persistence_and_ttl(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite3")
+    cache.set("안녕하세요", "ko", "ja", "こんにちは")
+    cache.close()
+
+    assert TranslationCache(tmp_path / "cache.sqlite3").get("안녕하세요", "ko", "ja")
+    expired = TranslationCache(tmp_path / "cache.sqlite3", ttl=0)
+    time.sleep(0.01)
+    assert expired.get("안녕하세요", "ko", "ja") is None
+
+
+def test_translation_cache_by_backend(mocker, tmp_path):
+    """The translations of a backend are not served to another one, and the entries
+    of older caches, of an unknown backend, are dropped.
+    """
+    path = tmp_path / "cache.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE translations (text TEXT NOT NULL, src TEXT NOT NULL, "
+            "dest TEXT NOT NULL, translation TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (text, src, dest))"
+        )
+        connection.execute(
+            "INSERT INTO translations VALUES ('안녕하세요', 'ko', 'ja', '안녕하세요', 0)"
+        )
+    connection.close()
+    cache = TranslationCache(path)
+    assert cache.get("안녕하세요", "ko", "ja") is None
+
+    cache.set("안녕하세요", "ko", "ja", "안녕하세요", backend="other")
+    translator = fake_translator(mocker, {"안녕하세요": "こんにちは"})
+    assert translate_words(["안녕하세요"], translator=translator, cache=cache) == [
+        "こんにちは"
+    ]
+    assert cache.get("안녕하세요", "ko", "ja", "other") == "안녕하세요"
+    assert cache.get("안녕하세요", "ko", "ja") == "こんにちは"
+
+
+def test_translate_words_uses_cache(mocker, tmp_path):
+    """Cached words are not sent to the translator."""
+    cache = TranslationCache(tmp_path / "cache.sqlite3")
+    cache.set("안녕하세요", "ko", "ja", "こんにちは")
+    translator = fake_translator(mocker, {"죄송합니다": "ごめん"})
+
+    translated = translate_words(
+        ["안녕하세요", "죄송합니다"], translator=translator, cache=cache
+    )
+
+    assert translated == ["こんにちは", "ごめん"]
+    translator.translate.assert_called_once_with("죄송합니다", src="ko", dest="ja")
+    assert cache.get("죄송합니다", "ko", "ja") == "ごめん"
+
+
+def test_translate_words_dedupes_and_batches(mocker):
+    """Repeated words are translated once, several words per request."""
+    translator = mocker.Mock(
+        translate=mocker.Mock(
+            side_effect=lambda text, src, dest: mocker.Mock(
+                text="\n".join(f"<{line}>" for line in text.split("\n"))
+            )
+        )
+    )
+
+    translated = translate_words(
+        ["a", "b", "a", "c", "b", "d", "e"], translator=translator, batch_size=2
+    )
+
+    assert translated == ["<a>", "<b>", "<a>", "<c>", "<b>", "<d>", "<e>"]
+    assert [c.args[0] for c in translator.translate.call_args_list] == [
+        "a\nb",
+        "c\nd",
+        "e",
+    ]
+
+
+def test_translate_words_batch_mismatch_falls_back(mocker):
+    """If the translated lines do not match the words, they are translated one by one."""
+    translator = fake_translator(mocker, {"a\nb": "merged", "a": "<a>", "b": "<b>"})
+
+    translated = translate_words(["a", "b"], translator=translator, batch_size=2)
+
+    assert translated == ["<a>", "<b>"]
+    assert translator.translate.call_count == 3
+
+
+def test_layered_backend_sends_only_misses(mocker, tmp_path):
+    """The words of the dictionary are neither sent to the translator nor cached."""
+    compile_dictionary([("안녕하세요", "こんにちは")], tmp_path / "ko-ja.kdict")
+    translator = fake_translator(mocker, {"죄송합니다": "ごめん"})
+    backend = LayeredBackend(
+        [
+            DictionaryBackend(LocalDictionary(tmp_path / "ko-ja.kdict")),
+            GoogleBackend(translator),
+        ]
+    )
+    cache = TranslationCache(tmp_path / "cache.sqlite3")
+
+    translated = translate_words(
+        ["안녕하세요", "죄송합니다"], cache=cache, backend=backend
+    )
+
+    assert translated == ["こんにちは", "ごめん"]
+    translator.translate.assert_called_once_with("죄송합니다", src="ko", dest="ja")
+    assert cache.get("안녕하세요", "ko", "ja") is None
+    # The dictionary is only used for its pair of languages.
+    assert backend.lookup(["안녕하세요"], "ko", "en") == {}
+
+
+def test_identity_backend(mocker):
+    backend = create_backend("identity")
+    assert translate_words(["안녕하세요"], backend=backend) == ["안녕하세요"]
+    with pytest.raises(ValueError):
+        create_backend("deepl")
+
+
+def test_backend_must_translate():
+    class LookupOnlyBackend(TranslationBackend):
+        def lookup(self, words, src, dest):
+            return {}
+
+    with pytest.raises(TypeError):
+        LookupOnlyBackend()
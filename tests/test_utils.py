@@ -1,7 +1,39 @@
-from src.utils import create_message
+import base64
+
 from src.models import AnkiSendMediaResponse
+from src.utils import create_audio_data, create_message, read_words
 
 
 def test_create_message(response_anki_note: AnkiSendMediaResponse):
     message = create_message(response_anki_note)
     pass
+
+
+def test_read_words_skips_blank_lines(tmp_path):
+    file_path = tmp_path / "words.txt"
+    file_path.write_text("안녕하세요\n\n  죄송합니다 \n\n")
+
+    assert list(read_words(file_path)) == ["안녕하세요", "죄송합니다"]
+
+
+def test_create_audio_data_in_memory(mocker):
+    """The audio is kept in memory below the threshold and spooled beyond it."""
+    mp3 = b"\xff\xfb" * 100
+
+    class FakeTTS:
+        def __init__(self, text, **voice):
+            pass
+
+        def write_to_fp(self, fp):
+            fp.write(mp3)
+
+    mocker.patch("navertts.NaverTTS", FakeTTS)
+
+    small = create_audio_data("안녕하세요", max_memory_size=1024)
+    large = create_audio_data("안녕하세요", max_memory_size=10)
+
+    assert base64.b64decode(small.b64encode()) == mp3
+    assert not small.buffer._rolled
+    assert large.buffer._rolled
+    assert small.filename == large.filename
+    assert small.filename.startswith("kanki_")
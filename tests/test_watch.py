@@ -0,0 +1,130 @@
+from src.watch import Watcher, WatchOffsets
+
+
+def _watcher(tmp_path, *paths, **kwargs):
+    return Watcher(
+        paths,
+        WatchOffsets(tmp_path / "watch_offsets.json"),
+        sleep=lambda _: None,
+        **kwargs,
+    )
+
+
+def test_watch_follows_appended_lines(tmp_path):
+    """Only the new complete lines are read, and the offsets survive a restart."""
+    words = tmp_path / "words.txt"
+    words.write_text("안녕하세요\n죄송합니다\n감사", encoding="utf-8")
+    batches = []
+
+    _watcher(tmp_path, words).run(batches.append, max_polls=2)
+    assert batches == [[{"front": "안녕하세요"}, {"front": "죄송합니다"}]]
+
+    # The partial last line is read once completed, by a restarted watcher.
+    with open(words, "a", encoding="utf-8") as f:
+        f.write("합니다\n")
+    batches.clear()
+    _watcher(tmp_path, words).run(batches.append, max_polls=2)
+    assert batches == [[{"front": "감사합니다"}]]
+
+    # A truncated file is read again from its start.
+    words.write_text("사랑해요\n", encoding="utf-8")
+    batches.clear()
+    _watcher(tmp_path, words).run(batches.append, max_polls=1)
+    assert batches == [[{"front": "사랑해요"}]]
+
+
+def test_watch_drop_directory_in_micro_batches(tmp_path):
+    """The header of a sheet is kept across batches, and new files are picked up."""
+    drop_dir = tmp_path / "inbox"
+    drop_dir.mkdir()
+    (drop_dir / "a.tsv").write_text(
+        "front\tback\n안녕하세요\tこんにちは\n죄송합니다\t\n감사합니다\t\n",
+        encoding="utf-8",
+    )
+    (drop_dir / "ignored.mp3").write_bytes(b"\x00")
+    batches = []
+
+    watcher = _watcher(tmp_path, drop_dir, batch_size=2)
+    watcher.run(batches.append, max_polls=2)
+    assert batches == [
+        [{"front": "안녕하세요", "back": "こんにちは"}, {"front": "죄송합니다"}],
+        [{"front": "감사합니다"}],
+    ]
+
+    (drop_dir / "b.jsonl").write_text('{"front": "사랑해요"}\n', encoding="utf-8")
+    batches.clear()
+    _watcher(tmp_path, drop_dir).run(batches.append, max_polls=1)
+    assert batches == [[{"front": "사랑해요"}]]
+
+
+def test_watch_retries_failed_batches(tmp_path):
+    """The offsets of a batch which failed are not committed."""
+    words = tmp_path / "words.txt"
+    words.write_text("안녕하세요\n", encoding="utf-8")
+    calls = []
+
+    def process(rows):
+        calls.append(rows)
+        if len(calls) == 1:
+            raise ConnectionError("Anki is not running")
+
+    _watcher(tmp_path, words).run(process, max_polls=3)
+    assert calls == [[{"front": "안녕하세요"}], [{"front": "안녕하세요"}]]
+
+
+def test_watch_skips_invalid_rows(tmp_path):
+    """An invalid row is skipped and committed, rather than blocking the next rows."""
+    words = tmp_path / "words.txt"
+    words.write_text("안녕하세요\nhello\n감사합니다\n", encoding="utf-8")
+    batches = []
+
+    watcher = _watcher(tmp_path, words)
+    watcher.run(batches.append, max_polls=2)
+    assert batches == [[{"front": "안녕하세요"}, {"front": "감사합니다"}]]
+    assert watcher.poll().rows == []
+
+
+def test_watch_skips_unparsable_lines(tmp_path):
+    """A line which cannot be parsed is skipped, rather than crashing the watcher."""
+    words = tmp_path / "words.jsonl"
+    words.write_bytes(
+        '{"front": "안녕하세요"}\n'.encode("utf-8")
+        # Invalid JSON, then invalid UTF-8.
+        + b'{"front": \n'
+        + b"\xff\n"
+        + '{"front": "감사합니다"}\n'.encode("utf-8")
+    )
+    batches = []
+
+    watcher = _watcher(tmp_path, words)
+    watcher.run(batches.append, max_polls=1)
+    assert batches == [[{"front": "안녕하세요"}, {"front": "감사합니다"}]]
+    assert watcher.poll().rows == []
+
+
+def test_watch_skips_rows_which_always_fail(tmp_path):
+    """A failing row is skipped once the others went through, and a batch none of
+    whose rows can be processed is skipped after its retries.
+    """
+    words = tmp_path / "words.txt"
+    words.write_text("안녕하세요\n죄송합니다\n", encoding="utf-8")
+    processed = []
+
+    def process(rows):
+        if any(row["front"] == "죄송합니다" for row in rows):
+            raise RuntimeError("TTS failed")
+        processed.extend(rows)
+
+    watcher = _watcher(tmp_path, words)
+    watcher.run(process, max_polls=1)
+    assert processed == [{"front": "안녕하세요"}]
+    assert watcher.poll().rows == []
+
+    with words.open("a", encoding="utf-8") as f:
+        f.write("죄송합니다\n")
+    calls = []
+    watcher = _watcher(tmp_path, words, max_retries=2)
+    watcher.run(lambda rows: calls.append(rows) or process(rows), max_polls=5)
+    # The batch, then its row on its own, at each of the 3 attempts.
+    assert len(calls) == 6
+    assert watcher.poll().rows == []